@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# benchmark.py
+# Offscreen shader compilation and rendering measurements
+#
+# Requires a current GL context (see offscreen.py)
+###############################################################################
+
+# Python imports
+import os,time
+
+# OpenGL imports
+from OpenGL.GL import *
+
+# Application imports
+import glslview
+import preview
+import mesh
+import fbo
+
+# Project file extension
+PROJECT_EXTENSION='.glsle'
+
+def project_files(paths):
+    """
+    Expands directories in paths to the project files they contain
+    """
+    files=[]
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(PROJECT_EXTENSION):
+                    files.append(os.path.join(path,name))
+        else:
+            files.append(path)
+    return files
+
+def available_primitives():
+    """
+    Preview primitives drawable in this process (GLUT teapot needs a display)
+    """
+    primitives=list(preview.PRIMITIVES)
+    if os.environ.get('DISPLAY'):
+        mesh.initglut()
+    else:
+        primitives.remove('Tetera')
+    return primitives+[preview.GRID]
+
+def compile_timed(vertex_source,fragment_source,defines=None,retrievable=False):
+    """
+    Compiles and links a program measuring each step. Returns program and
+    a dictionary of times in milliseconds
+    """
+    times={}
+    shaders=[]
+    try:
+        for name,source,shader_type in (('vertex',vertex_source,glslview.GL_VERTEX_SHADER),
+                ('fragment',fragment_source,glslview.GL_FRAGMENT_SHADER)):
+            source=glslview.inject_defines(source,defines)
+            if source:
+                start=time.time()
+                shaders.append(glslview.compile_shader(source,shader_type))
+                times[name]=(time.time()-start)*1000.0
+        start=time.time()
+        program=glslview.link_program(shaders,retrievable)
+        times['link']=(time.time()-start)*1000.0
+    finally:
+        for shader in shaders:
+            glslview.glDeleteShader(shader)
+    return program,times
+
+class Benchmark:
+    """
+    Renders preview frames into an offscreen framebuffer
+    """
+
+    def __init__(self,width=256,height=256):
+        """
+        Class initialization, GL context must be current
+        """
+        self.framebuffer=fbo.Framebuffer(width,height)
+        self.framebuffer.bind()
+        self.renderer=preview.PreviewRenderer()
+        self.renderer.gridprimitives=available_primitives()[:-1]
+        self.renderer.initgl()
+        self.renderer.resize(width,height)
+
+    def run(self,program,primitive,frames=100):
+        """
+        Renders frames of program on primitive. Returns frame rate and
+        average GPU/CPU frame times
+        """
+        renderer=self.renderer
+        renderer.setprogram(program)
+        renderer.primitive=primitive
+        renderer.angle=0
+        # Warm up: mesh upload and driver shader variants
+        renderer.render()
+        glFinish()
+        renderer.gputimer.reset()
+        start=time.time()
+        for frame in range(frames):
+            renderer.angle+=1.0
+            renderer.render()
+        glFinish()
+        elapsed=time.time()-start
+        renderer.gputimer.collect()
+        result={
+            'frames': frames,
+            'fps': frames/max(elapsed,1e-9),
+            'gpu': None,
+            'cpu': None,
+        }
+        stats=renderer.gputimer.stats()
+        if stats:
+            result['gpu']=stats['gpu']
+            result['cpu']=stats['cpu']
+        return result
+
+    def read(self):
+        """
+        Returns last rendered frame RGBA pixels
+        """
+        return self.framebuffer.read()
+
+    def delete(self):
+        """
+        Releases GL resources
+        """
+        self.renderer.meshes.clear()
+        self.renderer.gputimer.delete()
+        self.framebuffer.unbind()
+        self.framebuffer.delete()
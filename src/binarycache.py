@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# binarycache.py
+# On-disk program binary cache
+###############################################################################
+
+# Python imports
+import os,sys,struct,hashlib,tempfile
+
+# Default cache location and size
+DEFAULT_DIRECTORY=os.path.join(os.path.expanduser('~'),'.glsleditor','cache','programs')
+DEFAULT_MAXSIZE=64*1024*1024
+
+# Binary file header: magic, binary format, data length
+HEADER_MAGIC='GLSLEBIN'
+HEADER_FORMAT='<8sII'
+HEADER_SIZE=struct.calcsize(HEADER_FORMAT)
+
+# Cache file extension
+EXTENSION='.bin'
+
+class ProgramBinaryCache:
+    """
+    Size bounded directory of program binaries (GL_ARB_get_program_binary)
+    keyed by program source hash and GL driver identification
+    """
+
+    def __init__(self,directory=DEFAULT_DIRECTORY,maxsize=DEFAULT_MAXSIZE):
+        """
+        Class initialization
+        """
+        self.directory=directory
+        self.maxsize=maxsize
+        self.hits=0
+        self.misses=0
+        self.rejects=0
+
+    def key(self,programkey,driver):
+        """
+        Returns cache key for a program key on a given driver
+        """
+        return hashlib.sha1(programkey + '\0' + driver).hexdigest()
+
+    def path(self,key):
+        """
+        Returns cache file path for key
+        """
+        return os.path.join(self.directory,key + EXTENSION)
+
+    def load(self,key):
+        """
+        Returns (format, data) stored for key or None
+        """
+        filename=self.path(key)
+        try:
+            fd=open(filename,'rb')
+            try:
+                header=fd.read(HEADER_SIZE)
+                data=fd.read()
+            finally:
+                fd.close()
+        except (IOError,OSError):
+            self.misses+=1
+            return None
+        if len(header)==HEADER_SIZE:
+            magic,binaryformat,length=struct.unpack(HEADER_FORMAT,header)
+            if magic==HEADER_MAGIC and length==len(data):
+                self.hits+=1
+                # Refresh modification time for least recently used eviction
+                try:
+                    os.utime(filename,None)
+                except OSError:
+                    pass
+                return (binaryformat,data)
+        # Truncated or foreign file
+        self.remove(filename)
+        self.misses+=1
+        return None
+
+    def store(self,key,binaryformat,data):
+        """
+        Stores program binary for key
+        """
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            # Write to a temporary file and rename it so readers never see partial files
+            fd,tmpname=tempfile.mkstemp(suffix='.tmp',dir=self.directory)
+            try:
+                os.write(fd,struct.pack(HEADER_FORMAT,HEADER_MAGIC,binaryformat,len(data)))
+                os.write(fd,data)
+            finally:
+                os.close(fd)
+            os.rename(tmpname,self.path(key))
+        except (IOError,OSError),e:
+            print >> sys.stderr, 'Program binary cache write failed: %s' % e
+            return
+        self.shrink()
+
+    def discard(self,key):
+        """
+        Removes binary for key (i.e. rejected by the driver)
+        """
+        self.rejects+=1
+        self.remove(self.path(key))
+
+    def remove(self,filename):
+        """
+        Removes a cache file ignoring errors
+        """
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def entries(self):
+        """
+        Returns (mtime, size, filename) list of cached binaries
+        """
+        entries=[]
+        try:
+            names=os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if name.endswith(EXTENSION):
+                filename=os.path.join(self.directory,name)
+                try:
+                    info=os.stat(filename)
+                except OSError:
+                    continue
+                entries.append((info.st_mtime,info.st_size,filename))
+        return entries
+
+    def shrink(self):
+        """
+        Removes least recently used binaries over the size limit
+        """
+        entries=self.entries()
+        total=sum([entry[1] for entry in entries])
+        entries.sort()
+        while entries and total>self.maxsize:
+            mtime,size,filename=entries.pop(0)
+            self.remove(filename)
+            total-=size
+
+    def clear(self):
+        """
+        Invalidates the whole cache
+        """
+        for mtime,size,filename in self.entries():
+            self.remove(filename)
+
+    def stats(self):
+        """
+        Returns cache usage counters
+        """
+        entries=self.entries()
+        return {
+            'entries': len(entries),
+            'size': sum([entry[1] for entry in entries]),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'rejects': self.rejects,
+        }
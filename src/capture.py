@@ -0,0 +1,441 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# capture.py
+# Preview capture through asynchronous pixel buffer readback
+#
+# Frames are read into a ring of pixel buffer objects and every buffer is
+# mapped some frames later, once its fence has signalled, so reading back
+# never waits for the GPU. Pixels are handed to a writer thread that
+# encodes PNG files or writes raw frames to a pipe.
+###############################################################################
+
+# Python imports
+import os,time,threading,Queue,subprocess,ctypes
+
+# NumPy imports
+import numpy
+
+# OpenGL imports
+from OpenGL.GL import *
+
+# Application imports
+import imgutil
+
+# Pixel buffers in flight before their pixels are mapped
+DEFAULT_DEPTH=3
+# Frames waiting to be written (raw RGBA) before new frames are skipped
+DEFAULT_BACKLOG=8
+# File names of PNG sequences and zlib level of their frames (speed over size)
+FRAME_PATTERN='frame-%05d.png'
+SEQUENCE_LEVEL=1
+
+class ReadbackSlot:
+    """
+    Pixel buffer object receiving one frame
+    """
+
+    def __init__(self):
+        """
+        Class initialization
+        """
+        self.buffer=int(numpy.ravel(glGenBuffers(1))[0])
+        self.capacity=0
+        self.fence=None
+        self.width=0
+        self.height=0
+        self.tag=None
+        self.frame=0
+
+    def read(self,width,height):
+        """
+        Starts copying width x height pixels of the read framebuffer into the
+        buffer, returns without waiting for the copy
+        """
+        size=width*height*4
+        glBindBuffer(GL_PIXEL_PACK_BUFFER,self.buffer)
+        if size!=self.capacity:
+            glBufferData(GL_PIXEL_PACK_BUFFER,size,None,GL_STREAM_READ)
+            self.capacity=size
+        glPixelStorei(GL_PACK_ALIGNMENT,1)
+        glReadPixels(0,0,width,height,GL_RGBA,GL_UNSIGNED_BYTE,ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER,0)
+        self.fence=glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE,0)
+        self.width=width
+        self.height=height
+
+    def ready(self,timeout=0):
+        """
+        Checks if the copy has finished, waiting up to timeout nanoseconds
+        """
+        status=glClientWaitSync(self.fence,GL_SYNC_FLUSH_COMMANDS_BIT,timeout)
+        return status in (GL_ALREADY_SIGNALED,GL_CONDITION_SATISFIED)
+
+    def pixels(self):
+        """
+        Returns copied RGBA pixels (bottom row first) and frees the slot
+        """
+        size=self.width*self.height*4
+        glBindBuffer(GL_PIXEL_PACK_BUFFER,self.buffer)
+        pointer=glMapBufferRange(GL_PIXEL_PACK_BUFFER,0,size,GL_MAP_READ_BIT)
+        try:
+            data=ctypes.string_at(pointer,size)
+        finally:
+            glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+            glBindBuffer(GL_PIXEL_PACK_BUFFER,0)
+        glDeleteSync(self.fence)
+        self.fence=None
+        return data
+
+    def delete(self):
+        """
+        Releases buffer and fence
+        """
+        if self.fence is not None:
+            glDeleteSync(self.fence)
+            self.fence=None
+        glDeleteBuffers(1,[self.buffer])
+
+class PixelReader:
+    """
+    Reads frames back through a ring of pixel buffer objects. Pixels of a
+    frame are returned by collect() once the GPU has copied them, some
+    frames later. Without fence sync objects and buffer mapping frames are
+    read synchronously instead. GL context must be current in every call
+    """
+
+    def __init__(self,depth=DEFAULT_DEPTH):
+        """
+        Class initialization
+        """
+        self.enabled=bool(glFenceSync) and bool(glMapBufferRange)
+        self.depth=depth
+        self.slots=[]
+        self.frame=0
+        # Frames read synchronously, waiting to be collected
+        self.finished=[]
+
+    def pending(self):
+        """
+        Returns number of frames being copied
+        """
+        return len([slot for slot in self.slots if slot.fence is not None])
+
+    def read(self,width,height,tag=None):
+        """
+        Starts reading back a frame of the read framebuffer. Returns False
+        if every buffer is still in flight
+        """
+        if not self.enabled:
+            pixels=ctypes.create_string_buffer(width*height*4)
+            glPixelStorei(GL_PACK_ALIGNMENT,1)
+            glReadPixels(0,0,width,height,GL_RGBA,GL_UNSIGNED_BYTE,pixels)
+            self.finished.append((tag,width,height,pixels.raw))
+            return True
+        free=[slot for slot in self.slots if slot.fence is None]
+        if free:
+            slot=free[0]
+        elif len(self.slots)<self.depth:
+            slot=ReadbackSlot()
+            self.slots.append(slot)
+        else:
+            return False
+        self.frame+=1
+        slot.frame=self.frame
+        slot.tag=tag
+        slot.read(width,height)
+        return True
+
+    def collect(self,wait=False):
+        """
+        Returns a list of (tag, width, height, pixels) of finished frames in
+        reading order. If wait, blocks until every frame is finished
+        """
+        results=self.finished
+        self.finished=[]
+        for slot in sorted([slot for slot in self.slots if slot.fence is not None],key=lambda slot: slot.frame):
+            if not slot.ready(wait and GL_TIMEOUT_IGNORED or 0):
+                break
+            results.append((slot.tag,slot.width,slot.height,slot.pixels()))
+            slot.tag=None
+        return results
+
+    def delete(self):
+        """
+        Releases pixel buffers
+        """
+        for slot in self.slots:
+            slot.delete()
+        self.slots=[]
+        self.finished=[]
+
+class PNGSink:
+    """
+    Writes frames as a numbered PNG sequence in a directory, or a single
+    frame to a PNG file
+    """
+
+    def __init__(self,path,sequence=True):
+        """
+        Class initialization
+        """
+        self.path=path
+        self.sequence=sequence
+
+    def describe(self):
+        """
+        Returns output description
+        """
+        return self.path
+
+    def write(self,index,width,height,pixels):
+        """
+        Writes frame index (RGBA, bottom row first)
+        """
+        if self.sequence:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            imgutil.writepng(os.path.join(self.path,FRAME_PATTERN % index),width,height,pixels,
+                flip=True,level=SEQUENCE_LEVEL)
+        else:
+            imgutil.writepng(self.path,width,height,pixels,flip=True)
+
+    def close(self):
+        """
+        Finishes output
+        """
+        pass
+
+class PipeSink:
+    """
+    Writes raw RGBA frames (top row first) to the standard input of a shell
+    command. {width} and {height} in the command are replaced by the frame
+    size, so it can be given to an encoder, e.g.
+    ffmpeg -f rawvideo -pix_fmt rgba -s {width}x{height} -i - video.mp4
+    """
+
+    def __init__(self,command,directory=None):
+        """
+        Class initialization, the command is started on the first frame
+        """
+        self.command=command
+        self.directory=directory
+        self.process=None
+
+    def describe(self):
+        """
+        Returns output description
+        """
+        return self.command
+
+    def write(self,index,width,height,pixels):
+        """
+        Writes frame index (RGBA, bottom row first)
+        """
+        if not self.process:
+            self.process=subprocess.Popen(self.command.format(width=width,height=height),shell=True,
+                stdin=subprocess.PIPE,cwd=self.directory)
+        image=numpy.frombuffer(pixels,numpy.uint8).reshape(height,width*4)
+        self.process.stdin.write(image[::-1].tostring())
+
+    def close(self):
+        """
+        Closes the pipe and waits for the command
+        """
+        if not self.process:
+            return
+        self.process.stdin.close()
+        status=self.process.wait()
+        self.process=None
+        if status:
+            raise OSError, 'Command exited with status %d: %s' % (status,self.command)
+
+class FrameWriter:
+    """
+    Thread writing frames to a sink so encoding does not block rendering.
+    Keeps throughput statistics
+    """
+
+    def __init__(self,sink,backlog=DEFAULT_BACKLOG):
+        """
+        Class initialization, starts the writer thread
+        """
+        self.sink=sink
+        self.backlog=backlog
+        self.frames=Queue.Queue()
+        self.lock=threading.Lock()
+        self.written=0
+        self.bytes=0
+        self.busy=0.0
+        self.started=None
+        self.stopped=None
+        self.error=None
+        self.finished=False
+        self.thread=threading.Thread(target=self.__work,name='capture-writer')
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def __work(self):
+        """
+        Writer thread main loop
+        """
+        while True:
+            frame=self.frames.get()
+            if frame is None:
+                break
+            if self.error:
+                # Frames after a failure are discarded
+                continue
+            index,width,height,pixels=frame
+            start=time.time()
+            try:
+                self.sink.write(index,width,height,pixels)
+            except (IOError,OSError),e:
+                self.error=e
+                continue
+            end=time.time()
+            with self.lock:
+                if self.started is None:
+                    self.started=start
+                self.stopped=end
+                self.busy+=end-start
+                self.written+=1
+                self.bytes+=len(pixels)
+        try:
+            self.sink.close()
+        except (IOError,OSError),e:
+            self.error=self.error or e
+        self.finished=True
+
+    def queued(self):
+        """
+        Returns number of frames waiting to be written
+        """
+        return self.frames.qsize()
+
+    def put(self,index,width,height,pixels):
+        """
+        Queues a frame (RGBA, bottom row first)
+        """
+        self.frames.put((index,width,height,pixels))
+
+    def close(self,wait=False):
+        """
+        Writes queued frames and closes the sink (in background unless wait)
+        """
+        self.frames.put(None)
+        if wait:
+            self.thread.join()
+
+    def stats(self):
+        """
+        Returns frames written, frames per second since the first frame,
+        frames per second of writer time and megabytes per second
+        """
+        with self.lock:
+            elapsed=self.started is not None and self.stopped-self.started or 0.0
+            return {
+                'frames': self.written,
+                'fps': self.written/max(elapsed,1e-9) if self.written>1 else None,
+                'writefps': self.written/max(self.busy,1e-9) if self.written else None,
+                'mbps': self.bytes/max(self.busy,1e-9)/(1024*1024) if self.written else None,
+            }
+
+class Recorder:
+    """
+    Capture of the next count drawn frames of a view into a sink. For every
+    drawn frame the view asks nextframe() for a frame index, reads the
+    frame back with a PixelReader and passes it to deliver(). Frames are
+    skipped, never waited for, while the writer is behind; they keep their
+    drawn frame index, so skipped frames are gaps in PNG sequences. A
+    single frame capture waits for the next frame that can be read
+    """
+
+    def __init__(self,sink,count=1,backlog=DEFAULT_BACKLOG):
+        """
+        Class initialization
+        """
+        self.count=count
+        self.writer=FrameWriter(sink,backlog)
+        self.skipping=count>1
+        self.frame=0
+        self.requested=0
+        self.delivered=0
+        self.skipped=0
+        self.closed=False
+
+    def nextframe(self,inflight=0):
+        """
+        Returns index of the drawn frame to read back, inflight frames being
+        copied, or None if it is not captured
+        """
+        if self.complete():
+            return None
+        self.frame+=1
+        self.requested+=1
+        if self.writer.queued()+inflight>=self.writer.backlog:
+            self.skip(self.frame-1)
+            return None
+        return self.frame-1
+
+    def skip(self,index):
+        """
+        Gives up drawn frame index returned by nextframe() (it could not be
+        read back)
+        """
+        self.requested-=1
+        if self.skipping:
+            self.skipped+=1
+            self.__finish()
+        else:
+            # Taken again from the next drawn frame
+            self.frame-=1
+
+    def complete(self):
+        """
+        Checks if every frame has been read back or skipped
+        """
+        return self.frame>=self.count
+
+    def deliver(self,index,width,height,pixels):
+        """
+        Hands read back frame index to the writer
+        """
+        self.writer.put(index,width,height,pixels)
+        self.delivered+=1
+        self.__finish()
+
+    def __finish(self):
+        """
+        Closes the writer after the last frame
+        """
+        if self.complete() and self.delivered>=self.requested and not self.closed:
+            self.closed=True
+            self.writer.close()
+
+    def cancel(self):
+        """
+        Stops capturing, frames already read back are still written
+        """
+        self.count=self.frame
+        self.__finish()
+
+    def done(self):
+        """
+        Checks if every frame has been written
+        """
+        return self.closed and self.writer.finished
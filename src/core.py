@@ -36,111 +36,374 @@ metadata={
 ###############################################################################
 
 # Importación de bibliotecas de Python
-import sys,os,shutil
+import sys,os,shutil,time,imp,optparse,ConfigParser
 
-# Importación de PyGTK
+# Inicio de la carga de la aplicación (medición de tiempos de arranque)
+_start=time.time()
+
+def available(name):
+	"""
+	Comprueba si un módulo está instalado sin llegar a importarlo
+	"""
+	path=None
+	for part in name.split('.'):
+		try:
+			fd,pathname,description=imp.find_module(part,path)
+		except ImportError:
+			return False
+		if fd:
+			fd.close()
+		path=[pathname]
+	return True
+
+# Comprobación de PyGTK
 try:
-	import pygtk,gobject,gtk
+	import pygtk
 	pygtk.require('2.0')
+	if not available('gobject') or not available('gtk'):
+		raise ImportError
 except:
 	print 'No se encuentra PyGTK en el sistema. Instale las bibliotecas PyGTK para poder ejecutar esta aplicación'
 	sys.exit(1)
 
-# Importación de Glade
-try:
-	import gtk.glade
-except:
+# Comprobación de Glade
+if not available('gtk.glade'):
 	print 'No se encuentra Glade en el sistema. Instale las bibliotecas Glade de python para ejecutar esta aplicación'
 	sys.exit(1)
 	
-# Importación de GTK-Sourceview
-try:
-	import gtksourceview2 as gtksourceview
-except:
+# Comprobación de GTK-Sourceview
+if not available('gtksourceview2'):
 	print 'No se encuentra GTKSourceView en el sistema. Instale las bibliotecas de GTKSourceView para ejecutar esta aplicación'
 	sys.exit(1)
 
+# Comprobación de NumPy
+if not available('numpy'):
+	print 'No se encuentra NumPy en el sistema. Instale las bibliotecas de NumPy para ejecutar esta aplicación'
+	sys.exit(1)
+
+# Los módulos de GTK, la interfaz gráfica y OpenGL se importan al iniciar
+# la aplicación (OpenGL una vez mostrada la ventana principal)
+
 ###############################################################################
-# Importación de módulos de la aplicación
+# Medición de tiempos de arranque
 ###############################################################################
 
-# Importación del módulo de interfaz gráfica de usuario
-import gui
+class StartupProfiler:
+	"""
+	Tiempos de las fases de arranque de la aplicación
+	"""
+	def __init__(self,start):
+		"""
+		Constructor de la clase de medición
+		"""
+		self.start=start
+		self.last=start
+		self.phases=[]
+
+	def mark(self,phase):
+		"""
+		Finaliza una fase de arranque
+		"""
+		now=time.time()
+		self.phases.append((phase,(now-self.last)*1000.0))
+		self.last=now
+
+	def report(self):
+		"""
+		Muestra los tiempos de arranque
+		"""
+		print '%-24s %10s' % ('Fase','ms')
+		for phase,elapsed in self.phases:
+			print '%-24s %10.1f' % (phase,elapsed)
+		print '%-24s %10.1f' % ('Total',(self.last-self.start)*1000.0)
 
 ###############################################################################
 # Definición de clase de configuración
 ###############################################################################
 
+# Fichero de configuración del usuario
+CONFIG_FILE=os.path.join(os.path.expanduser('~'),'.glsleditor','glsleditor.conf')
+
+# Opciones de configuración y su tipo (los tamaños se indican en MB)
+OPTIONS=[
+	('target_fps',int),
+	('idle_fps',int),
+	('tessellation',int),
+	('min_resolution',int),
+	('texture_budget',int),
+	('texture_workers',int),
+	('thumbnail_items',int),
+	('thumbnail_cache_size',int),
+	('program_cache_size',int),
+	('cache_directory',str),
+]
+
+# Perfiles de rendimiento predefinidos
+PROFILES={
+	'laptop': {
+		'target_fps': 30,
+		'idle_fps': 2,
+		'tessellation': 16,
+		'min_resolution': 33,
+		'texture_budget': 128,
+		'texture_workers': 1,
+		'thumbnail_items': 128,
+		'thumbnail_cache_size': 16,
+		'program_cache_size': 32,
+	},
+	'workstation': {
+		'target_fps': 60,
+		'idle_fps': 5,
+		'tessellation': 32,
+		'min_resolution': 50,
+		'texture_budget': 256,
+		'texture_workers': 2,
+		'thumbnail_items': 256,
+		'thumbnail_cache_size': 32,
+		'program_cache_size': 64,
+	},
+	'benchmark': {
+		'target_fps': 240,
+		'idle_fps': 240,
+		'tessellation': 64,
+		'min_resolution': 100,
+		'texture_budget': 1024,
+		'texture_workers': 4,
+		'thumbnail_items': 512,
+		'thumbnail_cache_size': 64,
+		'program_cache_size': 256,
+	},
+}
+DEFAULT_PROFILE='workstation'
+
+# Opciones comunes a todos los perfiles
+COMMON_OPTIONS={
+	'cache_directory': os.path.join(os.path.expanduser('~'),'.glsleditor','cache'),
+}
+
 # Clase de carga de configuración de la aplicación
 class Config:
 	"""
 	Clase de carga de la configuración
 	"""
-	def __init__(self):
+	def __init__(self,filename=CONFIG_FILE):
 		"""
 		Constructor de la clase de configuración
 		"""
+		self.filename=filename
+		self.listeners=[]
+		self.mtime=None
+		# Valores por defecto hasta la carga del fichero
+		self.profile=DEFAULT_PROFILE
+		self.overrides={}
+		self.values=self.resolve()
 		# Intentar la carga de configuración desde fichero
-		try:
-			import settings
-			print 'Error al cargar la configuración. Cargando configuración por defecto'
-		except:
+		if not os.path.exists(self.filename):
 			self.defaults()
-		# Cargar las variables en la configuración
-		self.loadconfig()
+			return
+		try:
+			self.loadconfig()
+		except (IOError,ConfigParser.Error,ValueError),e:
+			print 'Error al cargar la configuración (%s). Cargando configuración por defecto' % e
 
 	# Generar una configuración por defecto
 	def defaults(self):
 		"""
 		Genera un fichero de configuración por defecto
 		"""
-		pass
+		self.profile=DEFAULT_PROFILE
+		self.overrides={}
+		self.apply()
+		try:
+			self.saveconfig()
+		except (IOError,OSError),e:
+			print 'No se puede grabar la configuración: %s' % e
+
+	def resolve(self,profile=None):
+		"""
+		Valores de las opciones de un perfil con las modificaciones del usuario
+		"""
+		profile=profile or self.profile
+		values=dict(COMMON_OPTIONS)
+		values.update(PROFILES[profile])
+		values.update(self.overrides.get(profile,{}))
+		return values
+
+	def profiles(self):
+		"""
+		Nombres de los perfiles disponibles
+		"""
+		return sorted(PROFILES)
+
+	def get(self,name):
+		"""
+		Valor de una opción en el perfil actual
+		"""
+		return self.values[name]
+
+	def set(self,name,value,profile=None):
+		"""
+		Modifica una opción de un perfil (el actual por defecto)
+		"""
+		profile=profile or self.profile
+		value=dict(OPTIONS)[name](value)
+		options=self.overrides.setdefault(profile,{})
+		# Sólo se guardan los valores distintos de los del perfil
+		default=PROFILES[profile].get(name,COMMON_OPTIONS.get(name))
+		if value==default:
+			options.pop(name,None)
+		else:
+			options[name]=value
+
+	def setprofile(self,profile):
+		"""
+		Cambia el perfil de rendimiento actual
+		"""
+		if profile not in PROFILES:
+			raise ValueError, 'Perfil desconocido: %s' % profile
+		self.profile=profile
+
+	def addlistener(self,callback):
+		"""
+		Registra una función callback(config,changed) llamada con los
+		nombres de las opciones modificadas al aplicar la configuración
+		"""
+		self.listeners.append(callback)
+
+	def apply(self):
+		"""
+		Aplica el perfil actual avisando de las opciones modificadas
+		"""
+		values=self.resolve()
+		changed=[name for name,kind in OPTIONS if values[name]!=self.values[name]]
+		self.values=values
+		if changed:
+			for callback in self.listeners:
+				callback(self,changed)
+		return changed
 
 	def loadconfig(self):
 		"""
 		Carga de la configuración
 		"""
 		# Abrir fichero de configuración
+		self.mtime=os.path.getmtime(self.filename)
+		parser=ConfigParser.RawConfigParser()
+		parser.read(self.filename)
 		# Cargar configuración
+		profile=DEFAULT_PROFILE
+		if parser.has_option('general','profile'):
+			profile=parser.get('general','profile')
+		overrides={}
+		for section in parser.sections():
+			if section in PROFILES:
+				for name,kind in OPTIONS:
+					if parser.has_option(section,name):
+						overrides.setdefault(section,{})[name]=kind(parser.get(section,name))
 		# Hacer chequeo de la configuración
-		pass
+		if profile not in PROFILES:
+			raise ValueError, 'Perfil desconocido: %s' % profile
+		self.profile=profile
+		self.overrides=overrides
+		return self.apply()
+
+	def reload(self):
+		"""
+		Recarga la configuración si el fichero ha sido modificado
+		"""
+		try:
+			if os.path.exists(self.filename) and os.path.getmtime(self.filename)!=self.mtime:
+				return self.loadconfig()
+		except (OSError,IOError,ConfigParser.Error,ValueError),e:
+			print 'Error al recargar la configuración: %s' % e
+		return []
 
 	def saveconfig(self):
 		"""
 		Guardar configuración
 		"""
 		# Recopilar datos
+		parser=ConfigParser.RawConfigParser()
+		parser.add_section('general')
+		parser.set('general','profile',self.profile)
+		for profile in self.profiles():
+			options=self.overrides.get(profile)
+			if options:
+				parser.add_section(profile)
+				for name,kind in OPTIONS:
+					if name in options:
+						parser.set(profile,name,options[name])
 		# Abrir fichero para escritura
+		directory=os.path.dirname(self.filename)
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		fd=open(self.filename,'w')
 		# Escribir datos
+		try:
+			parser.write(fd)
 		# Cerrar fichero
+		finally:
+			fd.close()
+		self.mtime=os.path.getmtime(self.filename)
 
 ###############################################################################
 # Inicialización de la aplicación
 ###############################################################################
 
+def parseargs(args):
+	"""
+	Análisis de los argumentos de línea de comandos
+	"""
+	parser=optparse.OptionParser(usage='%prog [opciones]',add_help_option=False)
+	parser.add_option('-h','--help',action='store_true',default=False,help='muestra esta ayuda')
+	parser.add_option('-v','--version',action='store_true',default=False,help='muestra la versión')
+	parser.add_option('--profile-startup',action='store_true',default=False,
+		help='muestra los tiempos de cada fase del arranque')
+	options,arguments=parser.parse_args(args[1:])
+	if options.help:
+		showhelp(parser)
+	if options.version:
+		showversion()
+	return options
+
 def startup(args):
 	"""
 	Inicialización de la aplicación
 	"""
+	options=parseargs(args)
+	profiler=None
+	if options.profile_startup:
+		profiler=StartupProfiler(_start)
+	# Importación de GTK y de la interfaz gráfica
+	import gobject,gtk,gtk.glade
+	import gui
+	if profiler:
+		profiler.mark('importaciones')
+	# Soporte de hilos en el bucle principal de GTK
+	gobject.threads_init()
 	# Carga de la configuración de la aplicación
 	config=Config()
 	# Carga de glade
 	gladetree=gtk.glade.XML(metadata['APP_CODENAME'] + '.glade')
+	if profiler:
+		profiler.mark('glade')
 	# Clase del GUI
-	appgui=gui.GUI(metadata,config,gladetree)
+	appgui=gui.GUI(metadata,config,gladetree,profiler)
 	# Salida de la aplicación
 	pass
 
-def showhelp():
+def showhelp(parser=None):
 	"""
 	Mostrar ayuda del programa
 	"""
 	print '%s v%s\n%s\n\t%s' % (metadata['APP_NAME'],metadata['APP_VERSION'],
-		metadata['APP_CREDITS'],metadata['APP_DESC'])
-	print 'Ayuda'
+		metadata['APP_COPYRIGHT'],metadata['APP_DESC'])
+	if parser:
+		print
+		print parser.format_help()
 	sys.exit(1)
 
 def showversion():
 	print '%s v%s\n%s\n\t%s' % (metadata['APP_NAME'],metadata['APP_VERSION'],
-		metadata['APP_CREDITS'],metadata['APP_DESC'])
+		metadata['APP_COPYRIGHT'],metadata['APP_DESC'])
 	sys.exit(1)
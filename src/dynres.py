@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# dynres.py
+# Dynamic resolution scaling of the preview
+###############################################################################
+
+# Python imports
+import math
+
+# OpenGL imports
+from OpenGL.GL import *
+
+# Application imports
+import fbo
+
+# Default controller parameters
+DEFAULT_BUDGET=1000.0/60
+DEFAULT_MINSCALE=0.5
+# Scale changes in steps so the render size does not change every frame
+SCALE_STEP=0.125
+# Frame time smoothing factor (exponential moving average)
+SMOOTHING=0.25
+# Frames measured after a scale change before changing it again (GPU
+# timings arrive some frames late)
+SETTLE_FRAMES=6
+# Scale goes down over budget*HIGH_WATER and up under budget*LOW_WATER
+HIGH_WATER=1.05
+LOW_WATER=0.7
+
+class ResolutionController:
+    """
+    Chooses render scale to hold frame time within a budget. Pixel count
+    (and fragment work) goes with the square of the scale
+    """
+
+    def __init__(self,budget=DEFAULT_BUDGET,minscale=DEFAULT_MINSCALE):
+        """
+        Class initialization
+        """
+        self.budget=budget
+        self.minscale=minscale
+        self.scale=1.0
+        self.average=None
+        self.settle=0
+
+    def reset(self):
+        """
+        Back to full resolution
+        """
+        self.scale=1.0
+        self.average=None
+        self.settle=0
+
+    def update(self,ms):
+        """
+        Adds a frame time sample (milliseconds), returns new scale
+        """
+        if self.average is None:
+            self.average=ms
+        else:
+            self.average+=(ms-self.average)*SMOOTHING
+        if self.settle>0:
+            self.settle-=1
+            return self.scale
+        scale=self.scale
+        if self.average>self.budget*HIGH_WATER:
+            wanted=scale*math.sqrt(self.budget/self.average)
+            scale=max(math.floor(wanted/SCALE_STEP)*SCALE_STEP,self.minscale,SCALE_STEP)
+        elif self.average<self.budget*LOW_WATER:
+            scale=min(scale+SCALE_STEP,1.0)
+        if scale!=self.scale:
+            self.scale=scale
+            self.average=None
+            self.settle=SETTLE_FRAMES
+        return self.scale
+
+class ScaledTarget:
+    """
+    Offscreen target of the drawing area size. Reduced resolution frames
+    use its lower left corner and are stretched to the drawing area, so
+    scale changes never reallocate it
+    """
+
+    def __init__(self,width,height):
+        """
+        Class initialization, GL context must be current
+        """
+        self.framebuffer=fbo.Framebuffer(width,height)
+        self.size=(0,0)
+
+    def resize(self,width,height):
+        """
+        Resizes target to the drawing area size
+        """
+        self.framebuffer.resize(width,height)
+
+    def begin(self,scale):
+        """
+        Directs rendering to the target, returns scaled render size
+        """
+        width=max(int(self.framebuffer.width*scale),1)
+        height=max(int(self.framebuffer.height*scale),1)
+        glBindFramebuffer(GL_FRAMEBUFFER,self.framebuffer.fbo)
+        self.size=(width,height)
+        return self.size
+
+    def end(self):
+        """
+        Stretches the rendered frame to the default framebuffer
+        """
+        width,height=self.size
+        glBindFramebuffer(GL_READ_FRAMEBUFFER,self.framebuffer.fbo)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER,0)
+        glBlitFramebuffer(0,0,width,height,0,0,self.framebuffer.width,self.framebuffer.height,
+            GL_COLOR_BUFFER_BIT,GL_LINEAR)
+        glBindFramebuffer(GL_FRAMEBUFFER,0)
+
+    def delete(self):
+        """
+        Releases GL resources
+        """
+        self.framebuffer.delete()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# fbo.py
+# Offscreen framebuffer objects
+###############################################################################
+
+# OpenGL imports
+from OpenGL.GL import *
+
+class Framebuffer:
+    """
+    Framebuffer object with RGBA color and depth attachments. Color goes to
+    a texture when it has to be sampled later, otherwise to a renderbuffer
+    """
+
+    def __init__(self,width,height,texture=False):
+        """
+        Creates framebuffer of width x height pixels
+        """
+        self.texture=texture
+        self.fbo=glGenFramebuffers(1)
+        self.color=None
+        self.depth=None
+        self.width=0
+        self.height=0
+        self.resize(width,height)
+
+    def __release(self):
+        """
+        Releases attachments
+        """
+        if self.color is not None:
+            if self.texture:
+                glDeleteTextures([self.color])
+            else:
+                glDeleteRenderbuffers(1,[self.color])
+        if self.depth is not None:
+            glDeleteRenderbuffers(1,[self.depth])
+        self.color=self.depth=None
+
+    def resize(self,width,height):
+        """
+        Recreates attachments for a new size
+        """
+        if (width,height)==(self.width,self.height):
+            return
+        self.__release()
+        self.width=width
+        self.height=height
+        previous=glGetIntegerv(GL_FRAMEBUFFER_BINDING)
+        glBindFramebuffer(GL_FRAMEBUFFER,self.fbo)
+        if self.texture:
+            self.color=glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D,self.color)
+            glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MIN_FILTER,GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MAG_FILTER,GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_WRAP_S,GL_CLAMP_TO_EDGE)
+            glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_WRAP_T,GL_CLAMP_TO_EDGE)
+            glTexImage2D(GL_TEXTURE_2D,0,GL_RGBA8,width,height,0,GL_RGBA,GL_UNSIGNED_BYTE,None)
+            glBindTexture(GL_TEXTURE_2D,0)
+            glFramebufferTexture2D(GL_FRAMEBUFFER,GL_COLOR_ATTACHMENT0,GL_TEXTURE_2D,self.color,0)
+        else:
+            self.color=glGenRenderbuffers(1)
+            glBindRenderbuffer(GL_RENDERBUFFER,self.color)
+            glRenderbufferStorage(GL_RENDERBUFFER,GL_RGBA8,width,height)
+            glFramebufferRenderbuffer(GL_FRAMEBUFFER,GL_COLOR_ATTACHMENT0,GL_RENDERBUFFER,self.color)
+        self.depth=glGenRenderbuffers(1)
+        glBindRenderbuffer(GL_RENDERBUFFER,self.depth)
+        glRenderbufferStorage(GL_RENDERBUFFER,GL_DEPTH_COMPONENT24,width,height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER,GL_DEPTH_ATTACHMENT,GL_RENDERBUFFER,self.depth)
+        glBindRenderbuffer(GL_RENDERBUFFER,0)
+        status=glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER,previous)
+        if status!=GL_FRAMEBUFFER_COMPLETE:
+            raise ValueError, 'Framebuffer incomplete (0x%x)' % status
+
+    def bind(self):
+        """
+        Directs rendering to this framebuffer
+        """
+        glBindFramebuffer(GL_FRAMEBUFFER,self.fbo)
+        glViewport(0,0,self.width,self.height)
+
+    def unbind(self):
+        """
+        Directs rendering back to the default framebuffer
+        """
+        glBindFramebuffer(GL_FRAMEBUFFER,0)
+
+    def read(self):
+        """
+        Returns framebuffer RGBA pixels (bottom row first)
+        """
+        glBindFramebuffer(GL_READ_FRAMEBUFFER,self.fbo)
+        glPixelStorei(GL_PACK_ALIGNMENT,1)
+        data=glReadPixels(0,0,self.width,self.height,GL_RGBA,GL_UNSIGNED_BYTE)
+        glBindFramebuffer(GL_READ_FRAMEBUFFER,0)
+        if hasattr(data,'tostring'):
+            data=data.tostring()
+        return data
+
+    def delete(self):
+        """
+        Releases GL objects
+        """
+        self.__release()
+        glDeleteFramebuffers(1,[self.fbo])
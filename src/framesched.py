@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# framesched.py
+# Preview frame scheduling and frame time statistics
+###############################################################################
+
+# Python imports
+import time
+from collections import deque
+
+# GTK imports
+import gobject,gtk
+
+# Default scheduling parameters
+DEFAULT_TARGET_FPS=60
+DEFAULT_IDLE_FPS=5
+DEFAULT_HISTORY=240
+
+class FrameStats:
+    """
+    Rolling frame time history (milliseconds)
+    """
+
+    def __init__(self,size=DEFAULT_HISTORY):
+        """
+        Class initialization
+        """
+        self.times=deque(maxlen=size)
+
+    def add(self,ms):
+        """
+        Adds a frame time sample
+        """
+        self.times.append(ms)
+
+    def clear(self):
+        """
+        Clears history
+        """
+        self.times.clear()
+
+    def mean(self):
+        """
+        Mean frame time
+        """
+        if not self.times:
+            return 0.0
+        return sum(self.times)/len(self.times)
+
+    def percentile(self,p,ordered=None):
+        """
+        Frame time at percentile p (0-100)
+        """
+        if ordered is None:
+            ordered=sorted(self.times)
+        if not ordered:
+            return 0.0
+        index=min(len(ordered)-1,int(round(p/100.0*(len(ordered)-1))))
+        return ordered[index]
+
+    def summary(self):
+        """
+        Returns mean, p95 and p99 frame times
+        """
+        ordered=sorted(self.times)
+        return {
+            'samples': len(ordered),
+            'mean': self.mean(),
+            'p95': self.percentile(95,ordered),
+            'p99': self.percentile(99,ordered),
+        }
+
+class FrameScheduler:
+    """
+    Timer driven redraw of a widget at a target frame rate. A frame is only
+    requested after the previous one has been drawn, so slow frames never
+    pile up in the main loop. Time blocked in a vsync'ed buffer swap counts
+    against the frame period, so pacing never adds a second wait on top of
+    the display refresh. Rate drops to idle fps while the toplevel window is
+    unfocused and stops while the widget is hidden
+    """
+
+    def __init__(self,widget,targetfps=DEFAULT_TARGET_FPS,idlefps=DEFAULT_IDLE_FPS):
+        """
+        Class initialization
+        """
+        self.widget=widget
+        self.targetfps=targetfps
+        self.idlefps=idlefps
+        self.running=False
+        self.visible=True
+        self.focused=True
+        self.timer=None
+        self.toplevel=None
+        self.focushandlers=[]
+        self.pending=False
+        self.framestart=None
+        self.lastframe=None
+        self.stats=FrameStats()
+        self.intervals=FrameStats()
+        widget.add_events(gtk.gdk.VISIBILITY_NOTIFY_MASK)
+        widget.connect('visibility-notify-event',self.__visibility)
+        widget.connect('map-event',self.__mapped,True)
+        widget.connect('unmap-event',self.__mapped,False)
+        widget.connect('hierarchy-changed',self.__toplevel)
+
+    def __toplevel(self,widget,previous=None):
+        """
+        Tracks focus of the toplevel window containing the widget
+        """
+        toplevel=widget.get_toplevel()
+        if not toplevel.flags() & gtk.TOPLEVEL:
+            toplevel=None
+        if toplevel is self.toplevel:
+            return
+        # Handlers of the previous toplevel would keep it tracking focus
+        for handler in self.focushandlers:
+            self.toplevel.disconnect(handler)
+        self.toplevel=toplevel
+        self.focushandlers=[]
+        self.focused=True
+        if toplevel is not None:
+            self.focushandlers=[
+                toplevel.connect('focus-in-event',self.__focus,True),
+                toplevel.connect('focus-out-event',self.__focus,False)]
+
+    def __visibility(self,widget,event):
+        """
+        Visibility change callback
+        """
+        self.setvisible(event.state!=gtk.gdk.VISIBILITY_FULLY_OBSCURED)
+        return False
+
+    def __mapped(self,widget,event,status):
+        """
+        Map/unmap callback
+        """
+        self.setvisible(status)
+        return False
+
+    def __focus(self,widget,event,status):
+        """
+        Toplevel focus change callback
+        """
+        self.focused=status
+        return False
+
+    def setvisible(self,status):
+        """
+        Sets widget visibility, resuming frames when shown again
+        """
+        wasvisible=self.visible
+        self.visible=status
+        if status and not wasvisible:
+            self.schedule(0)
+
+    def fps(self):
+        """
+        Current frame rate limit
+        """
+        if self.focused:
+            return self.targetfps
+        return min(self.idlefps,self.targetfps)
+
+    def realfps(self):
+        """
+        Measured frame rate while running
+        """
+        interval=self.intervals.mean()
+        if not self.running or interval<=0:
+            return 0.0
+        return 1000.0/interval
+
+    def start(self):
+        """
+        Starts periodic redraw
+        """
+        if not self.running:
+            self.running=True
+            self.lastframe=None
+            self.intervals.clear()
+            self.schedule(0)
+
+    def stop(self):
+        """
+        Stops periodic redraw
+        """
+        self.running=False
+        if self.timer is not None:
+            gobject.source_remove(self.timer)
+            self.timer=None
+
+    def schedule(self,delay):
+        """
+        Schedules next frame after delay milliseconds
+        """
+        if not self.running or not self.visible or self.timer is not None or self.pending:
+            return
+        self.timer=gobject.timeout_add(int(max(delay,0)),self.__tick)
+
+    def __tick(self):
+        """
+        Timer callback: requests a redraw
+        """
+        self.timer=None
+        if self.running and self.visible:
+            self.pending=True
+            self.widget.queue_draw()
+        return False
+
+    def framebegin(self):
+        """
+        Marks start of a frame, returns seconds since last frame
+        """
+        now=time.time()
+        self.framestart=now
+        if self.lastframe is None or not self.running:
+            elapsed=0.0
+        else:
+            elapsed=now-self.lastframe
+            self.intervals.add(elapsed*1000.0)
+        self.lastframe=now
+        return elapsed
+
+    def frameend(self):
+        """
+        Marks end of a frame (after buffer swap) and schedules the next one
+        """
+        self.pending=False
+        if self.framestart is None:
+            return
+        now=time.time()
+        spent=(now-self.framestart)*1000.0
+        self.stats.add(spent)
+        period=1000.0/max(self.fps(),1)
+        self.schedule(period-spent)
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# gallery.py
+# Rendered thumbnails of a library of GLSLE projects
+#
+# Thumbnails are rendered in batch through one offscreen context and kept
+# on disk by content hash of the project sources, so only new or edited
+# projects are rendered again. Run as a script to render the thumbnails
+# of a directory (the editor gallery runs it in the background)
+###############################################################################
+
+# Python imports
+import os,sys,json,hashlib,tempfile,optparse
+
+# Application imports (OpenGL dependent modules are imported after
+# selecting the offscreen platform)
+import offscreen
+import imgutil
+from glslefile import GLSLEFile
+
+# Thumbnail parameters
+DEFAULT_DIRECTORY=os.path.join(os.path.expanduser('~'),'.glsleditor','cache','gallery')
+DEFAULT_SIZE=96
+DEFAULT_PRIMITIVE='Esfera'
+# Thumbnails are rendered at SUPERSAMPLE times their size and reduced
+SUPERSAMPLE=2
+# Primitive rotation of thumbnails (degrees)
+RENDER_ANGLE=30.0
+# Animation time of thumbnails (milliseconds), fixed so renders repeat
+RENDER_TIME=0
+# Bumped when rendering changes so old thumbnails are not used
+RENDER_VERSION='2'
+
+# Project file extension and index of scanned projects
+PROJECT_EXTENSION='.glsle'
+INDEX_FILE='projects.json'
+
+# Output line status of rendered projects
+STATUS_OK='ok'
+STATUS_ERROR='error'
+
+def projects(path):
+    """
+    Returns project files in directory path
+    """
+    return [os.path.join(path,name) for name in sorted(os.listdir(path))
+        if name.lower().endswith(PROJECT_EXTENSION)]
+
+def thumbnailkey(project,size,primitive):
+    """
+    Returns thumbnail hash key of a loaded project
+    """
+    digest=hashlib.sha1()
+    for value in (RENDER_VERSION,str(size),primitive,project.vertex,project.fragment):
+        digest.update(value)
+        digest.update('\0')
+    for id,texturefile in project.textures:
+        payload=project.embedded.get(texturefile)
+        if payload is not None:
+            digest.update('%s=%s;' % (id,payload.sha1))
+        else:
+            try:
+                info=os.stat(texturefile)
+                digest.update('%s=%s:%d:%d;' % (id,texturefile,info.st_mtime,info.st_size))
+            except OSError:
+                digest.update('%s=%s;' % (id,texturefile))
+    return digest.hexdigest()
+
+class GalleryCache:
+    """
+    Thumbnail files by key, plus an index of scanned projects so unchanged
+    project files are not parsed again
+    """
+
+    def __init__(self,directory=DEFAULT_DIRECTORY):
+        """
+        Class initialization
+        """
+        self.directory=directory
+        self.index=None
+        self.modified=False
+
+    def path(self,key):
+        """
+        Returns thumbnail file path of key
+        """
+        return os.path.join(self.directory,key+'.png')
+
+    def lookup(self,key):
+        """
+        Returns thumbnail file path of key if it was rendered
+        """
+        path=self.path(key)
+        if os.path.exists(path):
+            return path
+        return None
+
+    def failure(self,key):
+        """
+        Returns error log of a project that could not be rendered, or None
+        """
+        try:
+            fd=open(os.path.join(self.directory,key+'.log'))
+        except (IOError,OSError):
+            return None
+        try:
+            return fd.read()
+        finally:
+            fd.close()
+
+    def storefailure(self,key,log):
+        """
+        Records error log of a project that could not be rendered (it is
+        not rendered again until its sources change)
+        """
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd=open(os.path.join(self.directory,key+'.log'),'w')
+            try:
+                fd.write(log)
+            finally:
+                fd.close()
+        except (IOError,OSError),e:
+            print >> sys.stderr, 'Gallery error log write failed: %s' % e
+
+    def __loadindex(self):
+        """
+        Loads index of scanned projects
+        """
+        if self.index is None:
+            try:
+                fd=open(os.path.join(self.directory,INDEX_FILE))
+                try:
+                    self.index=json.load(fd)
+                finally:
+                    fd.close()
+            except (IOError,OSError,ValueError):
+                self.index={}
+
+    def scan(self,files,size=DEFAULT_SIZE,primitive=DEFAULT_PRIMITIVE):
+        """
+        Returns (filename, name, key) of each project file. Files changed
+        since last scan are parsed, name is None if a file can't be read
+        """
+        self.__loadindex()
+        entries=[]
+        for filename in files:
+            filename=os.path.abspath(filename)
+            try:
+                info=os.stat(filename)
+            except OSError:
+                continue
+            stamp=[info.st_mtime,info.st_size,size,primitive]
+            entry=self.index.get(filename)
+            if entry is None or entry[:4]!=stamp:
+                try:
+                    project=GLSLEFile(filename)
+                    entry=stamp+[project.name,thumbnailkey(project,size,primitive)]
+                except Exception:
+                    entry=stamp+[None,None]
+                self.index[filename]=entry
+                self.modified=True
+            entries.append((filename,entry[4],entry[5]))
+        return entries
+
+    def flush(self):
+        """
+        Saves index of scanned projects
+        """
+        if not self.modified:
+            return
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd,tmpname=tempfile.mkstemp(suffix='.tmp',dir=self.directory)
+            try:
+                try:
+                    os.write(fd,json.dumps(self.index))
+                finally:
+                    os.close(fd)
+                os.rename(tmpname,os.path.join(self.directory,INDEX_FILE))
+            except:
+                removequiet(tmpname)
+                raise
+            self.modified=False
+        except (IOError,OSError),e:
+            print >> sys.stderr, 'Gallery index write failed: %s' % e
+
+def removequiet(filename):
+    """
+    Removes filename, ignoring errors (used to clean up temporary files)
+    """
+    try:
+        os.remove(filename)
+    except OSError:
+        pass
+
+class ThumbnailRenderer:
+    """
+    Renders project thumbnails into a framebuffer object, GL context must
+    be current
+    """
+
+    def __init__(self,size=DEFAULT_SIZE,primitive=DEFAULT_PRIMITIVE):
+        """
+        Class initialization
+        """
+        import numpy,fbo,preview
+        self.numpy=numpy
+        self.size=size
+        self.framebuffer=fbo.Framebuffer(size*SUPERSAMPLE,size*SUPERSAMPLE)
+        self.framebuffer.bind()
+        self.renderer=preview.PreviewRenderer(primitive)
+        self.renderer.initgl()
+        self.renderer.resize(size*SUPERSAMPLE,size*SUPERSAMPLE)
+        self.renderer.angle=RENDER_ANGLE
+        self.renderer.time=RENDER_TIME
+
+    def render(self,project):
+        """
+        Renders project, returns thumbnail RGBA pixels (top row first)
+        """
+        import glslview
+        program=glslview.compile_program(project.vertex,project.fragment)
+        try:
+            self.renderer.setprogram(program)
+            self.renderer.textures.settextures([(id,texturefile,project.embedded.get(texturefile))
+                for id,texturefile in project.textures])
+            self.renderer.render()
+            pixels=self.framebuffer.read()
+        finally:
+            self.renderer.setprogram(0)
+            glslview.glDeleteProgram(program)
+        return self.reduce(pixels)
+
+    def reduce(self,pixels):
+        """
+        Averages SUPERSAMPLE x SUPERSAMPLE blocks and flips rows
+        """
+        numpy=self.numpy
+        size=self.size
+        image=numpy.frombuffer(pixels,numpy.uint8).reshape(size,SUPERSAMPLE,size,SUPERSAMPLE,4)
+        image=image.astype(numpy.uint16).sum(axis=(1,3))/(SUPERSAMPLE*SUPERSAMPLE)
+        return image[::-1].astype(numpy.uint8).tostring()
+
+    def delete(self):
+        """
+        Releases GL resources
+        """
+        self.renderer.textures.clear()
+        self.renderer.meshes.clear()
+        self.framebuffer.unbind()
+        self.framebuffer.delete()
+
+def render(jobs,cache,size=DEFAULT_SIZE,primitive=DEFAULT_PRIMITIVE,backend=None):
+    """
+    Renders thumbnails of jobs, a list of (filename, key), through one
+    offscreen context. Yields (key, path, error) as each one is done
+    """
+    if not jobs:
+        return
+    context=offscreen.OffscreenContext(16,16,backend)
+    try:
+        renderer=ThumbnailRenderer(size,primitive)
+        try:
+            for filename,key in jobs:
+                try:
+                    pixels=renderer.render(GLSLEFile(filename))
+                    if not os.path.isdir(cache.directory):
+                        os.makedirs(cache.directory)
+                    # Write to a temporary file so readers never see partial files
+                    fd,tmpname=tempfile.mkstemp(suffix='.tmp',dir=cache.directory)
+                    os.close(fd)
+                    try:
+                        imgutil.writepng(tmpname,size,size,pixels)
+                        os.rename(tmpname,cache.path(key))
+                    except:
+                        removequiet(tmpname)
+                        raise
+                except Exception,e:
+                    error=getattr(e,'log',None) or str(e)
+                    cache.storefailure(key,error)
+                    yield key,None,error
+                    continue
+                yield key,cache.path(key),None
+        finally:
+            renderer.delete()
+    finally:
+        context.destroy()
+
+def parseargs(args):
+    """
+    Command line parsing
+    """
+    parser=optparse.OptionParser(usage='%prog [opciones] PROYECTO|DIRECTORIO...',
+        description='Genera las miniaturas de la galería de proyectos GLSLE')
+    parser.add_option('-s','--size',type='int',default=DEFAULT_SIZE,
+        help='tamaño de las miniaturas (%d)' % DEFAULT_SIZE)
+    parser.add_option('-p','--primitive',default=DEFAULT_PRIMITIVE,
+        help='primitiva de las miniaturas (%s)' % DEFAULT_PRIMITIVE)
+    parser.add_option('-d','--directory',default=DEFAULT_DIRECTORY,
+        help='directorio de la caché de miniaturas')
+    parser.add_option('-b','--backend',choices=offscreen.BACKENDS,default=None,
+        help='contexto sin ventana: egl u osmesa (egl)')
+    parser.add_option('-f','--force',action='store_true',default=False,
+        help='vuelve a generar las miniaturas existentes')
+    options,paths=parser.parse_args(args)
+    if not paths:
+        parser.error('No se ha especificado ningún proyecto')
+    if options.size<1:
+        parser.error('Tamaño no válido: %s' % options.size)
+    return options,paths
+
+def main(args):
+    """
+    Renders missing thumbnails. Prints a line per project with status,
+    project file and thumbnail file separated by tabs
+    """
+    options,paths=parseargs(args)
+    files=[]
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(projects(path))
+        else:
+            files.append(path)
+    cache=GalleryCache(options.directory)
+    jobs=[]
+    # Projects with the same sources share one thumbnail, rendered once
+    sharing={}
+    for filename,name,key in cache.scan(files,options.size,options.primitive):
+        if key is None:
+            print '%s\t%s\t' % (STATUS_ERROR,filename)
+        elif key in sharing:
+            sharing[key].append(filename)
+        elif options.force or not (cache.lookup(key) or cache.failure(key) is not None):
+            jobs.append((filename,key))
+            sharing[key]=[filename]
+        elif not cache.lookup(key):
+            print '%s\t%s\t' % (STATUS_ERROR,filename)
+        else:
+            print '%s\t%s\t%s' % (STATUS_OK,filename,cache.path(key))
+    cache.flush()
+    sys.stdout.flush()
+    failed=0
+    for key,path,error in render(jobs,cache,options.size,options.primitive,options.backend):
+        for filename in sharing[key]:
+            if error:
+                print >> sys.stderr, '%s: %s' % (filename,error)
+                print '%s\t%s\t' % (STATUS_ERROR,filename)
+                failed+=1
+            else:
+                print '%s\t%s\t%s' % (STATUS_OK,filename,path)
+        # Each line is handed to the reading process as soon as it is done
+        sys.stdout.flush()
+    return failed and 1 or 0
+
+if __name__=='__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# galleryview.py
+# Shader library gallery window
+###############################################################################
+
+# Python imports
+import os,sys,subprocess
+
+# GTK imports
+import gobject,gtk
+
+# Application imports
+import gallery
+
+# Thumbnail renderer script, run in its own process
+RENDER_SCRIPT=os.path.join(os.path.dirname(os.path.abspath(__file__)),'gallery.py')
+
+class GalleryView:
+    """
+    Window with the rendered thumbnails of the projects in a directory.
+    Cached thumbnails are shown at once and missing ones are rendered in
+    a background process, appearing as they are done
+    """
+
+    def __init__(self,parent,callback,directory=gallery.DEFAULT_DIRECTORY,size=gallery.DEFAULT_SIZE):
+        """
+        Class initialization. callback(filename) is called when a project
+        is activated
+        """
+        self.callback=callback
+        self.size=size
+        self.cache=gallery.GalleryCache(directory)
+        self.process=None
+        self.watch=None
+        self.rows={}
+        self.pending=0
+        # Window widgets
+        self.window=gtk.Window()
+        self.window.set_title('Galería de shaders')
+        self.window.set_transient_for(parent)
+        self.window.set_default_size(640,480)
+        self.window.connect('delete-event',self.__close)
+        vbox=gtk.VBox(False,5)
+        vbox.set_border_width(5)
+        hbox=gtk.HBox(False,5)
+        self.chooser=gtk.FileChooserButton('Directorio de proyectos')
+        self.chooser.set_action(gtk.FILE_CHOOSER_ACTION_SELECT_FOLDER)
+        self.chooser.connect('current-folder-changed',self.__folder)
+        hbox.pack_start(self.chooser,True,True)
+        self.status=gtk.Label('')
+        hbox.pack_start(self.status,False,False)
+        vbox.pack_start(hbox,False,False)
+        self.model=gtk.ListStore(str,gtk.gdk.Pixbuf,str)
+        self.iconview=gtk.IconView(self.model)
+        self.iconview.set_text_column(0)
+        self.iconview.set_pixbuf_column(1)
+        self.iconview.set_item_width(size+16)
+        self.iconview.connect('item-activated',self.__activated)
+        scroll=gtk.ScrolledWindow()
+        scroll.set_policy(gtk.POLICY_AUTOMATIC,gtk.POLICY_AUTOMATIC)
+        scroll.add(self.iconview)
+        vbox.pack_start(scroll,True,True)
+        self.window.add(vbox)
+        # Icons of projects not rendered yet or failed
+        self.placeholder=gtk.gdk.Pixbuf(gtk.gdk.COLORSPACE_RGB,True,8,size,size)
+        self.placeholder.fill(0x80808080)
+        self.erroricon=self.window.render_icon(gtk.STOCK_DIALOG_ERROR,gtk.ICON_SIZE_DIALOG)
+
+    def setdirectory(self,directory):
+        """
+        Changes thumbnail cache directory
+        """
+        if directory!=self.cache.directory:
+            self.stop()
+            self.cache=gallery.GalleryCache(directory)
+
+    def show(self,directory):
+        """
+        Shows window with the projects of directory
+        """
+        self.window.show_all()
+        self.window.present()
+        if self.chooser.get_current_folder()!=os.path.abspath(directory):
+            self.chooser.set_current_folder(os.path.abspath(directory))
+        else:
+            self.load(directory)
+
+    def __folder(self,widget):
+        """
+        Directory selection callback
+        """
+        directory=widget.get_current_folder()
+        if directory:
+            self.load(directory)
+
+    def load(self,directory):
+        """
+        Lists projects of directory and starts rendering missing thumbnails
+        """
+        self.stop()
+        self.model.clear()
+        self.rows={}
+        try:
+            files=gallery.projects(directory)
+        except OSError,e:
+            self.status.set_text(str(e))
+            return
+        missing=[]
+        for filename,name,key in self.cache.scan(files,self.size):
+            icon=self.placeholder
+            if key is None:
+                icon=self.erroricon
+            elif self.cache.lookup(key):
+                icon=self.thumbnail(self.cache.path(key))
+            elif self.cache.failure(key) is not None:
+                icon=self.erroricon
+            else:
+                missing.append(filename)
+            iter=self.model.append((name or os.path.basename(filename),icon,filename))
+            self.rows[filename]=gtk.TreeRowReference(self.model,self.model.get_path(iter))
+        self.cache.flush()
+        self.pending=len(missing)
+        if missing:
+            self.render(missing)
+        self.updatestatus()
+
+    def thumbnail(self,path):
+        """
+        Loads a thumbnail file
+        """
+        try:
+            return gtk.gdk.pixbuf_new_from_file(path)
+        except gobject.GError:
+            return self.erroricon
+
+    def render(self,files):
+        """
+        Starts thumbnail rendering process for files
+        """
+        command=[sys.executable,RENDER_SCRIPT,'-s',str(self.size),'-d',self.cache.directory]+files
+        self.process=subprocess.Popen(command,stdout=subprocess.PIPE)
+        self.watch=gobject.io_add_watch(self.process.stdout,gobject.IO_IN | gobject.IO_HUP,self.__output)
+
+    def __output(self,fd,condition):
+        """
+        Renderer process output callback, a line per rendered project
+        """
+        line=fd.readline()
+        if not line:
+            # Renderer finished (or failed to start an offscreen context)
+            remaining=self.pending
+            self.watch=None
+            self.stop()
+            self.updatestatus()
+            if remaining>0:
+                self.status.set_text(self.status.get_text()+', %d sin miniatura' % remaining)
+            return False
+        status,filename,path=line.rstrip('\n').split('\t')
+        reference=self.rows.get(filename)
+        if reference and reference.valid():
+            if status==gallery.STATUS_OK:
+                icon=self.thumbnail(path)
+            else:
+                icon=self.erroricon
+            self.model.set_value(self.model.get_iter(reference.get_path()),1,icon)
+        self.pending-=1
+        self.updatestatus()
+        return True
+
+    def updatestatus(self):
+        """
+        Shows number of projects and thumbnails left
+        """
+        text='%d proyectos' % len(self.model)
+        if self.pending>0:
+            text+=', %d miniaturas pendientes' % self.pending
+        self.status.set_text(text)
+
+    def stop(self):
+        """
+        Stops renderer process
+        """
+        if self.watch is not None:
+            gobject.source_remove(self.watch)
+            self.watch=None
+        if self.process:
+            if self.process.poll() is None:
+                self.process.terminate()
+            self.process.wait()
+            self.process=None
+        self.pending=0
+
+    def __activated(self,iconview,path):
+        """
+        Project activation callback
+        """
+        self.callback(self.model[path][2])
+
+    def __close(self,widget,event):
+        """
+        Hides window instead of destroying it
+        """
+        self.stop()
+        self.window.hide()
+        return True
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# Parallel validation of GLSLE projects
+###############################################################################
+
+# Python imports
+import os,sys,time,json,optparse,multiprocessing
+
+# Application imports (OpenGL dependent modules are imported by workers
+# after selecting the offscreen platform)
+import offscreen
+import glslcheck
+from glslefile import GLSLEFile
+
+# Worker process offscreen context (or the error creating it)
+_context=None
+_contexterror=None
+
+def parseargs(args):
+    """
+    Command line parsing
+    """
+    parser=optparse.OptionParser(usage='%prog [opciones] PROYECTO|DIRECTORIO...',
+        description='Compila y enlaza proyectos GLSLE en paralelo y genera un informe JSON')
+    parser.add_option('-j','--jobs',type='int',default=multiprocessing.cpu_count(),
+        help='procesos de compilación (%d)' % multiprocessing.cpu_count())
+    parser.add_option('-o','--output',default='-',help='fichero del informe (salida estándar)')
+    parser.add_option('-b','--backend',choices=offscreen.BACKENDS,default=None,
+        help='contexto sin ventana: egl u osmesa (egl)')
+    parser.add_option('-d','--driver-only',action='store_true',default=False,
+        help='no validar las fuentes antes de compilarlas')
+    options,paths=parser.parse_args(args)
+    if not paths:
+        parser.error('No se ha especificado ningún proyecto')
+    if options.jobs<1:
+        parser.error('Número de procesos no válido: %s' % options.jobs)
+    return options,paths
+
+def initworker(backend):
+    """
+    Worker process initialization: each worker owns an offscreen context.
+    Failures are kept and returned by each job, a pool whose initializer
+    raises respawns its workers forever
+    """
+    global _context,_contexterror
+    try:
+        _context=offscreen.OffscreenContext(16,16,backend)
+    except Exception,e:
+        _contexterror='%s: %s' % (e.__class__.__name__,e)
+
+def diagnostics(items):
+    """
+    Diagnostics as report entries
+    """
+    return [{'line': item.line,'column': item.column,'severity': item.severity,'message': item.message}
+        for item in items]
+
+def validate(job):
+    """
+    Validates a project in a worker. Returns its report entry
+    """
+    filename,check=job
+    import benchmark,glslview
+    entry={'file': filename,'name': None,'status': 'fail','stage': None,'times': {},'log': '','diagnostics': []}
+    start=time.time()
+    try:
+        if _contexterror:
+            entry['stage']='context'
+            entry['log']=_contexterror
+            return entry
+        try:
+            project=GLSLEFile(filename)
+        except Exception,e:
+            entry['stage']='load'
+            entry['log']=str(e)
+            return entry
+        entry['name']=project.name
+        try:
+            if check:
+                for stage,source in (('vertex',project.vertex),('fragment',project.fragment)):
+                    if source and source.strip():
+                        found=glslcheck.check(source,stage)
+                        entry['diagnostics'].extend(diagnostics(found))
+                        if glslcheck.errors(found):
+                            entry['stage']=stage
+                            entry['log']='Shader validation failed'
+                            return entry
+            program,entry['times']=benchmark.compile_timed(project.vertex,project.fragment)
+            glslview.glDeleteProgram(program)
+        except glslview.ShaderError,e:
+            entry['stage']=e.stage or 'link'
+            entry['log']=e.log or str(e)
+            entry['diagnostics'].extend(diagnostics(e.diagnostics))
+            return entry
+        except Exception,e:
+            # Any other failure is recorded in the report instead of
+            # stopping the whole batch
+            entry['stage']='internal'
+            entry['log']='%s: %s' % (e.__class__.__name__,e)
+            return entry
+        entry['status']='pass'
+        return entry
+    finally:
+        entry['elapsed']=(time.time()-start)*1000.0
+
+def renderer(job):
+    """
+    Returns GL renderer and version strings of a worker context, or the
+    error creating it
+    """
+    if _contexterror:
+        return {'error': _contexterror}
+    from OpenGL.GL import glGetString,GL_RENDERER,GL_VERSION
+    return {'renderer': glGetString(GL_RENDERER),'version': glGetString(GL_VERSION)}
+
+def main(args):
+    """
+    Batch validation entry point
+    """
+    options,paths=parseargs(args)
+    # Workers inherit the selected platform
+    backend=offscreen.select(options.backend)
+    try:
+        import benchmark
+    except Exception,e:
+        print >> sys.stderr, 'No se ha podido cargar OpenGL (%s): %s' % (backend,e)
+        return 1
+    files=benchmark.project_files(paths)
+    start=time.time()
+    pool=multiprocessing.Pool(options.jobs,initworker,(backend,))
+    try:
+        info=pool.map(renderer,[None])[0]
+        if 'error' in info:
+            print >> sys.stderr, 'No se ha podido crear el contexto sin ventana: %s' % info['error']
+            return 1
+        entries=pool.map(validate,[(filename,not options.driver_only) for filename in files],chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    passed=len([entry for entry in entries if entry['status']=='pass'])
+    report={
+        'backend': backend,
+        'renderer': info['renderer'],
+        'version': info['version'],
+        'jobs': options.jobs,
+        'elapsed': (time.time()-start)*1000.0,
+        'total': len(entries),
+        'passed': passed,
+        'failed': len(entries)-passed,
+        'projects': entries,
+    }
+    if options.output=='-':
+        json.dump(report,sys.stdout,indent=2,sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        fd=open(options.output,'w')
+        try:
+            json.dump(report,fd,indent=2,sort_keys=True)
+        finally:
+            fd.close()
+        print >> sys.stderr, '%d proyectos, %d correctos, %d con errores (%.1f s)' % (len(entries),passed,
+            len(entries)-passed,report['elapsed']/1000.0)
+    return report['failed'] and 1 or 0
+
+if __name__=='__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# glslbench.py
+# Headless benchmark of GLSLE projects
+###############################################################################
+
+# Python imports
+import sys,optparse,multiprocessing
+
+# Application imports (OpenGL dependent modules are imported after
+# selecting the offscreen platform)
+import offscreen
+import variants
+import profiler
+from glslefile import GLSLEFile
+
+def parseargs(args):
+    """
+    Command line parsing
+    """
+    parser=optparse.OptionParser(usage='%prog [opciones] PROYECTO|DIRECTORIO...',
+        description='Compila y renderiza proyectos GLSLE sin ventana y muestra sus tiempos')
+    parser.add_option('-n','--frames',type='int',default=100,help='fotogramas por primitiva (100)')
+    parser.add_option('-s','--size',default='256x256',help='tamaño del framebuffer (256x256)')
+    parser.add_option('-p','--primitives',default=None,help='primitivas separadas por comas (todas)')
+    parser.add_option('-b','--backend',choices=offscreen.BACKENDS,default=None,
+        help='contexto sin ventana: egl u osmesa (egl)')
+    parser.add_option('-V','--variants',action='store_true',default=False,
+        help='mide todas las variantes de los ejes de cada proyecto')
+    parser.add_option('-a','--axis',action='append',default=[],metavar='NOMBRE=V1,V2',
+        help='eje de variantes (sustituye al del proyecto con el mismo nombre)')
+    parser.add_option('-j','--jobs',type='int',default=multiprocessing.cpu_count(),
+        help='procesos para compilar variantes (%d)' % multiprocessing.cpu_count())
+    parser.add_option('-t','--trace',default=None,metavar='FICHERO',
+        help='guarda una traza de perfilado (formato Chrome trace)')
+    options,paths=parser.parse_args(args)
+    if not paths:
+        parser.error('No se ha especificado ningún proyecto')
+    try:
+        options.width,options.height=[int(value) for value in options.size.split('x')]
+    except ValueError:
+        parser.error('Tamaño no válido: %s' % options.size)
+    try:
+        options.axes=[variants.parse_axis(axis) for axis in options.axis]
+    except ValueError,e:
+        parser.error(str(e))
+    if options.axes:
+        options.variants=True
+    return options,paths
+
+def formatms(value):
+    """
+    Formats an optional milliseconds value
+    """
+    if value is None:
+        return '-'
+    return '%.3f' % value
+
+def reporterror(label,e):
+    """
+    Prints a project failure (with its compiler log if any)
+    """
+    print >> sys.stderr, '%s: %s' % (label,e)
+    if getattr(e,'log',None):
+        print >> sys.stderr, e.log
+
+def loadprojects(filenames):
+    """
+    Loads projects, returns (project, filename) list and failed filenames
+    """
+    projects=[]
+    failed=[]
+    for filename in filenames:
+        try:
+            projects.append((GLSLEFile(filename),filename))
+        except Exception,e:
+            reporterror(filename,e)
+            failed.append(filename)
+    return projects,failed
+
+def main(args):
+    """
+    Benchmark entry point
+    """
+    options,paths=parseargs(args)
+    if options.variants:
+        return benchvariants(options,paths)
+    try:
+        context=offscreen.OffscreenContext(options.width,options.height,options.backend)
+    except Exception,e:
+        reporterror('Contexto sin ventana',e)
+        return 1
+    try:
+        import benchmark
+        primitives=benchmark.available_primitives()
+        if options.primitives:
+            primitives=[name for name in options.primitives.split(',') if name in primitives]
+        bench=benchmark.Benchmark(options.width,options.height)
+        profiler.PROFILER.enable(bool(options.trace))
+        row='%-28s %-8s %10s %10s %10s %10s %10s'
+        print row % ('Proyecto','Primitiva','FPS','GPU ms','Vert. ms','Frag. ms','Link ms')
+        projects,failures=loadprojects(benchmark.project_files(paths))
+        for filename in failures:
+            print row % (filename[-28:],'-','ERROR','-','-','-','-')
+        failed=len(failures)
+        for project,filename in projects:
+            try:
+                program,times=benchmark.compile_timed(project.vertex,project.fragment)
+            except Exception,e:
+                print row % (project.name[:28],'-','ERROR','-','-','-','-')
+                reporterror(filename,e)
+                failed+=1
+                continue
+            try:
+                for primitive in primitives:
+                    result=bench.run(program,primitive,options.frames)
+                    print row % (project.name[:28],primitive,'%.1f' % result['fps'],formatms(result['gpu']),
+                        formatms(times.get('vertex')),formatms(times.get('fragment')),formatms(times.get('link')))
+            except Exception,e:
+                print row % (project.name[:28],'-','ERROR','-','-','-','-')
+                reporterror(filename,e)
+                failed+=1
+            benchmark.glslview.glDeleteProgram(program)
+        if options.trace:
+            profiler.PROFILER.export(options.trace)
+        bench.delete()
+    finally:
+        context.destroy()
+    return failed and 1 or 0
+
+def benchvariants(options,paths):
+    """
+    Benchmarks every variant of each project. Variants are compiled in
+    parallel (skipping those already built) before measuring them
+    """
+    backend=offscreen.select(options.backend)
+    import benchmark
+    jobs=[]
+    projects=[]
+    loaded,failures=loadprojects(benchmark.project_files(paths))
+    for project,filename in loaded:
+        axes=dict(project.axes)
+        axes.update(dict(options.axes))
+        combos=variants.combinations(sorted(axes.items()))
+        projects.append((project,combos))
+        jobs.extend([(project.vertex,project.fragment,defines) for defines in combos])
+    # Worker processes are forked before this process creates a context
+    built=iter(variants.build_all(jobs,options.jobs,backend))
+    try:
+        context=offscreen.OffscreenContext(options.width,options.height,backend)
+    except Exception,e:
+        reporterror('Contexto sin ventana',e)
+        return 1
+    try:
+        import glslview,binarycache
+        primitives=benchmark.available_primitives()
+        if options.primitives:
+            primitives=[name for name in options.primitives.split(',') if name in primitives]
+        bench=benchmark.Benchmark(options.width,options.height)
+        programs=glslview.ProgramCache(binarycache=binarycache.ProgramBinaryCache())
+        row='%-20s %-24s %-8s %10s %10s %10s %10s %10s'
+        print row % ('Proyecto','Variante','Primitiva','FPS','GPU ms','Vert. ms','Frag. ms','Link ms')
+        for filename in failures:
+            print row % (filename[-20:],'-','-','ERROR','-','-','-','-')
+        failed=len(failures)
+        for project,combos in projects:
+            best=None
+            for defines in combos:
+                key,times,cached,error=built.next()
+                name=variants.variant_name(defines)
+                if error:
+                    print row % (project.name[:20],name[:24],'-','ERROR','-','-','-','-')
+                    print >> sys.stderr, '%s [%s]: %s' % (project.name,name,error)
+                    failed+=1
+                    continue
+                gputimes=[]
+                try:
+                    program=programs.get(project.vertex,project.fragment,defines)
+                    for primitive in primitives:
+                        result=bench.run(program,primitive,options.frames)
+                        if result['gpu'] is not None:
+                            gputimes.append(result['gpu'])
+                        print row % (project.name[:20],name[:24],primitive,'%.1f' % result['fps'],formatms(result['gpu']),
+                            formatms(times.get('vertex')),formatms(times.get('fragment')),formatms(times.get('link')))
+                except Exception,e:
+                    print row % (project.name[:20],name[:24],'-','ERROR','-','-','-','-')
+                    reporterror('%s [%s]' % (project.name,name),e)
+                    failed+=1
+                    continue
+                if gputimes:
+                    mean=sum(gputimes)/len(gputimes)
+                    if best is None or mean<best[0]:
+                        best=(mean,name)
+            if best:
+                print 'Variante más rápida de %s: %s (%.3f ms GPU de media)' % (project.name,best[1],best[0])
+        programs.clear()
+        bench.delete()
+    finally:
+        context.destroy()
+    return failed and 1 or 0
+
+if __name__=='__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# glslcapture.py
+# Headless export of animated GLSLE project frames
+###############################################################################
+
+# Python imports
+import sys,time,optparse
+
+# Application imports (OpenGL dependent modules are imported after
+# selecting the offscreen platform)
+import offscreen
+from glslefile import GLSLEFile
+
+# Preview rotation of exported frames (degrees per second of animation)
+ROTATION_SPEED=12.0
+
+def parseargs(args):
+    """
+    Command line parsing
+    """
+    parser=optparse.OptionParser(usage='%prog [opciones] PROYECTO',
+        description='Renderiza sin ventana la animación de un proyecto GLSLE y exporta sus fotogramas '
+            'como secuencia PNG o como imágenes RGBA sin comprimir a una orden')
+    parser.add_option('-n','--frames',type='int',default=120,help='fotogramas exportados (120)')
+    parser.add_option('-s','--size',default='512x512',help='tamaño de los fotogramas (512x512)')
+    parser.add_option('-p','--primitive',default='Esfera',help='primitiva (Esfera)')
+    parser.add_option('-r','--rate',type='float',default=30.0,
+        help='fotogramas por segundo de la animación (30)')
+    parser.add_option('-o','--output',default='frames',metavar='DIRECTORIO',
+        help='directorio de la secuencia PNG (frames)')
+    parser.add_option('-c','--command',default=None,metavar='ORDEN',
+        help='envía los fotogramas a la entrada de ORDEN; {width} y {height} se sustituyen por el tamaño')
+    parser.add_option('-b','--backend',choices=offscreen.BACKENDS,default=None,
+        help='contexto sin ventana: egl u osmesa (egl)')
+    options,paths=parser.parse_args(args)
+    if len(paths)!=1:
+        parser.error('Debe especificarse un proyecto')
+    try:
+        options.width,options.height=[int(value) for value in options.size.split('x')]
+    except ValueError:
+        parser.error('Tamaño no válido: %s' % options.size)
+    if options.frames<1 or options.rate<=0:
+        parser.error('Número de fotogramas o velocidad no válidos')
+    return options,paths[0]
+
+def reporterror(label,e):
+    """
+    Prints a failure (with its compiler log if any)
+    """
+    print >> sys.stderr, '%s: %s' % (label,e)
+    if getattr(e,'log',None):
+        print >> sys.stderr, e.log
+
+def main(args):
+    """
+    Export entry point
+    """
+    options,filename=parseargs(args)
+    try:
+        project=GLSLEFile(filename)
+    except Exception,e:
+        reporterror(filename,e)
+        return 1
+    try:
+        context=offscreen.OffscreenContext(options.width,options.height,options.backend)
+    except Exception,e:
+        reporterror('Contexto sin ventana',e)
+        return 1
+    import fbo,preview,glslview,capture
+    try:
+        program=glslview.compile_program(project.vertex,project.fragment)
+    except Exception,e:
+        reporterror(filename,e)
+        context.destroy()
+        return 1
+    framebuffer=fbo.Framebuffer(options.width,options.height)
+    framebuffer.bind()
+    renderer=preview.PreviewRenderer(options.primitive)
+    renderer.initgl()
+    renderer.resize(options.width,options.height)
+    renderer.setprogram(program)
+    renderer.textures.settextures([(id,texturefile,project.embedded.get(texturefile))
+        for id,texturefile in project.textures])
+    if options.command:
+        sink=capture.PipeSink(options.command)
+    else:
+        sink=capture.PNGSink(options.output)
+    writer=capture.FrameWriter(sink)
+    reader=capture.PixelReader()
+    start=time.time()
+    for frame in range(options.frames):
+        # Exported frames do not depend on how fast they are rendered
+        renderer.angle=ROTATION_SPEED*frame/options.rate
+        renderer.time=frame*1000.0/options.rate
+        renderer.render()
+        if not reader.read(options.width,options.height,frame):
+            # Every pixel buffer in flight: wait for the oldest one
+            results=reader.collect(wait=True)
+            reader.read(options.width,options.height,frame)
+        else:
+            results=reader.collect()
+        for tag,width,height,pixels in results:
+            while writer.queued()>=writer.backlog:
+                # Nothing else to do while the writer catches up
+                time.sleep(0.001)
+            writer.put(tag,width,height,pixels)
+    rendered=time.time()-start
+    for tag,width,height,pixels in reader.collect(wait=True):
+        writer.put(tag,width,height,pixels)
+    writer.close(wait=True)
+    elapsed=time.time()-start
+    reader.delete()
+    renderer.textures.clear()
+    renderer.meshes.clear()
+    framebuffer.unbind()
+    framebuffer.delete()
+    context.destroy()
+    if writer.error:
+        print >> sys.stderr, 'Error exportando fotogramas: %s' % writer.error
+        return 1
+    stats=writer.stats()
+    print '%d fotogramas exportados a %s' % (stats['frames'],sink.describe())
+    print 'Renderizado %.1f fps, exportación %.1f fps (escritura %.1f fps, %.1f MB/s)' % (
+        options.frames/max(rendered,1e-9),stats['frames']/max(elapsed,1e-9),stats['writefps'],stats['mbps'])
+    return 0
+
+if __name__=='__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,1273 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# glslcheck.py
+# GLSL source validation without a GL context
+###############################################################################
+
+# Python imports
+import re,bisect
+
+# Diagnostic severities
+ERROR='error'
+WARNING='warning'
+
+# Maximum number of syntax errors reported per source
+MAX_ERRORS=20
+
+# Token kinds
+IDENTIFIER='id'
+INTEGER='int'
+FLOAT='float'
+OPERATOR='op'
+EOF='eof'
+
+# Lexer states at line ends
+NORMAL=0
+COMMENT=1
+
+TOKEN_RE=re.compile(r'''
+    (?P<space>\s+)|
+    (?P<linecomment>//.*)|
+    (?P<comment>/\*)|
+    (?P<float>(?:\d+\.\d*|\.\d+)(?:[eE][+-]?\d+)?(?:lf|LF|[fF])?|\d+[eE][+-]?\d+(?:lf|LF|[fF])?)|
+    (?P<int>0[xX][0-9a-fA-F]+[uU]?|\d+[uU]?)|
+    (?P<id>[A-Za-z_]\w*)|
+    (?P<op><<=|>>=|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||\^\^|\+=|-=|\*=|/=|%=|&=|\|=|\^=|\#\#|[-+*/%<>=!~&|^?:;,.(){}\[\]\#])
+''',re.VERBOSE)
+
+# Basic, vector, matrix, sampler and image type names
+TYPE_RE=re.compile(r'^(void|bool|int|uint|float|double|[biud]?vec[234]|d?mat[234](x[234])?|[iu]?sampler\w+|[iu]?image\w+|atomic_uint)$')
+
+QUALIFIERS=set(['const','attribute','varying','uniform','in','out','inout','centroid','flat','smooth',
+    'noperspective','invariant','precise','highp','mediump','lowp','patch','sample','buffer','shared',
+    'coherent','volatile','restrict','readonly','writeonly','subroutine'])
+
+ASSIGNMENTS=set(['=','+=','-=','*=','/=','%=','<<=','>>=','&=','|=','^='])
+
+# Binary operators by increasing precedence
+BINARY=[['||'],['^^'],['&&'],['|'],['^'],['&'],['==','!='],['<','>','<=','>='],['<<','>>'],['+','-'],['*','/','%']]
+
+# Driver info log formats: Mesa/Intel, NVIDIA, AMD/3Dlabs
+LOG_RE=[
+    (re.compile(r'^\s*\d+:(\d+)\((\d+)\)\s*:\s*(error|warning)\s*:?\s*(.*)$',re.I),(1,2,3,4)),
+    (re.compile(r'^\s*\d+\((\d+)\)\s*:\s*(error|warning)\s*(?:\w+\s*:)?\s*(.*)$',re.I),(1,None,2,3)),
+    (re.compile(r'^\s*(error|warning)\s*:\s*\d+:(\d+)\s*:\s*(.*)$',re.I),(2,None,1,3)),
+]
+
+class Diagnostic:
+    """
+    Source problem at a line and column (both 1 based, 0 if unknown)
+    """
+
+    def __init__(self,line,column,severity,message):
+        """
+        Class initialization
+        """
+        self.line=line
+        self.column=column
+        self.severity=severity
+        self.message=message
+
+    def __cmp__(self,other):
+        """
+        Diagnostics are sorted by position
+        """
+        return cmp((self.line,self.column),(other.line,other.column))
+
+    def __repr__(self):
+        """
+        Diagnostic representation
+        """
+        return 'Diagnostic(%d,%d,%r,%r)' % (self.line,self.column,self.severity,self.message)
+
+    def __str__(self):
+        """
+        Diagnostic as text
+        """
+        return '%d:%d: %s: %s' % (self.line,self.column,self.severity,self.message)
+
+def parse_log(log):
+    """
+    Returns diagnostics from a driver compile or link info log
+    """
+    diagnostics=[]
+    for text in (log or '').splitlines():
+        if not text.strip():
+            continue
+        for regexp,groups in LOG_RE:
+            match=regexp.match(text)
+            if match:
+                line=int(match.group(groups[0]))
+                column=groups[1] and int(match.group(groups[1])) or 0
+                severity=match.group(groups[2]).lower()
+                diagnostics.append(Diagnostic(line,column,severity,match.group(groups[3]).strip()))
+                break
+        else:
+            if 'error' in text.lower():
+                diagnostics.append(Diagnostic(0,0,ERROR,text.strip()))
+    return diagnostics
+
+class ParseError(Exception):
+    """
+    Syntax error at a token
+    """
+
+    def __init__(self,token,message):
+        """
+        Class initialization
+        """
+        Exception.__init__(self,message)
+        self.token=token
+
+def lexline(text,state):
+    """
+    Splits a source line into (kind, value, column) tokens. Returns tokens,
+    problems as (column, message) and lexer state at line end
+    """
+    tokens=[]
+    problems=[]
+    position=0
+    length=len(text)
+    if state==COMMENT:
+        end=text.find('*/')
+        if end<0:
+            return tokens,problems,COMMENT
+        position=end+2
+    while position<length:
+        match=TOKEN_RE.match(text,position)
+        if not match:
+            problems.append((position+1,'unexpected character %r' % text[position]))
+            position+=1
+            continue
+        kind=match.lastgroup
+        if kind=='comment':
+            end=text.find('*/',match.end())
+            if end<0:
+                return tokens,problems,COMMENT
+            position=end+2
+            continue
+        if kind=='float' or kind=='int' or kind=='id' or kind=='op':
+            tokens.append((kind,match.group(),position+1))
+        position=match.end()
+    return tokens,problems,NORMAL
+
+def continued(text):
+    """
+    Checks if a line continues on the next one (ends with a backslash)
+    """
+    return text.rstrip().endswith('\\')
+
+def lexlines(segments,state):
+    """
+    Lexes a line continued on the next segments as one line. Returns per
+    segment (tokens, problems, state), every token and problem placed on
+    the segment where it starts
+    """
+    if len(segments)==1:
+        return [lexline(segments[0],state)]
+    text=''
+    starts=[]
+    for segment in segments[:-1]:
+        starts.append(len(text))
+        text+=segment.rstrip()[:-1]
+    starts.append(len(text))
+    text+=segments[-1]
+    tokens,problems,state=lexline(text,state)
+    results=[([],[],state) for segment in segments]
+    for kind,value,column in tokens:
+        number=bisect.bisect_right(starts,column-1)-1
+        results[number][0].append((kind,value,column-starts[number]))
+    for column,message in problems:
+        number=bisect.bisect_right(starts,column-1)-1
+        results[number][1].append((column-starts[number],message))
+    return results
+
+class Lexer:
+    """
+    Incremental line lexer. Lines are cached by text and starting state, so
+    relexing an edited source only tokenizes changed lines. Lines ending
+    with a backslash are joined with the next one before lexing
+    """
+
+    def __init__(self):
+        """
+        Class initialization
+        """
+        self.cache={}
+        self.lexed=0
+
+    def lex(self,source):
+        """
+        Returns per line (tokens, problems) of source and if a comment is
+        left open at the end
+        """
+        cache={}
+        lines=[]
+        state=NORMAL
+        sourcelines=source.split('\n')
+        index=0
+        while index<len(sourcelines):
+            segments=[sourcelines[index]]
+            while continued(segments[-1]) and index+len(segments)<len(sourcelines):
+                segments.append(sourcelines[index+len(segments)])
+            key=(tuple(segments),state)
+            result=self.cache.get(key)
+            if result is None:
+                result=lexlines(segments,state)
+                self.lexed+=1
+            cache[key]=result
+            lines.extend(result)
+            state=result[-1][2]
+            index+=len(segments)
+        # Only lines of the current source are kept
+        self.cache=cache
+        return lines,state==COMMENT
+
+class Preprocessor:
+    """
+    GLSL preprocessor: conditionals, object and function like macros and
+    directive checks. Produces (kind, value, line, column) tokens. Lines
+    of inactive conditional regions are kept in skipped
+    """
+
+    def __init__(self,diagnostics):
+        """
+        Class initialization
+        """
+        self.diagnostics=diagnostics
+        self.macros={}
+        self.version=None
+        self.skipped=set()
+
+    def error(self,line,column,message,severity=ERROR):
+        """
+        Adds a diagnostic
+        """
+        self.diagnostics.append(Diagnostic(line,column,severity,message))
+
+    def run(self,lines,sourcelines):
+        """
+        Preprocesses lexed lines, returns token list
+        """
+        output=[]
+        pending=[]
+        conditions=[]
+        seen=False
+        index=0
+        while index<len(lines):
+            tokens=[(kind,value,index+1,column) for kind,value,column in lines[index][0]]
+            first=index+1
+            # Directive continuation lines
+            while tokens and tokens[0][1]=='#' and continued(sourcelines[index]) and index+1<len(lines):
+                index+=1
+                tokens.extend([(kind,value,index+1,column) for kind,value,column in lines[index][0]])
+            index+=1
+            active=not conditions or conditions[-1][0]
+            if not active:
+                self.skipped.update(range(first,index+1))
+            if tokens and tokens[0][1]=='#':
+                if active:
+                    output.extend(self.expand(pending))
+                    pending=[]
+                self.directive(tokens,conditions,active,seen)
+                seen=True
+                continue
+            if active:
+                pending.extend(tokens)
+                if tokens:
+                    seen=True
+        output.extend(self.expand(pending))
+        for condition in conditions:
+            self.error(condition[3],1,'unterminated #if')
+        return output
+
+    def directive(self,tokens,conditions,active,seen):
+        """
+        Processes a directive line
+        """
+        line=tokens[0][2]
+        if len(tokens)==1:
+            return
+        name=tokens[1][1]
+        arguments=tokens[2:]
+        if name in ('if','ifdef','ifndef'):
+            if not active:
+                conditions.append([False,True,False,line])
+                return
+            if name=='if':
+                value=self.evaluate(arguments,line)
+            else:
+                if not arguments or arguments[0][0]!=IDENTIFIER:
+                    self.error(line,tokens[1][3],'#%s without macro name' % name)
+                    value=False
+                else:
+                    value=(arguments[0][1] in self.macros)==(name=='ifdef')
+            conditions.append([value,value,False,line])
+            return
+        if name in ('elif','else','endif'):
+            if not conditions:
+                self.error(line,tokens[1][3],'#%s without #if' % name)
+                return
+            condition=conditions[-1]
+            parent=len(conditions)<2 or conditions[-2][0]
+            if name=='endif':
+                conditions.pop()
+            elif condition[2]:
+                self.error(line,tokens[1][3],'#%s after #else' % name)
+            elif name=='else':
+                condition[0]=parent and not condition[1]
+                condition[1]=True
+                condition[2]=True
+            else:
+                value=parent and not condition[1] and self.evaluate(arguments,line)
+                condition[0]=value
+                condition[1]=condition[1] or value
+            return
+        if not active:
+            return
+        if name=='define':
+            self.define(arguments,line,tokens[1][3])
+        elif name=='undef':
+            if arguments and arguments[0][0]==IDENTIFIER:
+                self.macros.pop(arguments[0][1],None)
+            else:
+                self.error(line,tokens[1][3],'#undef without macro name')
+        elif name=='version':
+            if seen:
+                self.error(line,tokens[0][3],'#version must occur before any other statement')
+            if not arguments or arguments[0][0]!=INTEGER:
+                self.error(line,tokens[1][3],'#version without version number')
+            else:
+                self.version=int(arguments[0][1])
+        elif name=='error':
+            self.error(line,tokens[0][3],'#error ' + ' '.join([token[1] for token in arguments]))
+        elif name not in ('extension','pragma','line'):
+            self.error(line,tokens[1][3],'unknown preprocessor directive #%s' % name)
+
+    def define(self,arguments,line,column):
+        """
+        Processes a #define directive
+        """
+        if not arguments or arguments[0][0]!=IDENTIFIER:
+            self.error(line,column,'#define without macro name')
+            return
+        name=arguments[0]
+        body=arguments[1:]
+        parameters=None
+        # Function like macro: parenthesis just after the name
+        if body and body[0][1]=='(' and body[0][3]==name[3]+len(name[1]):
+            parameters=[]
+            position=1
+            while position<len(body) and body[position][1]!=')':
+                if body[position][0]==IDENTIFIER:
+                    parameters.append(body[position][1])
+                elif body[position][1]!=',':
+                    self.error(line,body[position][3],'invalid macro parameter')
+                position+=1
+            if position>=len(body):
+                self.error(line,body[0][3],'unterminated macro parameter list')
+                return
+            body=body[position+1:]
+        if body and (body[0][1]=='##' or body[-1][1]=='##'):
+            self.error(line,body[0][1]=='##' and body[0][3] or body[-1][3],
+                "'##' cannot appear at either end of a macro expansion")
+            return
+        if name[1].startswith('GL_'):
+            self.error(line,name[3],'macro names beginning with GL_ are reserved')
+        self.macros[name[1]]=(parameters,body)
+
+    def expand(self,tokens,hidden=frozenset()):
+        """
+        Returns tokens with macros expanded
+        """
+        output=[]
+        position=0
+        while position<len(tokens):
+            token=tokens[position]
+            position+=1
+            macro=token[0]==IDENTIFIER and token[1] not in hidden and self.macros.get(token[1])
+            if not macro:
+                output.append(token)
+                continue
+            parameters,body=macro
+            # Expanded tokens take the macro use position
+            body=[(kind,value,token[2],token[3]) for kind,value,line,column in body]
+            if parameters is not None:
+                if position>=len(tokens) or tokens[position][1]!='(':
+                    output.append(token)
+                    continue
+                arguments,position=self.arguments(tokens,position+1,token)
+                if arguments is None:
+                    return output
+                if len(arguments)!=len(parameters) and not (not parameters and arguments==[[]]):
+                    self.error(token[2],token[3],'wrong number of arguments for macro %s' % token[1])
+                body=self.substitute(body,dict(zip(parameters,arguments)),hidden)
+            else:
+                body=self.substitute(body,{},hidden)
+            output.extend(self.expand(body,hidden|frozenset([token[1]])))
+        return output
+
+    def substitute(self,body,arguments,hidden):
+        """
+        Replaces macro parameters in body by their arguments (not expanded
+        next to '##') and pastes the tokens joined by '##'
+        """
+        substituted=[]
+        paste=False
+        for index,item in enumerate(body):
+            if item[1]=='##':
+                paste=True
+                continue
+            if item[0]==IDENTIFIER and item[1] in arguments:
+                replacement=arguments[item[1]]
+                if not paste and not (index+1<len(body) and body[index+1][1]=='##'):
+                    replacement=self.expand(replacement,hidden)
+            else:
+                replacement=[item]
+            if paste and substituted and replacement:
+                substituted.append(self.paste(substituted.pop(),replacement[0]))
+                substituted.extend(replacement[1:])
+            else:
+                substituted.extend(replacement)
+            paste=False
+        return substituted
+
+    def paste(self,left,right):
+        """
+        Joins two tokens into one (## operator)
+        """
+        text=left[1]+right[1]
+        match=TOKEN_RE.match(text)
+        if not match or match.end()!=len(text) or match.lastgroup not in (FLOAT,INTEGER,IDENTIFIER,OPERATOR):
+            self.error(left[2],left[3],"pasting '%s' and '%s' does not give a valid token" % (left[1],right[1]))
+            return left
+        return (match.lastgroup,text,left[2],left[3])
+
+    def arguments(self,tokens,position,token):
+        """
+        Collects macro arguments after its opening parenthesis
+        """
+        arguments=[[]]
+        depth=0
+        while position<len(tokens):
+            item=tokens[position]
+            position+=1
+            if item[1]=='(':
+                depth+=1
+            elif item[1]==')':
+                if not depth:
+                    return arguments,position
+                depth-=1
+            elif item[1]==',' and not depth:
+                arguments.append([])
+                continue
+            arguments[-1].append(item)
+        self.error(token[2],token[3],'unterminated argument list for macro %s' % token[1])
+        return None,position
+
+    def evaluate(self,tokens,line):
+        """
+        Evaluates a #if expression
+        """
+        resolved=[]
+        position=0
+        while position<len(tokens):
+            token=tokens[position]
+            position+=1
+            if token[1]=='defined':
+                parenthesis=position<len(tokens) and tokens[position][1]=='('
+                if parenthesis:
+                    position+=1
+                if position>=len(tokens) or tokens[position][0]!=IDENTIFIER:
+                    self.error(line,token[3],'defined without macro name')
+                    return False
+                resolved.append((INTEGER,str(int(tokens[position][1] in self.macros)),line,token[3]))
+                position+=1
+                if parenthesis:
+                    if position>=len(tokens) or tokens[position][1]!=')':
+                        self.error(line,token[3],'missing ) after defined')
+                        return False
+                    position+=1
+            else:
+                resolved.append(token)
+        expression=[]
+        for token in self.expand(resolved):
+            if token[0]==IDENTIFIER:
+                # Undefined macros evaluate to 0
+                expression.append((INTEGER,'0',token[2],token[3]))
+            else:
+                expression.append(token)
+        if not expression:
+            self.error(line,1,'#if with no expression')
+            return False
+        try:
+            evaluator=Evaluator(expression)
+            value=evaluator.conditional()
+            if evaluator.position<len(expression):
+                raise ParseError(expression[evaluator.position],'unexpected %s' % expression[evaluator.position][1])
+        except ParseError,e:
+            self.error(line,e.token[3],'invalid #if expression: %s' % e)
+            return False
+        except ZeroDivisionError:
+            self.error(line,1,'division by zero in #if expression')
+            return False
+        return bool(value)
+
+class Evaluator:
+    """
+    Integer constant expression evaluator for #if directives
+    """
+
+    def __init__(self,tokens):
+        """
+        Class initialization
+        """
+        self.tokens=tokens
+        self.position=0
+
+    def peek(self):
+        """
+        Returns next token value
+        """
+        if self.position<len(self.tokens):
+            return self.tokens[self.position][1]
+        return None
+
+    def next(self):
+        """
+        Consumes next token
+        """
+        if self.position>=len(self.tokens):
+            raise ParseError(self.tokens[-1],'unexpected end of expression')
+        token=self.tokens[self.position]
+        self.position+=1
+        return token
+
+    def conditional(self):
+        """
+        Ternary operator level
+        """
+        value=self.binary(0)
+        if self.peek()=='?':
+            self.next()
+            first=self.conditional()
+            if self.next()[1]!=':':
+                raise ParseError(self.tokens[self.position-1],'expected :')
+            second=self.conditional()
+            value=value and first or second
+        return value
+
+    def binary(self,level):
+        """
+        Binary operator level
+        """
+        if level>=len(BINARY):
+            return self.unary()
+        value=self.binary(level+1)
+        while self.peek() in BINARY[level]:
+            operator=self.next()[1]
+            other=self.binary(level+1)
+            if operator=='||': value=int(bool(value or other))
+            elif operator=='^^': value=int(bool(value)!=bool(other))
+            elif operator=='&&': value=int(bool(value and other))
+            elif operator=='|': value=value|other
+            elif operator=='^': value=value^other
+            elif operator=='&': value=value&other
+            elif operator=='==': value=int(value==other)
+            elif operator=='!=': value=int(value!=other)
+            elif operator=='<': value=int(value<other)
+            elif operator=='>': value=int(value>other)
+            elif operator=='<=': value=int(value<=other)
+            elif operator=='>=': value=int(value>=other)
+            elif operator=='<<': value=value<<other
+            elif operator=='>>': value=value>>other
+            elif operator=='+': value=value+other
+            elif operator=='-': value=value-other
+            elif operator=='*': value=value*other
+            elif operator=='/': value=int(float(value)/other)
+            elif operator=='%': value=value%other
+        return value
+
+    def unary(self):
+        """
+        Unary operators and primary values
+        """
+        token=self.next()
+        if token[1]=='-': return -self.unary()
+        if token[1]=='+': return self.unary()
+        if token[1]=='!': return int(not self.unary())
+        if token[1]=='~': return ~self.unary()
+        if token[1]=='(':
+            value=self.conditional()
+            if self.next()[1]!=')':
+                raise ParseError(self.tokens[self.position-1],'expected )')
+            return value
+        if token[0]==INTEGER:
+            return int(token[1].rstrip('uU'),0) if not token[1].startswith('0') or token[1][:2].lower()=='0x' else int(token[1].rstrip('uU') or '0',8)
+        raise ParseError(token,'unexpected %s' % token[1])
+
+class Parser:
+    """
+    Recursive descent GLSL parser. Only checks syntax, reporting errors
+    and resynchronizing at statement boundaries
+    """
+
+    def __init__(self,tokens,diagnostics):
+        """
+        Class initialization
+        """
+        self.tokens=tokens
+        if tokens:
+            self.end=(EOF,'end of file',tokens[-1][2],tokens[-1][3]+len(tokens[-1][1]))
+        else:
+            self.end=(EOF,'end of file',1,1)
+        self.position=0
+        self.diagnostics=diagnostics
+        self.errors=0
+        self.typenames=set()
+        self.functions=set()
+
+    # Token helpers
+
+    def peek(self,offset=0):
+        """
+        Returns token at offset from current position
+        """
+        position=self.position+offset
+        if position<len(self.tokens):
+            return self.tokens[position]
+        return self.end
+
+    def next(self):
+        """
+        Consumes current token
+        """
+        token=self.peek()
+        if self.position<len(self.tokens):
+            self.position+=1
+        return token
+
+    def accept(self,value):
+        """
+        Consumes current token if it is value
+        """
+        if self.peek()[1]==value and self.peek()[0]!=EOF:
+            return self.next()
+        return None
+
+    def expect(self,value):
+        """
+        Consumes current token, that must be value
+        """
+        token=self.peek()
+        if token[1]!=value or token[0]==EOF:
+            raise ParseError(token,"expected '%s' before '%s'" % (value,token[1]))
+        return self.next()
+
+    def identifier(self):
+        """
+        Consumes an identifier
+        """
+        token=self.peek()
+        if token[0]!=IDENTIFIER or self.istype(token) or token[1] in QUALIFIERS:
+            raise ParseError(token,"expected identifier before '%s'" % token[1])
+        return self.next()
+
+    def istype(self,token):
+        """
+        Checks if token names a type
+        """
+        return token[0]==IDENTIFIER and (TYPE_RE.match(token[1]) is not None or token[1] in self.typenames)
+
+    def isqualifier(self,token):
+        """
+        Checks if token starts a type qualifier
+        """
+        return token[0]==IDENTIFIER and (token[1] in QUALIFIERS or token[1]=='layout')
+
+    def error(self,error):
+        """
+        Reports a syntax error
+        """
+        token=error.token
+        self.errors+=1
+        if self.errors<=MAX_ERRORS:
+            self.diagnostics.append(Diagnostic(token[2],token[3],ERROR,'syntax error: %s' % error))
+
+    def synchronize(self):
+        """
+        Skips tokens up to the end of the current statement
+        """
+        depth=0
+        while self.peek()[0]!=EOF:
+            token=self.next()
+            if token[1] in ('(','['):
+                depth+=1
+            elif token[1] in (')',']'):
+                depth=max(depth-1,0)
+            elif token[1]==';' and not depth:
+                return
+            elif token[1]=='{':
+                self.skipblock()
+                return
+            elif token[1]=='}':
+                self.position-=1
+                return
+
+    def skipblock(self):
+        """
+        Skips tokens up to the closing brace of an open block
+        """
+        depth=1
+        while depth and self.peek()[0]!=EOF:
+            token=self.next()
+            if token[1]=='{':
+                depth+=1
+            elif token[1]=='}':
+                depth-=1
+
+    # Declarations
+
+    def unit(self):
+        """
+        Translation unit
+        """
+        while self.peek()[0]!=EOF:
+            try:
+                self.external()
+            except ParseError,e:
+                self.error(e)
+                self.synchronize()
+                if self.peek()[1]=='}':
+                    self.next()
+
+    def external(self):
+        """
+        Global declaration or function definition
+        """
+        if self.accept(';'):
+            return
+        if self.peek()[1]=='precision':
+            self.precision()
+            return
+        # subroutine vec4 Name(...); declares a subroutine type
+        subroutinetype=self.peek()[1]=='subroutine' and self.peek(1)[1]!='('
+        qualified=self.qualifiers()
+        if qualified and self.accept(';'):
+            return
+        token=self.peek()
+        if qualified and token[0]==IDENTIFIER and not self.istype(token):
+            following=self.peek(1)[1]
+            if following=='{':
+                self.block()
+                return
+            if following in (';',','):
+                # Qualifier redeclaration (invariant gl_Position;)
+                self.identifier()
+                while self.accept(','):
+                    self.identifier()
+                self.expect(';')
+                return
+        self.typespecifier()
+        if self.accept(';'):
+            return
+        name=self.identifier()
+        if self.peek()[1]=='(':
+            if subroutinetype:
+                self.typenames.add(name[1])
+            self.function(name)
+            return
+        self.declarators()
+
+    def precision(self):
+        """
+        Default precision statement
+        """
+        self.expect('precision')
+        if self.peek()[1] not in ('highp','mediump','lowp'):
+            raise ParseError(self.peek(),"expected precision qualifier before '%s'" % self.peek()[1])
+        self.next()
+        self.typespecifier()
+        self.expect(';')
+
+    def qualifiers(self):
+        """
+        Optional type qualifiers, returns if any was found
+        """
+        found=False
+        while self.isqualifier(self.peek()):
+            found=True
+            qualifier=self.next()[1]
+            if qualifier=='layout':
+                self.expect('(')
+                while True:
+                    self.identifier()
+                    if self.accept('='):
+                        self.conditional()
+                    if not self.accept(','):
+                        break
+                self.expect(')')
+            elif qualifier=='subroutine' and self.accept('('):
+                # Subroutine types a function implements
+                while True:
+                    if self.peek()[0]!=IDENTIFIER:
+                        raise ParseError(self.peek(),"expected subroutine type before '%s'" % self.peek()[1])
+                    self.next()
+                    if not self.accept(','):
+                        break
+                self.expect(')')
+        return found
+
+    def typespecifier(self):
+        """
+        Type name or struct definition, with optional array size
+        """
+        token=self.peek()
+        if token[1]=='struct':
+            self.struct()
+        elif self.istype(token):
+            self.next()
+        else:
+            raise ParseError(token,"expected type before '%s'" % token[1])
+        self.arraysize()
+
+    def arraysize(self):
+        """
+        Optional array size specifiers
+        """
+        while self.accept('['):
+            if not self.accept(']'):
+                self.conditional()
+                self.expect(']')
+
+    def struct(self):
+        """
+        Struct definition
+        """
+        self.expect('struct')
+        if self.peek()[0]==IDENTIFIER and self.peek()[1]!='{':
+            self.typenames.add(self.next()[1])
+        self.expect('{')
+        self.members()
+
+    def members(self):
+        """
+        Struct or block members up to the closing brace
+        """
+        while not self.accept('}'):
+            if self.peek()[0]==EOF:
+                raise ParseError(self.peek(),"expected '}' before end of file")
+            self.qualifiers()
+            self.typespecifier()
+            while True:
+                self.identifier()
+                self.arraysize()
+                if not self.accept(','):
+                    break
+            self.expect(';')
+
+    def block(self):
+        """
+        Interface block (uniform Name { ... } instance;)
+        """
+        self.identifier()
+        self.expect('{')
+        self.members()
+        if self.peek()[0]==IDENTIFIER:
+            self.identifier()
+            self.arraysize()
+        self.expect(';')
+
+    def declarators(self):
+        """
+        Rest of a variable declaration after the first name
+        """
+        while True:
+            self.arraysize()
+            if self.accept('='):
+                self.initializer()
+            if not self.accept(','):
+                break
+            self.identifier()
+        self.expect(';')
+
+    def initializer(self):
+        """
+        Variable initializer
+        """
+        if self.accept('{'):
+            while True:
+                self.initializer()
+                if not self.accept(',') or self.peek()[1]=='}':
+                    break
+            self.expect('}')
+        else:
+            self.assignment()
+
+    def function(self,name):
+        """
+        Function prototype or definition after its name
+        """
+        self.expect('(')
+        if not (self.peek()[1]=='void' and self.peek(1)[1]==')'):
+            if self.peek()[1]!=')':
+                while True:
+                    self.qualifiers()
+                    self.typespecifier()
+                    if self.peek()[0]==IDENTIFIER and not self.istype(self.peek()):
+                        self.identifier()
+                        self.arraysize()
+                    if not self.accept(','):
+                        break
+        else:
+            self.next()
+        self.expect(')')
+        if self.accept(';'):
+            return
+        self.functions.add(name[1])
+        self.compound()
+
+    # Statements
+
+    def compound(self):
+        """
+        Compound statement
+        """
+        self.expect('{')
+        while not self.accept('}'):
+            if self.peek()[0]==EOF:
+                raise ParseError(self.peek(),"expected '}' before end of file")
+            try:
+                self.statement()
+            except ParseError,e:
+                self.error(e)
+                self.synchronize()
+
+    def isdeclaration(self):
+        """
+        Checks if a declaration statement starts at current token
+        """
+        token=self.peek()
+        if token[1] in ('struct','precision') or self.isqualifier(token):
+            return True
+        if not self.istype(token):
+            return False
+        offset=1
+        if self.peek(1)[1]=='[':
+            depth=0
+            while True:
+                value=self.peek(offset)[1]
+                if self.peek(offset)[0]==EOF:
+                    return False
+                if value=='[':
+                    depth+=1
+                elif value==']':
+                    depth-=1
+                    if not depth and self.peek(offset+1)[1]!='[':
+                        break
+                offset+=1
+            offset+=1
+        following=self.peek(offset)
+        return following[0]==IDENTIFIER
+
+    def statement(self):
+        """
+        Statement
+        """
+        token=self.peek()
+        value=token[1]
+        if token[0]==IDENTIFIER:
+            if value=='if':
+                self.next()
+                self.expect('(')
+                self.expression()
+                self.expect(')')
+                self.statement()
+                if self.accept('else'):
+                    self.statement()
+                return
+            if value=='while':
+                self.next()
+                self.expect('(')
+                self.condition()
+                self.expect(')')
+                self.statement()
+                return
+            if value=='do':
+                self.next()
+                self.statement()
+                self.expect('while')
+                self.expect('(')
+                self.expression()
+                self.expect(')')
+                self.expect(';')
+                return
+            if value=='for':
+                self.next()
+                self.expect('(')
+                if not self.accept(';'):
+                    if self.isdeclaration():
+                        self.declaration()
+                    else:
+                        self.expression()
+                        self.expect(';')
+                if not self.accept(';'):
+                    self.condition()
+                    self.expect(';')
+                if self.peek()[1]!=')':
+                    self.expression()
+                self.expect(')')
+                self.statement()
+                return
+            if value=='switch':
+                self.next()
+                self.expect('(')
+                self.expression()
+                self.expect(')')
+                self.compound()
+                return
+            if value=='case':
+                self.next()
+                self.conditional()
+                self.expect(':')
+                return
+            if value=='default':
+                self.next()
+                self.expect(':')
+                return
+            if value=='return':
+                self.next()
+                if not self.accept(';'):
+                    self.expression()
+                    self.expect(';')
+                return
+            if value in ('break','continue','discard'):
+                self.next()
+                self.expect(';')
+                return
+            if value=='else':
+                raise ParseError(token,"'else' without a previous 'if'")
+        if value=='{' and token[0]==OPERATOR:
+            self.compound()
+            return
+        if self.accept(';'):
+            return
+        if self.isdeclaration():
+            self.declaration()
+            return
+        self.expression()
+        self.expect(';')
+
+    def declaration(self):
+        """
+        Local declaration statement
+        """
+        if self.peek()[1]=='precision':
+            self.precision()
+            return
+        self.qualifiers()
+        self.typespecifier()
+        if self.accept(';'):
+            return
+        self.identifier()
+        self.declarators()
+
+    def condition(self):
+        """
+        Loop condition, an expression or an initialized declaration
+        """
+        if self.isdeclaration():
+            self.qualifiers()
+            self.typespecifier()
+            self.identifier()
+            self.expect('=')
+            self.initializer()
+        else:
+            self.expression()
+
+    # Expressions
+
+    def expression(self):
+        """
+        Comma separated expressions
+        """
+        self.assignment()
+        while self.accept(','):
+            self.assignment()
+
+    def assignment(self):
+        """
+        Assignment expression
+        """
+        self.conditional()
+        if self.peek()[0]==OPERATOR and self.peek()[1] in ASSIGNMENTS:
+            self.next()
+            self.assignment()
+
+    def conditional(self):
+        """
+        Ternary expression
+        """
+        self.binary(0)
+        if self.accept('?'):
+            self.expression()
+            self.expect(':')
+            self.assignment()
+
+    def binary(self,level):
+        """
+        Binary operators by precedence level
+        """
+        if level>=len(BINARY):
+            self.unary()
+            return
+        self.binary(level+1)
+        while self.peek()[0]==OPERATOR and self.peek()[1] in BINARY[level]:
+            self.next()
+            self.binary(level+1)
+
+    def unary(self):
+        """
+        Prefix operators
+        """
+        token=self.peek()
+        if token[0]==OPERATOR and token[1] in ('++','--','+','-','!','~'):
+            self.next()
+            self.unary()
+            return
+        self.postfix()
+
+    def postfix(self):
+        """
+        Primary expression with calls, indexing, fields and postfix operators
+        """
+        self.primary()
+        while True:
+            token=self.peek()
+            if token[0]!=OPERATOR:
+                return
+            if token[1]=='[':
+                self.next()
+                self.expression()
+                self.expect(']')
+            elif token[1]=='(':
+                self.next()
+                self.arguments()
+            elif token[1]=='.':
+                self.next()
+                if self.peek()[0]!=IDENTIFIER:
+                    raise ParseError(self.peek(),"expected field name before '%s'" % self.peek()[1])
+                self.next()
+            elif token[1] in ('++','--'):
+                self.next()
+            else:
+                return
+
+    def arguments(self):
+        """
+        Call arguments after the opening parenthesis
+        """
+        if self.accept(')'):
+            return
+        if self.peek()[1]=='void' and self.peek(1)[1]==')':
+            self.next()
+            self.next()
+            return
+        self.assignment()
+        while self.accept(','):
+            self.assignment()
+        self.expect(')')
+
+    def primary(self):
+        """
+        Identifiers, literals, constructors and parenthesized expressions
+        """
+        token=self.peek()
+        if token[0] in (INTEGER,FLOAT):
+            self.next()
+            return
+        if token[0]==IDENTIFIER:
+            if self.istype(token):
+                # Constructor: type name followed by ( or array size
+                self.next()
+                if self.peek()[1]=='[':
+                    self.arraysize()
+                if self.peek()[1]!='(':
+                    raise ParseError(self.peek(),"expected '(' after constructor '%s'" % token[1])
+                return
+            if token[1] in QUALIFIERS or token[1] in ('if','else','for','while','do','return','break','continue','discard','struct','switch','case','default'):
+                raise ParseError(token,"unexpected '%s'" % token[1])
+            self.next()
+            return
+        if token[1]=='(' and token[0]==OPERATOR:
+            self.next()
+            self.expression()
+            self.expect(')')
+            return
+        if token[0]==EOF:
+            raise ParseError(token,'unexpected end of file')
+        raise ParseError(token,"unexpected '%s'" % token[1])
+
+class Checker:
+    """
+    Validates the source of a shader stage. Keeps the lexer cache between
+    checks so only edited lines are tokenized again
+    """
+
+    def __init__(self,stage=None):
+        """
+        Class initialization
+        """
+        self.stage=stage
+        self.lexer=Lexer()
+
+    def check(self,source):
+        """
+        Returns diagnostics of source sorted by position
+        """
+        diagnostics=[]
+        sourcelines=source.split('\n')
+        lines,opencomment=self.lexer.lex(source)
+        if opencomment:
+            diagnostics.append(Diagnostic(len(lines),1,ERROR,'unterminated comment'))
+        preprocessor=Preprocessor(diagnostics)
+        tokens=preprocessor.run(lines,sourcelines)
+        # Characters of inactive conditional regions are not checked
+        for number,(linetokens,problems,state) in enumerate(lines):
+            if number+1 not in preprocessor.skipped:
+                for column,message in problems:
+                    diagnostics.append(Diagnostic(number+1,column,ERROR,message))
+        if tokens:
+            parser=Parser(tokens,diagnostics)
+            parser.unit()
+            if not parser.errors and 'main' not in parser.functions:
+                diagnostics.append(Diagnostic(1,1,ERROR,'function main is not defined'))
+        diagnostics.sort()
+        return diagnostics
+
+def check(source,stage=None):
+    """
+    Returns diagnostics of a shader source
+    """
+    return Checker(stage).check(source)
+
+def errors(diagnostics):
+    """
+    Returns error diagnostics only
+    """
+    return [diagnostic for diagnostic in diagnostics if diagnostic.severity==ERROR]
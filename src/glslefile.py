@@ -20,9 +20,12 @@
 ###############################################################################
 
 # Python imports
-# import base64
-import xml.dom.minidom
+import os,mmap,hashlib,tempfile
 from xml.sax import saxutils
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
 
 # Format version
 GLSLE_VERSION=0.1
@@ -48,77 +51,294 @@ GLSLE_TEMPLATE="""<?xml version="1.0" encoding="UTF-8" ?>
 
 GLSLE_TEXTURE='<texture id="%s" filename="%s" />\n'
 
+# Variant axis: #define name and the values it takes
+GLSLE_AXIS='<axis name="%s" values="%s" />\n'
+
 GLSLE_TEXTUREDATA="""
 <texture id="%s" filename="%s" >
     %s
 </texture>
 """
 
+# Embedded texture payload reference (offset and length inside data sidecar)
+GLSLE_TEXTUREREF='<data file="%s" offset="%d" length="%d" sha1="%s" />'
+
+# Data sidecar extension (appended to project filename)
+GLSLE_SIDECAR='.data'
+
+# Copy block size when embedding textures
+GLSLE_BLOCKSIZE=1024*1024
+
+def quoteattr(value):
+    """
+    Escapes value for a double quoted attribute
+    """
+    return saxutils.escape(value,{'"':'&quot;'})
+
+def filemode(filename):
+    """
+    Returns permission bits of filename, or those a new file gets with the
+    current umask if it does not exist
+    """
+    try:
+        return os.stat(filename).st_mode & 0777
+    except OSError:
+        umask=os.umask(0)
+        os.umask(umask)
+        return 0666 & ~umask
+
+class Sidecar:
+    """
+    Binary file holding embedded texture payloads, memory-mapped on first use
+    """
+
+    def __init__(self,filename):
+        """
+        Class initialization
+        """
+        self.filename=filename
+        self.map=None
+
+    def open(self):
+        """
+        Maps sidecar file into memory
+        """
+        if self.map is None:
+            fd=open(self.filename,'rb')
+            try:
+                self.map=mmap.mmap(fd.fileno(),0,access=mmap.ACCESS_READ)
+            finally:
+                fd.close()
+        return self.map
+
+    def close(self):
+        """
+        Unmaps sidecar file
+        """
+        if self.map is not None:
+            self.map.close()
+            self.map=None
+
+class EmbeddedTexture:
+    """
+    Lazily accessed texture payload stored in a project sidecar
+    """
+
+    def __init__(self,sidecar,offset,length,sha1):
+        """
+        Class initialization
+        """
+        self.sidecar=sidecar
+        self.offset=offset
+        self.length=length
+        self.sha1=sha1
+
+    def buffer(self):
+        """
+        Returns a zero-copy view of the payload
+        """
+        return buffer(self.sidecar.open(),self.offset,self.length)
+
+    def read(self):
+        """
+        Returns payload bytes
+        """
+        return self.sidecar.open()[self.offset:self.offset+self.length]
+
+    def copyto(self,fd):
+        """
+        Writes payload to file object fd
+        """
+        data=self.sidecar.open()
+        for start in range(self.offset,self.offset+self.length,GLSLE_BLOCKSIZE):
+            fd.write(data[start:min(start+GLSLE_BLOCKSIZE,self.offset+self.length)])
+
+def iterparse(filename,headeronly=False):
+    """
+    Incrementally parses a GLSLE project without building a document tree.
+    Yields (section, value) pairs as they are read: name, version,
+    comments, environment, vertexdata, fragmentdata and one texture entry
+    (id, filename, payload) per texture, payload being an EmbeddedTexture
+    or None for external files. Stops after the header if headeronly
+    """
+    context=ElementTree.iterparse(filename,events=('start','end'))
+    directory=os.path.dirname(filename)
+    sidecars={}
+    root=None
+    for event,element in context:
+        if event=='start':
+            if root is None:
+                root=element
+                yield ('name',saxutils.unescape(element.get('name','')))
+                yield ('version',element.get('version',''))
+            continue
+        tag=element.tag
+        if tag=='texture':
+            payload=None
+            data=element.find('data')
+            if data is not None:
+                sidecarname=os.path.join(directory,data.get('file'))
+                if sidecarname not in sidecars:
+                    sidecars[sidecarname]=Sidecar(sidecarname)
+                payload=EmbeddedTexture(sidecars[sidecarname],int(data.get('offset')),
+                    int(data.get('length')),data.get('sha1'))
+            yield ('texture',(element.get('id'),element.get('filename'),payload))
+        elif tag in ('comments','environment','vertexdata','fragmentdata'):
+            yield (tag,saxutils.unescape(element.text or ''))
+            if tag=='environment':
+                yield ('axes',[(axis.get('name'),axis.get('values','').split())
+                    for axis in element.findall('axis')])
+            if headeronly and tag=='comments':
+                return
+        elif tag!='textures':
+            continue
+        # Release parsed sections so memory does not grow with the file
+        element.clear()
+        if root is not None and tag!='texture':
+            root.clear()
+
 class GLSLEFile:
     """
     GLSLEdFile format class
     """
         
-    def __init__(self,filename=None):
+    def __init__(self,filename=None,headeronly=False):
         """
         Class constructor
         """
+        self.clear()
         if filename:
-            self.load(filename)
+            self.load(filename,headeronly)
+
+    def clear(self):
+        """
+        Resets project data
+        """
+        self.name=''
+        self.version=''
+        self.comments=''
+        self.environment=''
+        # Variant axes as (define name, values)
+        self.axes=[]
+        self.vertex=''
+        self.fragment=''
+        self.textures=[]
+        # Embedded texture payloads by original filename
+        self.embedded={}
     
-    def load(self, filename):
+    def load(self, filename, headeronly=False):
         """
-        Loads filename and stores read data
+        Loads filename and stores read data. Only name, version and comments
+        are read if headeronly
         """
-        # Open file and read data
-        dom=xml.dom.minidom.parse(filename)
-        # Parse read data
-        self.__parsedata(dom)
+        self.clear()
+        for section,value in iterparse(filename,headeronly):
+            if section=='texture':
+                id,texturefile,payload=value
+                self.textures.append((id,texturefile))
+                if payload:
+                    self.embedded[texturefile]=payload
+            elif section=='vertexdata':
+                self.vertex=value
+            elif section=='fragmentdata':
+                self.fragment=value
+            else:
+                setattr(self,section,value)
 
-    def save(self,filename,prjinfo, environment, vertexdata, fragmentdata, texturedata):
+    def save(self,filename,prjinfo, environment, vertexdata, fragmentdata, texturedata, embed=False, embedded=None):
         """
-        Saves data to filename
+        Saves data to filename. Environment is a list of variant axes as
+        (define name, values). If embed, texture files are stored in a data
+        sidecar next to the project (payloads already embedded in a loaded
+        project are taken from embedded when their file is missing)
         """
+        references={}
+        if embed:
+            references=self.__savesidecar(filename,texturedata,embedded or {})
+            # Payloads now live in the new sidecar
+            sidecar=Sidecar(filename + GLSLE_SIDECAR)
+            self.embedded=dict((texturefile,EmbeddedTexture(sidecar,*reference[1:]))
+                for texturefile,reference in references.items())
+            references=dict((texturefile,GLSLE_TEXTUREREF % reference)
+                for texturefile,reference in references.items())
         # Prepare data
-        data=self.__preparedata(prjinfo,environment,vertexdata,fragmentdata,texturedata)
+        data=self.__preparedata(prjinfo,environment,vertexdata,fragmentdata,texturedata,references)
         # Save data to file
         fd=open(filename,'w')
         fd.write(data)
         fd.close()
+
+    def __savesidecar(self,filename,texturedata,embedded):
+        """
+        Writes texture payloads to project sidecar. Returns data references
+        (sidecar name, offset, length, sha1) by texture filename
+        """
+        sidecarname=filename + GLSLE_SIDECAR
+        references={}
+        offsets={}
+        offset=0
+        # Write a new file and rename it, the old one may still be mapped
+        fd,tmpname=tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)))
+        out=os.fdopen(fd,'wb')
+        try:
+            for texture in texturedata:
+                texturefile=texture[1]
+                if texturefile in references:
+                    continue
+                digest=hashlib.sha1()
+                start=out.tell()
+                if os.path.exists(texturefile):
+                    src=open(texturefile,'rb')
+                    block=src.read(GLSLE_BLOCKSIZE)
+                    while block:
+                        digest.update(block)
+                        out.write(block)
+                        block=src.read(GLSLE_BLOCKSIZE)
+                    src.close()
+                elif texturefile in embedded:
+                    payload=embedded[texturefile]
+                    digest.update(payload.buffer())
+                    payload.copyto(out)
+                else:
+                    continue
+                sha1=digest.hexdigest()
+                length=out.tell()-start
+                if sha1 in offsets:
+                    # Same content already stored: reuse it
+                    out.seek(start)
+                    out.truncate()
+                    start,length=offsets[sha1]
+                else:
+                    offsets[sha1]=(start,length)
+                references[texturefile]=(quoteattr(os.path.basename(sidecarname)),start,length,sha1)
+        finally:
+            out.close()
+        # Payloads of the replaced sidecar keep reading it through their
+        # mapping, their offsets are not valid in the new file
+        for payload in embedded.values():
+            try:
+                payload.sidecar.open()
+            except (IOError,OSError,ValueError):
+                pass
+        os.chmod(tmpname,filemode(filename))
+        os.rename(tmpname,sidecarname)
+        return references
         
-    def __preparedata(self,prjinfo,environment,vertexdata,fragmentdata,texturedata):
+    def __preparedata(self,prjinfo,environment,vertexdata,fragmentdata,texturedata,references):
         """
         Packing data for writing
         """
         # Generate environment section
         environ=''
+        if environment:
+            environ='\n' + ''.join([GLSLE_AXIS % (quoteattr(name),quoteattr(' '.join(values)))
+                for name,values in environment])
         # Generate textures section
         textures=''
         for texture in texturedata:
-            textures+=GLSLE_TEXTURE % (texture[0],texture[1])
+            if texture[1] in references:
+                textures+=GLSLE_TEXTUREDATA % (quoteattr(texture[0]),quoteattr(texture[1]),references[texture[1]])
+            else:
+                textures+=GLSLE_TEXTURE % (quoteattr(texture[0]),quoteattr(texture[1]))
         return GLSLE_TEMPLATE % (saxutils.escape(prjinfo['name']),GLSLE_VERSION,saxutils.escape(prjinfo['comments']),environ,
             saxutils.escape(vertexdata),saxutils.escape(fragmentdata),textures)
-    
-    def __parsedata(self,dom):
-        """
-        Retrieve data from loaded file
-        """
-        # Load project name
-        glsle=dom.documentElement
-        self.name=saxutils.unescape(glsle.getAttribute('name'))
-        # Load project comments
-        # TODO: Check if node has childs before get values
-        self.comments=saxutils.unescape(glsle.getElementsByTagName('comments')[0].firstChild.nodeValue)
-        # Get vertex data
-        self.vertex=saxutils.unescape(dom.getElementsByTagName('vertexdata')[0].firstChild.nodeValue)
-        # Get fragment data
-        self.fragment=saxutils.unescape(dom.getElementsByTagName('fragmentdata')[0].firstChild.nodeValue)
-        # Get textures
-        texlist=[]
-        textures=glsle.getElementsByTagName('texture')
-        for texture in textures:
-            # TODO: Save texture data to avoid loading or dependences from external files
-            id=texture.getAttribute('id')
-            filename=texture.getAttribute('filename')
-            texlist.append((id,filename))
-        self.textures=texlist
@@ -2,12 +2,18 @@
 
 from ctypes import *
 import sys
+import re
+import hashlib
+from collections import OrderedDict
  
 try:
-    # For OpenGL-ctypes
+    # For OpenGL-ctypes and PyOpenGL 3 (current platform GL library)
     from OpenGL import platform
-    gl = platform.OpenGL
-except ImportError:
+    if hasattr(platform, 'OpenGL'):
+        gl = platform.OpenGL
+    else:
+        gl = platform.PLATFORM.GL
+except (ImportError, AttributeError):
     try:
         # For PyOpenGL
         gl = cdll.LoadLibrary('libGL.so')
@@ -20,7 +26,10 @@ except ImportError:
  
 from OpenGL.GL import *
 from OpenGL.GLU import *
-from OpenGL.GLUT import *
+
+import uniforms
+import glslcheck
+import profiler
  
 glCreateShader = gl.glCreateShader
 glShaderSource = gl.glShaderSource
@@ -36,63 +45,418 @@ glAttachShader = gl.glAttachShader
 glLinkProgram = gl.glLinkProgram
 glGetError = gl.glGetError
 glUseProgram = gl.glUseProgram
+glDeleteProgram = gl.glDeleteProgram
+glGetProgramiv = gl.glGetProgramiv
+glGetProgramiv.argtypes = [c_int, c_int, POINTER(c_int)]
+glGetProgramInfoLog = gl.glGetProgramInfoLog
+glGetProgramInfoLog.argtypes = [c_int, c_int, POINTER(c_int), c_char_p]
+
+# Program binary entry points (GL_ARB_get_program_binary), may be missing
+try:
+    glGetProgramBinary = gl.glGetProgramBinary
+    glGetProgramBinary.argtypes = [c_int, c_int, POINTER(c_int), POINTER(c_uint), c_void_p]
+    glProgramBinary = gl.glProgramBinary
+    glProgramBinary.argtypes = [c_int, c_uint, c_char_p, c_int]
+    glProgramParameteri = gl.glProgramParameteri
+    glProgramParameteri.argtypes = [c_int, c_uint, c_int]
+except AttributeError:
+    glGetProgramBinary = glProgramBinary = glProgramParameteri = None
  
 GL_FRAGMENT_SHADER = 0x8B30
 GL_VERTEX_SHADER = 0x8B31
 GL_COMPILE_STATUS = 0x8B81
 GL_LINK_STATUS = 0x8B82
 GL_INFO_LOG_LENGTH = 0x8B84
+GL_PROGRAM_BINARY_RETRIEVABLE_HINT = 0x8257
+GL_PROGRAM_BINARY_LENGTH = 0x8741
+GL_NUM_PROGRAM_BINARY_FORMATS = 0x87FE
+
+# Program binary support status for the current context
+_binarysupport = {}
+
+# Stage names by shader type
+STAGES = {
+    GL_VERTEX_SHADER: 'vertex',
+    GL_FRAGMENT_SHADER: 'fragment',
+}
+
+class ShaderError(ValueError):
+    """
+    Shader validation, compilation or linking error. Carries the driver
+    info log (if any) and its diagnostics
+    """
+
+    def __init__(self, message, log='', diagnostics=None, stage=None):
+        """
+        Class initialization
+        """
+        ValueError.__init__(self, message)
+        self.log = log
+        self.stage = stage
+        if diagnostics is None:
+            diagnostics = glslcheck.parse_log(log)
+        self.diagnostics = diagnostics
 
 def compile_shader(source, shader_type):
     """
     Shader compilation
     """
-    shader = glCreateShader(shader_type)
-    source = c_char_p(source)
-    length = c_int(-1)
-    glShaderSource(shader, 1, byref(source), byref(length))
-    glCompileShader(shader)
-    
-    status = c_int()
-    glGetShaderiv(shader, GL_COMPILE_STATUS, byref(status))
-    if not status.value:
-        print_log(shader)
-        glDeleteShader(shader)
-        raise ValueError, 'Shader compilation failed'
-    return shader
+    with profiler.span('compile_shader', 'compile'):
+        shader = glCreateShader(shader_type)
+        source = c_char_p(source)
+        length = c_int(-1)
+        glShaderSource(shader, 1, byref(source), byref(length))
+        glCompileShader(shader)
+        
+        status = c_int()
+        glGetShaderiv(shader, GL_COMPILE_STATUS, byref(status))
+        if not status.value:
+            log = get_log(shader)
+            glDeleteShader(shader)
+            raise ShaderError('Shader compilation failed', log, stage=STAGES.get(shader_type))
+        return shader
  
-def compile_program(vertex_source, fragment_source):
+def inject_defines(source, defines):
+    """
+    Sets defines dictionary values in source: existing #define lines of
+    those names are replaced in place and the rest are inserted ahead of
+    source (after the #version directive if present)
+    """
+    if not defines or not source:
+        return source
+    lines = []
+    for name in sorted(defines):
+        pattern = re.compile(r'^([ \t]*#[ \t]*define[ \t]+%s)(?=[ \t]|$).*$' % re.escape(name), re.M)
+        source, count = pattern.subn(lambda match: '%s %s' % (match.group(1), defines[name]), source)
+        if not count:
+            lines.append('#define %s %s' % (name, defines[name]))
+    if not lines:
+        return source
+    end = version_end(source)
+    head = source[:end]
+    body = source[end:]
+    if head and not head.endswith('\n'):
+        head += '\n'
+    return head + '\n'.join(lines) + '\n' + body
+
+def version_end(source):
+    """
+    Returns the offset just past the #version directive line of source, or
+    0 if there is none. Only comments, whitespace and empty directives may
+    come before it
+    """
+    state = glslcheck.NORMAL
+    offset = 0
+    for line in source.splitlines(True):
+        offset += len(line)
+        tokens, problems, state = glslcheck.lexline(line, state)
+        values = [token[1] for token in tokens]
+        if not values or values == ['#']:
+            continue
+        if values[:2] == ['#', 'version']:
+            return offset
+        break
+    return 0
+
+def program_key(vertex_source, fragment_source, defines=None):
+    """
+    Hash key for a (vertex, fragment, defines) combination
     """
-    Shader program compilation
+    digest = hashlib.sha1()
+    digest.update(vertex_source or '')
+    digest.update('\0')
+    digest.update(fragment_source or '')
+    digest.update('\0')
+    if defines:
+        for name in sorted(defines):
+            digest.update('%s=%s;' % (name, defines[name]))
+    return digest.hexdigest()
+
+def compile_program(vertex_source, fragment_source, defines=None, retrievable=False, shadercache=None):
+    """
+    Shader program compilation. When a shader cache is given, stage objects
+    are taken from (and kept in) it instead of being deleted after linking
     """
+    vertex_source = inject_defines(vertex_source, defines)
+    fragment_source = inject_defines(fragment_source, defines)
+    if shadercache is not None:
+        compile_stage = shadercache.get
+    else:
+        compile_stage = compile_shader
     vertex_shader = None
     fragment_shader = None
-    program = glCreateProgram()
- 
-    if vertex_source:
-        vertex_shader = compile_shader(vertex_source, GL_VERTEX_SHADER)
-        glAttachShader(program, vertex_shader)
-    if fragment_source:
-        fragment_shader = compile_shader(fragment_source, GL_FRAGMENT_SHADER)
-        glAttachShader(program, fragment_shader)
- 
-    glLinkProgram(program)
  
-    if vertex_shader:
-        glDeleteShader(vertex_shader)
-    if fragment_shader:
-        glDeleteShader(fragment_shader)
+    try:
+        if vertex_source:
+            vertex_shader = compile_stage(vertex_source, GL_VERTEX_SHADER)
+        if fragment_source:
+            fragment_shader = compile_stage(fragment_source, GL_FRAGMENT_SHADER)
+    except ValueError:
+        if vertex_shader and shadercache is None:
+            glDeleteShader(vertex_shader)
+        raise
+
+    shaders = [shader for shader in (vertex_shader, fragment_shader) if shader]
+    try:
+        return link_program(shaders, retrievable)
+    finally:
+        if shadercache is None:
+            for shader in shaders:
+                glDeleteShader(shader)
+
+def link_program(shaders, retrievable=False):
+    """
+    Links compiled shader objects into a new program
+    """
+    with profiler.span('link', 'compile'):
+        program = glCreateProgram()
+        for shader in shaders:
+            glAttachShader(program, shader)
+        if retrievable and program_binary_supported():
+            glProgramParameteri(program, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
+        glLinkProgram(program)
+
+        status = c_int()
+        glGetProgramiv(program, GL_LINK_STATUS, byref(status))
+        if not status.value:
+            log = get_program_log(program)
+            glDeleteProgram(program)
+            raise ShaderError('Program linking failed', log)
  
+        return program
+
+class ShaderCache:
+    """
+    LRU cache of compiled shader stage objects keyed by stage source hash
+    """
+
+    def __init__(self, maxsize=32):
+        """
+        Class initialization
+        """
+        self.maxsize = maxsize
+        self.shaders = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source, shader_type):
+        """
+        Returns a compiled shader object for source, compiling it if needed
+        """
+        key = (shader_type, hashlib.sha1(source).hexdigest())
+        shader = self.shaders.pop(key, None)
+        if shader is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            shader = compile_shader(source, shader_type)
+        self.shaders[key] = shader
+        # Shaders still attached to cached programs are only flagged for
+        # deletion by the driver, so eviction is always safe
+        while len(self.shaders) > max(self.maxsize, 2):
+            key, evicted = self.shaders.popitem(last=False)
+            glDeleteShader(evicted)
+        return shader
+
+    def clear(self):
+        """
+        Deletes every cached shader object
+        """
+        for shader in self.shaders.values():
+            glDeleteShader(shader)
+        self.shaders.clear()
+
+    def stats(self):
+        """
+        Returns cache usage counters
+        """
+        return {
+            'size': len(self.shaders),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+def driver_id():
+    """
+    Returns a string identifying current GL driver (vendor, renderer, version)
+    """
+    return '\n'.join([str(glGetString(name)) for name in (GL_VENDOR, GL_RENDERER, GL_VERSION)])
+
+def program_binary_supported():
+    """
+    Checks if current context can save and load program binaries
+    """
+    driver = driver_id()
+    if driver not in _binarysupport:
+        formats = c_int(0)
+        if glGetProgramBinary is not None:
+            gl.glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS, byref(formats))
+            # Discard invalid enum errors from drivers without the extension
+            glGetError()
+        supported = formats.value > 0
+        _binarysupport[driver] = supported
+    return _binarysupport[driver]
+
+def get_program_binary(program):
+    """
+    Retrieves (format, data) binary for a linked program
+    """
+    length = c_int()
+    glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH, byref(length))
+    if length.value <= 0:
+        return None
+    data = create_string_buffer(length.value)
+    binaryformat = c_uint()
+    glGetProgramBinary(program, length, byref(length), byref(binaryformat), data)
+    return (binaryformat.value, data.raw[:length.value])
+
+def load_program_binary(binaryformat, data):
+    """
+    Creates a program from a binary, returns None if driver rejects it
+    """
+    program = glCreateProgram()
+    glProgramBinary(program, binaryformat, data, len(data))
+    status = c_int()
+    glGetProgramiv(program, GL_LINK_STATUS, byref(status))
+    if not status.value:
+        glDeleteProgram(program)
+        return None
     return program
+
+class ProgramCache:
+    """
+    LRU cache of linked programs keyed by source hash, optionally backed by
+    an on-disk program binary cache
+    """
+
+    def __init__(self, maxsize=16, binarycache=None, shadercache=None):
+        """
+        Class initialization
+        """
+        self.maxsize = maxsize
+        self.binarycache = binarycache
+        self.shadercache = shadercache
+        self.programs = OrderedDict()
+        # Active uniforms of each program, queried once at link time
+        self.uniformsets = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, vertex_source, fragment_source, defines=None):
+        """
+        Returns a linked program for given sources, compiling it if needed
+        """
+        key = program_key(vertex_source, fragment_source, defines)
+        program = self.programs.pop(key, None)
+        if program is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            program = self.build(key, vertex_source, fragment_source, defines)
+            if program:
+                self.uniformsets[program] = uniforms.UniformSet(program)
+        # Most recently used programs are kept at the end
+        self.programs[key] = program
+        self.shrink()
+        return program
+
+    def uniformset(self, program):
+        """
+        Returns active uniforms of a cached program
+        """
+        return self.uniformsets.get(program)
+
+    def build(self, key, vertex_source, fragment_source, defines):
+        """
+        Loads program from binary cache or compiles it from sources
+        """
+        if not self.binarycache or not program_binary_supported():
+            return compile_program(vertex_source, fragment_source, defines,
+                shadercache=self.shadercache)
+        diskkey = self.binarycache.key(key, driver_id())
+        entry = self.binarycache.load(diskkey)
+        if entry:
+            program = load_program_binary(*entry)
+            if program is not None:
+                return program
+            # Binary rejected by the driver (updated driver, corrupt file...)
+            self.binarycache.discard(diskkey)
+        program = compile_program(vertex_source, fragment_source, defines,
+            retrievable=True, shadercache=self.shadercache)
+        entry = get_program_binary(program)
+        if entry:
+            self.binarycache.store(diskkey, *entry)
+        return program
+
+    def shrink(self):
+        """
+        Evicts least recently used programs over the size limit
+        """
+        while len(self.programs) > max(self.maxsize, 1):
+            key, program = self.programs.popitem(last=False)
+            self.uniformsets.pop(program, None)
+            glDeleteProgram(program)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        Deletes every cached program
+        """
+        for program in self.programs.values():
+            glDeleteProgram(program)
+        self.programs.clear()
+        self.uniformsets.clear()
+
+    def stats(self):
+        """
+        Returns cache usage counters
+        """
+        return {
+            'size': len(self.programs),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'binary': self.binarycache and self.binarycache.stats(),
+            'stages': self.shadercache and self.shadercache.stats(),
+        }
  
+def get_log(shader):
+    """
+    Returns shader info log
+    """
+    with profiler.span('info log', 'compile'):
+        length = c_int()
+        glGetShaderiv(shader, GL_INFO_LOG_LENGTH, byref(length))
+        if length.value > 0:
+            log = create_string_buffer(length.value)
+            glGetShaderInfoLog(shader, length, byref(length), log)
+            return log.value
+        return ''
+
+def get_program_log(program):
+    """
+    Returns program info log
+    """
+    with profiler.span('info log', 'compile'):
+        length = c_int()
+        glGetProgramiv(program, GL_INFO_LOG_LENGTH, byref(length))
+        if length.value > 0:
+            log = create_string_buffer(length.value)
+            glGetProgramInfoLog(program, length, byref(length), log)
+            return log.value
+        return ''
+
 def print_log(shader):
     """
     Shader log
     """
-    length = c_int()
-    glGetShaderiv(shader, GL_INFO_LOG_LENGTH, byref(length))
-    if length.value > 0:
-        log = create_string_buffer(length.value)
-        glGetShaderInfoLog(shader, length, byref(length), log)
-        print >> sys.stderr, log.value
+    print >> sys.stderr, get_log(shader)
 
+def print_program_log(program):
+    """
+    Program log
+    """
+    print >> sys.stderr, get_program_log(program)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# glstate.py
+# GL state cache skipping redundant state changes
+###############################################################################
+
+# NumPy imports
+import numpy
+
+# OpenGL imports
+from OpenGL.GL import *
+
+class GLState:
+    """
+    Shadow copy of the GL state set through it (program, enabled caps,
+    light and material parameters and clear color). Calls that would not
+    change the current state are skipped. Parameter vectors are converted
+    to float arrays once and reused on later calls
+    """
+
+    def __init__(self):
+        """
+        Class initialization
+        """
+        self.arrays={}
+        self.calls=0
+        self.skipped=0
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forgets known state, next calls are always issued. Must be called
+        when code not using this cache changes the state of the context
+        """
+        self.program=None
+        self.caps={}
+        self.lights={}
+        self.materials={}
+        self.clear=None
+
+    def array(self,values):
+        """
+        Returns preconverted float array for a tuple of values
+        """
+        array=self.arrays.get(values)
+        if array is None:
+            array=self.arrays[values]=numpy.array(values,numpy.float32)
+        return array
+
+    def useprogram(self,program):
+        """
+        Makes program current
+        """
+        if program==self.program:
+            self.skipped+=1
+            return
+        glUseProgram(program)
+        self.program=program
+        self.calls+=1
+
+    def setcap(self,cap,status):
+        """
+        Enables or disables a capability
+        """
+        if self.caps.get(cap)==status:
+            self.skipped+=1
+            return
+        if status:
+            glEnable(cap)
+        else:
+            glDisable(cap)
+        self.caps[cap]=status
+        self.calls+=1
+
+    def enable(self,cap):
+        """
+        Enables a capability
+        """
+        self.setcap(cap,True)
+
+    def disable(self,cap):
+        """
+        Disables a capability
+        """
+        self.setcap(cap,False)
+
+    def light(self,light,pname,values):
+        """
+        Sets a light parameter from a tuple of values. Positions and
+        directions are transformed by the modelview matrix when issued, so
+        they must always be set under the same matrix
+        """
+        key=(light,pname)
+        if self.lights.get(key)==values:
+            self.skipped+=1
+            return
+        glLightfv(light,pname,self.array(values))
+        self.lights[key]=values
+        self.calls+=1
+
+    def material(self,face,pname,values):
+        """
+        Sets a material parameter from a tuple of values
+        """
+        key=(face,pname)
+        if self.materials.get(key)==values:
+            self.skipped+=1
+            return
+        glMaterialfv(face,pname,self.array(values))
+        self.materials[key]=values
+        self.calls+=1
+
+    def clearcolor(self,r,g,b,a):
+        """
+        Sets clear color
+        """
+        color=(r,g,b,a)
+        if color==self.clear:
+            self.skipped+=1
+            return
+        glClearColor(r,g,b,a)
+        self.clear=color
+        self.calls+=1
+
+    def reset(self):
+        """
+        Clears counters
+        """
+        self.calls=0
+        self.skipped=0
+
+    def stats(self):
+        """
+        Returns issued and skipped call counters
+        """
+        return {'calls': self.calls,'skipped': self.skipped}
@@ -19,17 +19,35 @@
 # OpenGL Widget
 ###############################################################################
 
+# Python imports
+import os,time
+
 # OpenGL imports
 from OpenGL.GL import *
 from OpenGL.GLU import *
-from OpenGL.GLUT import *
 
 # GTK imports
-import gtk
+import gobject,gtk
 from gtk import gtkgl
 
 # Application imports
 import glslview
+import glslcheck
+import binarycache
+import framesched
+import preview
+import profiler
+import dynres
+import capture
+
+# Configuration sizes are given in megabytes
+MB=1024*1024
+
+# Preview animation speed (degrees per second)
+ROTATION_SPEED=12.0
+
+# Polling interval of frames being read back while nothing is drawn (ms)
+CAPTURE_POLL_INTERVAL=10
 
 # Default shader
 DEFAULT_VERTEX="""
@@ -86,7 +104,7 @@ void main (void)
 
 class GLDrawingArea(gtk.DrawingArea, gtk.gtkgl.Widget):
     
-    def __init__(self, display_mode):
+    def __init__(self, display_mode, config=None):
         """
         Class initialization
         """
@@ -107,15 +125,62 @@ class GLDrawingArea(gtk.DrawingArea, gtk.gtkgl.Widget):
             glconfig = gtk.gdkgl.Config(mode = display_mode)
         self.set_gl_capability(glconfig)
 
-        self.angle=0
-        self.primitive='Plano'
-        self.redraw=False
+        # Preview scene renderer (GL resources created on realize)
+        self.renderer=preview.PreviewRenderer()
+        # Animation frame scheduler
+        self.scheduler=framesched.FrameScheduler(self)
+        # Linked program cache backed by on-disk program binaries
+        self.programcache=glslview.ProgramCache(binarycache=binarycache.ProgramBinaryCache(),
+            shadercache=glslview.ShaderCache())
+        # Source validators (keep lexed lines between compilations)
+        self.checkers={
+            'vertex': glslcheck.Checker('vertex'),
+            'fragment': glslcheck.Checker('fragment'),
+        }
+        self.diagnostics={}
+        # Startup profiler (phases until the first frame)
+        self.profiler=None
+        # Dynamic resolution: animated frames are rendered to a scaled
+        # target (created on first use) to hold the frame time budget
+        self.dynamic=False
+        self.resolution=dynres.ResolutionController()
+        self.scaledtarget=None
+        self.size=(1,1)
+        self.lastsample=None
+        # Frame capture: frames are read back through pixel buffers
+        # (created on first capture) and written by the recorder thread
+        self.reader=None
+        self.recorder=None
+        self.capturetimer=None
+        # Performance settings from application configuration
+        if config:
+            self.applyconfig(config)
         
         # Signal connections
         self.connect( "expose_event", self.__gldrwexpose)
         self.connect( "realize", self.__gldrwrealize)
         self.connect( "configure_event", self.__gldrwconfigure)        
 
+    def __getredraw(self):
+        """
+        Returns if preview animation is running
+        """
+        return self.scheduler.running
+
+    def __setredraw(self,status):
+        """
+        Starts or stops preview animation
+        """
+        if status:
+            self.scheduler.start()
+        else:
+            self.scheduler.stop()
+            # Still view is drawn again at full resolution
+            if self.dynamic:
+                self.queue_draw()
+
+    redraw=property(__getredraw,__setredraw)
+
     def __gldrwconfigure(self, *args):
         """
         GLDrawingArea display configuration
@@ -124,148 +189,254 @@ class GLDrawingArea(gtk.DrawingArea, gtk.gtkgl.Widget):
         self.gldrawable = self.get_gl_drawable()
         self.glcontext = self.get_gl_context()
         allocation=self.get_allocation()
+        self.size=(allocation.width,allocation.height)
         self.gldrawable.gl_begin(self.glcontext)
-        glMatrixMode(GL_PROJECTION)
-        glLoadIdentity()
-        gluPerspective(90.0, allocation.width/float(allocation.height), 1.0, 100.0)
-        glMatrixMode(GL_MODELVIEW)
-        glViewport(0, 0, allocation.width, allocation.height)
-        gluLookAt(0.0,0.0,0.5, 0.0,0.0,0.0, 0.0, 1.0, 0.0)
+        self.renderer.resize(allocation.width, allocation.height)
+        if self.scaledtarget:
+            self.scaledtarget.resize(allocation.width, allocation.height)
         self.gldrawable.gl_end()
                 
     def __gldrwrealize(self, *args):
         """
         GLDrawingArea view setting callback
         """
-        # OpenGL state initialization
+        # OpenGL state initialization (GLUT is initialized when the teapot
+        # is first drawn)
+        self.gldrawable = self.get_gl_drawable()
+        self.glcontext = self.get_gl_context()
         self.gldrawable.gl_begin(self.glcontext)
-        glutInit()
-        glEnable(GL_DEPTH_TEST)
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-        glLightModeli(GL_LIGHT_MODEL_TWO_SIDE,GL_TRUE)
-        glEnable(GL_COLOR_MATERIAL)
+        self.renderer.initgl()
         self.gldrawable.gl_end()
+        if self.profiler:
+            self.profiler.mark('GL realize')
         # Compile default shader
         self.compileshader()
+        if self.profiler:
+            self.profiler.mark('primera compilación')
       
     def __gldrwexpose(self, *args):
         """
         GLDrawingArea drawing callback
         """
-        self.gldrawable.gl_begin(self.glcontext)
-        self.__preview()
-        self.gldrawable.swap_buffers()
-        self.gldrawable.gl_end()
-        if self.redraw:
-            self.angle += 0.2
+        with profiler.span('expose'):
+            elapsed=self.scheduler.framebegin()
+            if self.redraw:
+                self.renderer.angle += ROTATION_SPEED*elapsed
+            self.gldrawable.gl_begin(self.glcontext)
+            scaled=self.dynamic and self.redraw
+            with profiler.span('render'):
+                start=time.time()
+                if scaled:
+                    self.renderscaled()
+                else:
+                    self.renderer.render()
+                rendertime=(time.time()-start)*1000.0
+            if self.recorder:
+                with profiler.span('readback'):
+                    self.__readback()
+            with profiler.span('swap_buffers'):
+                self.gldrawable.swap_buffers()
+            self.gldrawable.gl_end()
+            if (self.recorder or self.reader and self.reader.pending()) and self.capturetimer is None:
+                self.capturetimer=gobject.timeout_add(CAPTURE_POLL_INTERVAL,self.__pollcapture)
+            self.__countfps()
+            if scaled:
+                ms=self.__frametime(rendertime)
+                if ms is not None:
+                    self.resolution.update(ms)
+        if self.profiler:
+            self.profiler.mark('primer fotograma')
+            self.profiler.report()
+            self.profiler=None
+
+    def renderscaled(self):
+        """
+        Renders a frame at the current resolution scale and stretches it
+        to the drawing area, context must be current
+        """
+        if not self.scaledtarget:
+            self.scaledtarget=dynres.ScaledTarget(*self.size)
+        width,height=self.scaledtarget.begin(self.resolution.scale)
+        self.renderer.viewport(width,height)
+        self.renderer.render()
+        self.scaledtarget.end()
+        self.renderer.viewport(*self.size)
+
+    def __frametime(self,rendertime):
+        """
+        Frame time for resolution control: last GPU frame time if GPU
+        timing is available (None until a new sample arrives), otherwise
+        time spent issuing the frame
+        """
+        timer=self.renderer.gputimer
+        if timer and timer.enabled:
+            if timer.samples and timer.samples[-1]['frame']!=self.lastsample:
+                sample=timer.samples[-1]
+                self.lastsample=sample['frame']
+                return sample['gpu']
+            return None
+        return rendertime
+
+    def setdynamic(self,status):
+        """
+        Enables or disables dynamic resolution
+        """
+        self.dynamic=status
+        self.resolution.reset()
+        self.queue_draw()
+
+    def __readback(self):
+        """
+        Starts reading back the rendered frame for the active capture and
+        delivers finished frames, context must be current
+        """
+        if not self.reader:
+            self.reader=capture.PixelReader()
+        recorder=self.recorder
+        index=recorder.nextframe(self.reader.pending())
+        if index is not None and not self.reader.read(self.size[0],self.size[1],(recorder,index)):
+            recorder.skip(index)
+        if recorder.complete():
+            # Frames in flight are still delivered to the recorder
+            self.recorder=None
+        self.__deliver()
+
+    def __deliver(self):
+        """
+        Hands frames already copied to pixel buffers to their recorders,
+        context must be current
+        """
+        for (recorder,index),width,height,pixels in self.reader.collect():
+            recorder.deliver(index,width,height,pixels)
+
+    def __pollcapture(self):
+        """
+        Delivers read back frames when no frames are being drawn
+        """
+        if self.reader:
+            self.gldrawable.gl_begin(self.glcontext)
+            self.__deliver()
+            self.gldrawable.gl_end()
+        if self.recorder and not self.redraw:
+            # Still view: draw again until the wanted frames are read
             self.queue_draw()
+        if self.recorder or self.reader and self.reader.pending():
+            return True
+        self.capturetimer=None
+        return False
 
-    def __preview(self):
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        glLoadIdentity()
-        self.setlights()
-        glTranslate(0.0, 0.0, -3.0)
-        glRotate(self.angle, 1.0, 1.0, 1.0)
-        # Select shader
-        glUseProgram(self.program)
-        # Draw current primitive
-        self.drawprimitive()
-        # Deselect shader
-        glUseProgram(0)
+    def startcapture(self,sink,count=1):
+        """
+        Captures the next count drawn frames into sink (see capture
+        module), returns the recorder
+        """
+        self.stopcapture()
+        self.recorder=capture.Recorder(sink,count)
+        self.queue_draw()
+        return self.recorder
+
+    def stopcapture(self):
+        """
+        Stops reading back frames for the active capture
+        """
+        if self.recorder:
+            self.recorder.cancel()
+            self.recorder=None
 
     def __countfps(self):
         """
         Counts FPS and refresh fps counter
         """
-        pass
+        # Frame end also schedules next animation frame
+        self.scheduler.frameend()
+
+    def framestats(self):
+        """
+        Returns frame rate and frame time statistics
+        """
+        stats=self.scheduler.stats.summary()
+        stats['fps']=self.scheduler.realfps()
+        stats['gpu']=self.renderer.gputimer and self.renderer.gputimer.stats()
+        stats['state']=self.renderer.state.stats()
+        stats['scale']=self.dynamic and self.redraw and self.resolution.scale or 1.0
+        return stats
+
+    def validateshader(self,vertexdata,fragmentdata):
+        """
+        Checks shader sources without the driver. Diagnostics are kept by
+        stage; raises ShaderError on the first stage with errors
+        """
+        self.diagnostics={}
+        for stage,source in (('vertex',vertexdata),('fragment',fragmentdata)):
+            if source and source.strip():
+                self.diagnostics[stage]=self.checkers[stage].check(source)
+        for stage in ('vertex','fragment'):
+            errors=glslcheck.errors(self.diagnostics.get(stage,[]))
+            if errors:
+                raise glslview.ShaderError('Shader validation failed',diagnostics=errors,stage=stage)
 
     def compileshader(self,vertexdata=DEFAULT_VERTEX,fragmentdata=DEFAULT_FRAGMENT):
         """
         Compiles shader data
         """
+        self.validateshader(vertexdata,fragmentdata)
         self.gldrawable = self.get_gl_drawable()
         glcontext = self.get_gl_context()
         self.gldrawable.gl_begin(self.glcontext)     
-        self.program = glslview.compile_program(vertexdata,fragmentdata)
-        self.gldrawable.gl_end()
-
-    def setlights(self):
-        """
-        Set lighting parameters
-        """
-        ambient = [0, 0, 0, 1]
-        diffuse = [0.5, 0.5, 0.5, 0]
-        specular = [1, 1, 1, 1]
-        specular1 = [1, 0, 0, 1]
-        specular2 = [0, 1, 0, 1]
-        specular3 = [0, 0, 1, 1]
-        position1=[2, 1, 0, 1]
-        position2=[-2, 1, 0, 1]
-        position3 = [0, 1, 1, 1]
-    
-        glLightfv(GL_LIGHT0, GL_AMBIENT, ambient)
-        glLightfv(GL_LIGHT0, GL_DIFFUSE, diffuse)
-        glLightfv(GL_LIGHT0, GL_SPECULAR, specular1)
-        glLightfv(GL_LIGHT0, GL_POSITION, position1)
-    
-        glLightfv(GL_LIGHT1, GL_AMBIENT, ambient)
-        glLightfv(GL_LIGHT1, GL_DIFFUSE, ambient)
-        glLightfv(GL_LIGHT1, GL_SPECULAR, specular2)
-        glLightfv(GL_LIGHT1, GL_POSITION, position2)
-    
-        glLightfv(GL_LIGHT2, GL_AMBIENT, ambient)
-        glLightfv(GL_LIGHT2, GL_DIFFUSE, ambient)
-        glLightfv(GL_LIGHT2, GL_SPECULAR, specular3)
-        glLightfv(GL_LIGHT2, GL_POSITION, position3)
-    
-        glMaterialfv(GL_FRONT_AND_BACK, GL_AMBIENT, ambient)
-        glMaterialfv(GL_FRONT_AND_BACK, GL_DIFFUSE, diffuse)
-        glMaterialfv(GL_FRONT_AND_BACK, GL_SPECULAR, specular)
-        glMaterialfv(GL_FRONT_AND_BACK, GL_SHININESS, 20)
-    
-        glEnable(GL_LIGHT0)
-        glEnable(GL_LIGHT1)
-        glEnable(GL_LIGHTING)
+        try:
+            program = self.programcache.get(vertexdata,fragmentdata)
+            self.renderer.setprogram(program,self.programcache.uniformset(program))
+        finally:
+            self.gldrawable.gl_end()
 
     def setbackground(self,r,g,b,a,image=None):
         """
         Sets background
         """
         self.gldrawable.gl_begin(self.glcontext)
-        glClearColor(r,g,b,a)
+        self.renderer.state.clearcolor(r,g,b,a)
         print "Cambiado el color"
         self.gldrawable.gl_end()
 
+    def settextures(self,entries):
+        """
+        Sets project textures, a list of (id, filename, payload)
+        """
+        self.renderer.textures.settextures(entries)
+        self.queue_draw()
+
+    def setuniform(self,name,value):
+        """
+        Sets a shader uniform value (pushed on next frame if it changed)
+        """
+        if self.renderer.uniforms.set(name,value):
+            self.queue_draw()
+
+    def applyconfig(self,config):
+        """
+        Applies performance settings of the application configuration
+        """
+        self.scheduler.targetfps=config.get('target_fps')
+        self.scheduler.idlefps=config.get('idle_fps')
+        self.renderer.settessellation(config.get('tessellation'))
+        self.resolution.budget=1000.0/max(config.get('target_fps'),1)
+        self.resolution.minscale=config.get('min_resolution')/100.0
+        cache=self.programcache.binarycache
+        cache.directory=os.path.join(config.get('cache_directory'),'programs')
+        cache.maxsize=config.get('program_cache_size')*MB
+        budget=config.get('texture_budget')*MB
+        if self.flags() & gtk.REALIZED:
+            # Evicting textures needs the GL context
+            self.gldrawable.gl_begin(self.glcontext)
+            self.renderer.textures.setbudget(budget)
+            self.gldrawable.gl_end()
+            self.queue_draw()
+        else:
+            self.renderer.textures.budget=budget
+
     def setprimitive(self,id):
         """
         Sets current primitive to be drawn
         """
-        self.primitive=id
+        self.renderer.primitive=id
         self.__gldrwexpose()
-
-    def drawprimitive(self):
-        # TODO: Texture Mapping coord for cube,sphere,torus
-        if self.primitive=='Plano':
-            glBegin(GL_QUADS)
-            glVertex3f(-1.5,-1.5,0)
-            glTexCoord2d(0,0)
-            glNormal3f(0,0,1)
-            glVertex3f(-1.5,1.5,0)
-            glTexCoord2d(0,1)
-            glNormal3f(0,0,1)
-            glVertex3f(1.5,1.5,0)
-            glTexCoord2d(1,1)
-            glNormal3f(0,0,1)
-            glVertex3f(1.5,-1.5,0)
-            glTexCoord2d(1,0)
-            glNormal3f(0,0,1)
-            glEnd()
-        elif self.primitive=='Cubo':
-            glutSolidCube(2)
-        elif self.primitive=='Esfera':
-            glutSolidSphere(2,32,32)
-        elif self.primitive=='Toroide':
-            glutSolidTorus(0.35,1.0,32,32)
-        elif self.primitive=='Tetera':
-            glutSolidTeapot(1.0)
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# gputimer.py
+# GPU frame and draw timing with timer queries
+###############################################################################
+
+# Python imports
+import time,ctypes
+from collections import deque
+
+# NumPy imports
+import numpy
+
+# OpenGL imports
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_3_3 import glGetQueryObjectui64v as rawGetQueryObjectui64v
+from OpenGL.raw.GL.VERSION.GL_3_2 import glGetInteger64v as rawGetInteger64v
+
+# Application imports
+import profiler
+
+# Number of frames in flight before results are read back
+DEFAULT_DEPTH=3
+DEFAULT_HISTORY=240
+
+def genquery():
+    """
+    Creates a query object name
+    """
+    return int(numpy.ravel(glGenQueries(1))[0])
+
+class QuerySlot:
+    """
+    Timer queries issued during one frame
+    """
+
+    def __init__(self):
+        """
+        Class initialization
+        """
+        self.elapsed=genquery()
+        self.timestamps=[]
+        self.marks=[]
+        self.pending=False
+        self.frame=0
+        self.cpu=0.0
+
+    def timestamp(self,name):
+        """
+        Records a GPU timestamp named name
+        """
+        index=len(self.marks)
+        if index==len(self.timestamps):
+            self.timestamps.append(genquery())
+        glQueryCounter(self.timestamps[index],GL_TIMESTAMP)
+        self.marks.append(name)
+
+    def available(self):
+        """
+        Checks if every query result is available without waiting
+        """
+        result=numpy.zeros(1,dtype=numpy.int32)
+        # The elapsed time query ends after the last timestamp, every query
+        # is checked so reading results never blocks
+        for query in [self.elapsed]+self.timestamps[:len(self.marks)]:
+            glGetQueryObjectiv(query,GL_QUERY_RESULT_AVAILABLE,result)
+            if not result[0]:
+                return False
+        return True
+
+    def result(self,query):
+        """
+        Returns query result (nanoseconds)
+        """
+        result=ctypes.c_uint64(0)
+        rawGetQueryObjectui64v(query,GL_QUERY_RESULT,ctypes.byref(result))
+        return result.value
+
+    def delete(self):
+        """
+        Releases query objects
+        """
+        queries=[self.elapsed]+self.timestamps
+        glDeleteQueries(len(queries),queries)
+
+class GPUTimer:
+    """
+    Measures GPU time per frame (GL_TIME_ELAPSED) and per draw (GL_TIMESTAMP
+    pairs). Queries rotate through several frames and results are only read
+    once available, so measuring never stalls the pipeline
+    """
+
+    def __init__(self,depth=DEFAULT_DEPTH,history=DEFAULT_HISTORY):
+        """
+        Class initialization
+        """
+        self.enabled=bool(glGenQueries) and bool(glQueryCounter) and bool(glGetQueryObjectui64v)
+        self.depth=depth
+        self.slots=[]
+        self.current=None
+        self.frame=0
+        self.dropped=0
+        self.started=0.0
+        self.samples=deque(maxlen=history)
+        if self.enabled:
+            self.slots=[QuerySlot() for i in range(depth)]
+
+    def beginframe(self):
+        """
+        Starts measuring a frame
+        """
+        if not self.enabled:
+            return
+        self.collect()
+        slot=self.slots[self.frame % self.depth]
+        self.frame+=1
+        if slot.pending:
+            # Results from depth frames ago still not ready: skip this frame
+            self.dropped+=1
+            self.current=None
+            return
+        slot.marks=[]
+        slot.frame=self.frame
+        self.current=slot
+        self.started=time.time()
+        glBeginQuery(GL_TIME_ELAPSED,slot.elapsed)
+
+    def begindraw(self,name):
+        """
+        Marks start of a draw
+        """
+        if self.current:
+            self.current.timestamp(name)
+
+    def enddraw(self):
+        """
+        Marks end of last started draw
+        """
+        if self.current:
+            self.current.timestamp(None)
+
+    def endframe(self):
+        """
+        Ends measuring current frame
+        """
+        slot=self.current
+        if not slot:
+            return
+        glEndQuery(GL_TIME_ELAPSED)
+        slot.cpu=(time.time()-self.started)*1000.0
+        slot.pending=True
+        self.current=None
+
+    def collect(self):
+        """
+        Reads back available results of previous frames
+        """
+        for slot in sorted([slot for slot in self.slots if slot.pending],key=lambda slot: slot.frame):
+            if not slot.available():
+                break
+            sample={
+                'frame': slot.frame,
+                'cpu': slot.cpu,
+                'gpu': slot.result(slot.elapsed)/1000000.0,
+                'draws': [],
+            }
+            # Timestamp pairs: (name, begin) (None, end)
+            marks=slot.marks
+            tracing=profiler.PROFILER.enabled
+            if tracing and profiler.PROFILER.gpuoffset is None:
+                profiler.PROFILER.calibrate(self.gputime())
+            for index in range(0,len(marks)-1,2):
+                begin=slot.result(slot.timestamps[index])
+                end=slot.result(slot.timestamps[index+1])
+                sample['draws'].append((marks[index],(end-begin)/1000000.0))
+                if tracing:
+                    profiler.PROFILER.gpuspan(marks[index],begin,end)
+            self.samples.append(sample)
+            slot.pending=False
+
+    def gputime(self):
+        """
+        Returns current GPU timestamp (nanoseconds)
+        """
+        result=ctypes.c_int64(0)
+        rawGetInteger64v(GL_TIMESTAMP,ctypes.byref(result))
+        return result.value
+
+    def reset(self):
+        """
+        Forgets collected samples
+        """
+        self.collect()
+        self.samples.clear()
+        self.dropped=0
+
+    def stats(self):
+        """
+        Returns average, minimum and maximum CPU and GPU frame times
+        """
+        if not self.samples:
+            return None
+        gpu=[sample['gpu'] for sample in self.samples]
+        cpu=[sample['cpu'] for sample in self.samples]
+        return {
+            'samples': len(gpu),
+            'gpu': sum(gpu)/len(gpu),
+            'gpumin': min(gpu),
+            'gpumax': max(gpu),
+            'cpu': sum(cpu)/len(cpu),
+            'cpumin': min(cpu),
+            'cpumax': max(cpu),
+            'dropped': self.dropped,
+        }
+
+    def export_csv(self,filename):
+        """
+        Writes collected samples to a CSV file
+        """
+        fd=open(filename,'w')
+        fd.write('frame,cpu_ms,gpu_ms,draw,draw_gpu_ms\n')
+        for sample in self.samples:
+            draws=sample['draws'] or [('',None)]
+            for name,ms in draws:
+                if ms is None:
+                    ms=''
+                else:
+                    ms='%.4f' % ms
+                fd.write('%d,%.4f,%.4f,%s,%s\n' % (sample['frame'],sample['cpu'],sample['gpu'],name,ms))
+        fd.close()
+
+    def delete(self):
+        """
+        Releases query objects
+        """
+        for slot in self.slots:
+            slot.delete()
+        self.slots=[]
+        self.enabled=False
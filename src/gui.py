@@ -31,14 +31,39 @@ import gtksourceview2 as gtksourceview
 # Application imports
 from srceditor import SRCEditor
 from glslefile import GLSLEFile
-import glwidget
+import symindex
+import thumbcache
+import texloader
+import profiler
+
+# Fotogramas grabados por defecto
+DEFAULT_RECORD_FRAMES=120
+
+# Intervalo de comprobación de cambios del fichero de configuración (ms)
+CONFIG_CHECK_INTERVAL=2000
+
+# Directorio de shaders de ejemplo (junto a los módulos de la aplicación)
+SHADERS_DIRECTORY=os.path.join(os.path.dirname(os.path.abspath(__file__)),'shaders')
+
+# Opciones de rendimiento editables en el diálogo de preferencias
+PREFERENCES=[
+	('target_fps','spnPrefTargetFPS'),
+	('idle_fps','spnPrefIdleFPS'),
+	('tessellation','spnPrefTessellation'),
+	('min_resolution','spnPrefMinResolution'),
+	('texture_budget','spnPrefTextureBudget'),
+	('texture_workers','spnPrefTextureWorkers'),
+	('thumbnail_items','spnPrefThumbnailItems'),
+	('thumbnail_cache_size','spnPrefThumbnailCacheSize'),
+	('program_cache_size','spnPrefProgramCacheSize'),
+]
 
 class GUI:
 	"""
 	Clase principal del GUI de la aplicación
 	"""
 
-	def __init__(self,metadata,config,gladetree):
+	def __init__(self,metadata,config,gladetree,profiler=None):
 		"""
 		Constructor de la clase de control del GUI
 		"""
@@ -50,6 +75,8 @@ class GUI:
 		self.gladetree=gladetree
 		# Contenedor para los widgets utilizados
 		self.widgets={}
+		# Medición de tiempos de arranque
+		self.profiler=profiler
 		# Inicialización de la aplicación
 		self.apprun()
 		
@@ -93,7 +120,9 @@ class GUI:
 			'scrTextureInfo',
 			# OpenGL Shader preview widgets
 			'vbxPreviewBox','cmbPreviewPrimitive',
-		]
+			# Preferences dialog widgets
+			'cmbPrefProfile','entPrefCacheDirectory',
+		] + [widgetname for option,widgetname in PREFERENCES]
 		for widgetname in widgetlist:
 			self.widgets[widgetname]=self.gladetree.get_widget(widgetname)
 
@@ -123,7 +152,9 @@ class GUI:
 			'editSelectAll': self.editSelectAll,
 			'editSelectNone': self.editSelectNone,
 			'editGoTo': self.editGoTo,
+			'editGoToDefinition': self.editGoToDefinition,
 			'editPreferences': self.editPreferences,
+			'prefChangeProfile': self.prefChangeProfile,
 			# Viewing signals
 			'viewLineNums': self.viewLineNums,
 			# Formatting signals
@@ -141,6 +172,14 @@ class GUI:
 			'toolsAnimatePreview': self.toolsAnimatePreview,
 			'toolsStopAnimatePreview': self.toolsStopAnimatePreview,
 			'toolsSetPrimitive': self.toolsSetPrimitive,
+			'toolsExportGPUTimes': self.toolsExportGPUTimes,
+			'toolsProfileFrames': self.toolsProfileFrames,
+			'toolsExportTrace': self.toolsExportTrace,
+			'toolsGallery': self.toolsGallery,
+			'toolsDynamicResolution': self.toolsDynamicResolution,
+			'toolsScreenshot': self.toolsScreenshot,
+			'toolsRecordFrames': self.toolsRecordFrames,
+			'toolsEmbedTextures': self.toolsEmbedTextures,
 			# Texture info dialog signals
 			'textureZoomIn': self.textureZoomIn,
 			'textureZoomOut': self.textureZoomOut,
@@ -190,6 +229,18 @@ class GUI:
 		self.ffimage.add_pattern('*.jpeg')
 		self.ffimage.add_pattern('*.png')
 		self.ffimage.add_pattern('*.bmp')
+		# CSV file selection filter
+		self.ffcsv=gtk.FileFilter()
+		self.ffcsv.set_name('Valores separados por comas (*.csv)')
+		self.ffcsv.add_pattern('*.csv')
+		# Trace file selection filter
+		self.fftrace=gtk.FileFilter()
+		self.fftrace.set_name('Trazas de perfilado (*.json)')
+		self.fftrace.add_pattern('*.json')
+		# PNG image file selection filter
+		self.ffpng=gtk.FileFilter()
+		self.ffpng.set_name('Imágenes PNG (*.png)')
+		self.ffpng.add_pattern('*.png')
 
 	def initializeapp(self):
 		"""
@@ -198,19 +249,65 @@ class GUI:
 		# Editor objects initialization
 		self.feditor=SRCEditor(self.widgets['ntbEditor'],'Fragment',self.widgets['lblEditorStatus'],lang='text/x-csrc')
 		self.veditor=SRCEditor(self.widgets['ntbEditor'],'Vertex',self.widgets['lblEditorStatus'],lang='text/x-csrc')
+		# Uniforms, varyings and functions are completed across stages
+		self.feditor.peers=[self.veditor]
+		self.veditor.peers=[self.feditor]
 		# Project info dictionary
 		self.prjinfo={'name':'','comments':'',}
 		# Texture list objects initialization
 		self.texturelist = gtk.ListStore(str, gtk.gdk.Pixbuf, str)
+		# Texture payloads embedded in loaded project, by filename
+		self.embeddedtextures={}
+		# Shader variant axes of loaded project
+		self.axes=[]
+		# Texture icon thumbnails, decoded in background threads
+		self.thumbnails=thumbcache.ThumbnailCache(os.path.join(self.config.get('cache_directory'),'thumbnails'),
+			self.config.get('thumbnail_items'),self.config.get('thumbnail_cache_size')*thumbcache.MB)
+		self.textureloader=texloader.TextureLoader(self.thumbnails,self.config.get('texture_workers'))
+		# Los cambios de configuración se aplican sin reiniciar
+		self.config.addlistener(self.configChanged)
+		gobject.timeout_add(CONFIG_CHECK_INTERVAL,self.checkConfig)
 		self.widgets['icvTextures'].set_model(self.texturelist)
 		self.widgets['icvTextures'].set_text_column(0)
 		self.widgets['icvTextures'].set_pixbuf_column(1)
 		self.widgets['icvTextures'].set_text_column(2)
-		# OpenGL Preview widget initialization
+		# Preview frame statistics in main status bar
+		self.lblPreviewStats=gtk.Label('')
+		self.widgets['stbMain'].pack_end(self.lblPreviewStats,False,False)
+		self.lblPreviewStats.show()
+		# Shader library gallery (created on first use)
+		self.gallery=None
+		# Preview frame capture in progress and its options (created on first use)
+		self.recorder=None
+		self.recordoptions=None
+		# OpenGL preview is created once the main window is shown, preview
+		# settings changed before are applied then
+		self.glarea=None
+		self.background=None
+		self.animstatus=False
+		gobject.idle_add(self.initializepreview)
+
+	def initializepreview(self):
+		"""
+		OpenGL preview widget initialization (loads OpenGL modules)
+		"""
+		if self.profiler:
+			self.profiler.mark('ventana')
+		import glwidget
+		if self.profiler:
+			self.profiler.mark('importación OpenGL')
 		display_mode = (gtk.gdkgl.MODE_RGB | gtk.gdkgl.MODE_DEPTH | gtk.gdkgl.MODE_DOUBLE)
-		self.glarea = glwidget.GLDrawingArea(display_mode)
+		self.glarea = glwidget.GLDrawingArea(display_mode,self.config)
+		self.glarea.profiler=self.profiler
+		self.glarea.renderer.primitive=self.widgets['cmbPreviewPrimitive'].get_active_text()
+		self.glarea.dynamic=self.gladetree.get_widget('mnuToolsDynamicResolution').get_active()
+		if self.background:
+			self.glarea.setbackground(*self.background)
+		self.glarea.settextures([(id,file,self.embeddedtextures.get(file)) for id,file in self.packTextureData()])
 		self.widgets['vbxPreviewBox'].add(self.glarea)
 		self.glarea.show()
+		gobject.timeout_add(1000,self.updatePreviewStats)
+		return False
 
 	def apprun(self):
 		"""
@@ -228,6 +325,8 @@ class GUI:
 		self.initializeapp()
 		# Load config
 		self.loadconfig()
+		if self.profiler:
+			self.profiler.mark('widgets')
 		# Enter main event loop
 		gtk.main()
 
@@ -303,7 +402,12 @@ class GUI:
 		self.widgets['txtProjectInfoComments'].get_buffer().set_text('')
 		self.veditor.clear()
 		self.feditor.clear()
+		self.textureloader.cancel()
 		self.texturelist.clear()
+		self.embeddedtextures={}
+		self.axes=[]
+		if self.glarea:
+			self.glarea.settextures([])
 		return True
 
 	def loadProject(self,data):
@@ -314,6 +418,8 @@ class GUI:
 		self.widgets['txtProjectInfoComments'].get_buffer().set_text(data.comments)
 		self.veditor.set_text(data.vertex)
 		self.feditor.set_text(data.fragment)
+		self.embeddedtextures=data.embedded
+		self.axes=data.axes
 		self.loadTextures(data.textures)
 
 	def loadTextures(self,texturedata):
@@ -325,6 +431,12 @@ class GUI:
 			self.texturelist.append([texture[1], None,texture[0]])
 		self.toolsRefreshTextures()
 
+	def loadTexturePixbuf(self,file):
+		"""
+		Decodes a texture from project embedded data or from its file
+		"""
+		return thumbcache.decode(file,self.embeddedtextures.get(file))
+
 	def confirmNotSaving(self):
 		"""
 		Confirms not to save the current project
@@ -405,7 +517,8 @@ class GUI:
 			vertexdata=self.veditor.get_text()
 			fragmentdata=self.feditor.get_text()
 			#try:
-			data.save(file,self.prjinfo,'',vertexdata,fragmentdata,self.packTextureData())
+			data.save(file,self.prjinfo,self.axes,vertexdata,fragmentdata,self.packTextureData(),
+				embed=self.widgets['mnuToolsEmbedTextures'].get_active(),embedded=self.embeddedtextures)
 			#except:
 			#	self.msgDialog('error','No se ha podido grabar el archivo %s' % file)
 			# Change editors state
@@ -497,17 +610,58 @@ class GUI:
    	    	self.msgDialog('error','No hay ningún editor de código en uso')
 
 	def editPreferences(self,widget):
-   	    """
-   	    Shows preferences dialog
-   	    """
-   	    resp=self.openDialog(self.winPreferences)
-   	    if resp==gtk.RESPONSE_OK:
-   	    	# Save and apply new preferences
-   	    	print "Grabar preferencias"
-   	    else:
-   	    	# Reload actual preferences
-   	    	print "Recargar preferencias"	
-   	    self.closeDialog(self.winPreferences)
+		"""
+		Shows preferences dialog
+		"""
+		profiles=self.config.profiles()
+		self.widgets['cmbPrefProfile'].set_active(profiles.index(self.config.profile))
+		self.prefChangeProfile()
+		resp=self.openDialog(self.winPreferences)
+		if resp==gtk.RESPONSE_OK:
+			# Save and apply new preferences
+			profile=profiles[self.widgets['cmbPrefProfile'].get_active()]
+			self.config.setprofile(profile)
+			for option,widgetname in PREFERENCES:
+				self.config.set(option,self.widgets[widgetname].get_value_as_int())
+			directory=self.widgets['entPrefCacheDirectory'].get_text().strip()
+			if directory:
+				self.config.set('cache_directory',os.path.expanduser(directory))
+			self.config.apply()
+			try:
+				self.config.saveconfig()
+			except (IOError,OSError),e:
+				self.msgDialog('error','No se puede grabar la configuración: %s' % e)
+		self.closeDialog(self.winPreferences)
+
+	def prefChangeProfile(self,widget=None):
+		"""
+		Shows values of the profile selected in preferences dialog
+		"""
+		profile=self.config.profiles()[self.widgets['cmbPrefProfile'].get_active()]
+		values=self.config.resolve(profile)
+		for option,widgetname in PREFERENCES:
+			self.widgets[widgetname].set_value(values[option])
+		self.widgets['entPrefCacheDirectory'].set_text(values['cache_directory'])
+
+	def checkConfig(self):
+		"""
+		Reloads configuration file if it was modified outside the application
+		"""
+		self.config.reload()
+		return True
+
+	def configChanged(self,config,changed):
+		"""
+		Applies modified configuration options
+		"""
+		self.thumbnails.memoryitems=config.get('thumbnail_items')
+		self.thumbnails.maxsize=config.get('thumbnail_cache_size')*thumbcache.MB
+		self.thumbnails.setdirectory(os.path.join(config.get('cache_directory'),'thumbnails'))
+		if self.gallery:
+			self.gallery.setdirectory(os.path.join(config.get('cache_directory'),'gallery'))
+		self.textureloader.resize(config.get('texture_workers'))
+		if self.glarea:
+			self.glarea.applyconfig(config)
 
 
    	def viewLineNums(self,widget=None):
@@ -603,29 +757,65 @@ class GUI:
 		Refresh texture list
 		"""
 		# TODO: Problem with iconview refreshing
-		self.glarea.redraw=False
 		iter=self.texturelist.get_iter_first()
 		id=0
 		w,h=self.getTextureSize()
+		jobs=[]
 		if iter:
+			placeholder=self.placeholderIcon(w,h)
 			while iter:
 				id+=1
 				file=self.texturelist.get_value(iter,0)
 				if reload:
-					self.statusMessage('info','Cargando fichero de textura %s' % file)
-					icon = gtk.gdk.pixbuf_new_from_file(file)
-					# Resize pixbuf to preferred size
-					icon=icon.scale_simple(w,h,gtk.gdk.INTERP_BILINEAR)
-					self.texturelist.set_value(iter, 1, icon)
+					# Placeholder until the thumbnail is decoded in background
+					self.texturelist.set_value(iter, 1, placeholder)
+					reference=gtk.TreeRowReference(self.texturelist,self.texturelist.get_path(iter))
+					jobs.append((reference,file,(w,h),self.embeddedtextures.get(file)))
 				self.texturelist.set_value(iter, 2, 'Texture' + str(id))
 				iter=self.texturelist.iter_next(iter)
-			self.statusMessage('info',msg)
 			if widget==self.widgets['cmbTextureSizes']:
 				self.widgets['icvTextures'].set_item_width(w)
+		if self.glarea:
+			self.glarea.settextures([(id,file,self.embeddedtextures.get(file)) for id,file in self.packTextureData()])
+		if jobs:
+			self.texturesloaded=0
+			self.statusMessage('info','Cargando %s texturas' % len(jobs))
+			self.textureloader.load(jobs,self.texturesDecoded,lambda: self.texturesDone(msg))
+		elif id:
+			self.statusMessage('info',msg)
 		else:
 			self.statusMessage('info','')
-		self.glarea.redraw=True
-	
+
+	def placeholderIcon(self,w,h):
+		"""
+		Returns an icon shown while a texture thumbnail is loading
+		"""
+		icon=gtk.gdk.Pixbuf(gtk.gdk.COLORSPACE_RGB,True,8,w,h)
+		icon.fill(0x80808080)
+		return icon
+
+	def texturesDecoded(self,results):
+		"""
+		Sets a batch of decoded texture thumbnails in icon view
+		"""
+		for reference,file,icon,error in results:
+			self.texturesloaded+=1
+			if error:
+				self.statusMessage('error','No se ha podido cargar la textura %s' % file)
+				continue
+			# Rows removed meanwhile have an invalid reference
+			if reference.valid():
+				iter=self.texturelist.get_iter(reference.get_path())
+				self.texturelist.set_value(iter, 1, icon)
+		self.statusMessage('info','Cargando texturas (%s cargadas)' % self.texturesloaded)
+
+	def texturesDone(self,msg):
+		"""
+		Texture thumbnail loading end
+		"""
+		self.thumbnails.flush()
+		self.statusMessage('info',msg)
+
 	def toolsTextureInfo(self,widget,event=None):
 		"""
 		Shows texture info dialog
@@ -636,7 +826,7 @@ class GUI:
 			iter=self.texturelist.get_iter(path)
 			file=self.texturelist.get_value(iter,0)
 			id=self.texturelist.get_value(iter,2)
-			img = gtk.gdk.pixbuf_new_from_file(file)
+			img = self.loadTexturePixbuf(file)
 			size=str(img.get_width()) + 'x' + str(img.get_height())
 			# Show info in texture info dialog
 			self.widgets['lblTextureInfoID'].set_text(id)
@@ -646,17 +836,59 @@ class GUI:
 			self.widgets['imgTextureInfo'].set_from_pixbuf(img)
 			resp=self.openDialog(self.winTextureInfo,close=True)
 
+	def editGoToDefinition(self,widget):
+		"""
+		Place cursor at the declaration of the identifier at cursor
+		"""
+		editor=self.getCurrentEditor()
+		if editor:
+			target,symbol=editor.definition()
+			if symbol:
+				if target!=editor:
+					self.widgets['ntbEditor'].set_current_page(self.widgets['ntbEditor'].page_num(target.scroll))
+				target.gotosymbol(symbol)
+			else:
+				self.statusMessage('info','No se ha encontrado la definición')
+		else:
+			self.msgDialog('error','No hay ningún editor de código en uso')
+
 	def toolsReloadShader(self,widget):
 		"""
 		Recompile shader to be shown in preview window
 		"""
-		self.glarea.compileshader(self.veditor.get_text(),self.feditor.get_text())
+		import glslview
+		if not self.previewReady():
+			return
+		editors={'vertex': self.veditor,'fragment': self.feditor}
+		# Varyings written and read by each stage
+		varyings=symindex.crosscheck(self.veditor.symbols,self.feditor.symbols)
+		try:
+			self.glarea.compileshader(self.veditor.get_text(),self.feditor.get_text())
+		except glslview.ShaderError,e:
+			for stage,editor in editors.items():
+				if stage==e.stage:
+					editor.markdiagnostics(e.diagnostics+varyings[stage])
+				else:
+					editor.markdiagnostics(self.glarea.diagnostics.get(stage,[])+varyings[stage])
+			if e.diagnostics:
+				diagnostic=e.diagnostics[0]
+				self.statusMessage('error','Error en el shader %s (línea %s): %s' % (e.stage or '',diagnostic.line,diagnostic.message))
+			else:
+				self.statusMessage('error','Error al compilar el shader: %s' % e)
+			return
+		# Warnings of sources that compiled
+		for stage,editor in editors.items():
+			editor.markdiagnostics(self.glarea.diagnostics.get(stage,[])+varyings[stage])
 		self.glarea.queue_draw()
+		stats=self.glarea.programcache.stats()
+		self.statusMessage('info','Shader recargado (caché de programas: %s aciertos, %s fallos)' % (stats['hits'],stats['misses']))
 
 	def toolsAnimatePreview(self,widget):
 		"""
 		Start shader preview animation
 		"""
+		if not self.previewReady():
+			return
 		self.glarea.redraw=True
 		self.glarea.queue_draw()
 
@@ -664,13 +896,183 @@ class GUI:
 		"""
 		Stop shader preview animation
 		"""
-		self.glarea.redraw=False
+		if self.glarea:
+			self.glarea.redraw=False
 
 	def toolsSetPrimitive(self,widget):
 		"""
 		Set the currently selected primitive to be rendered
 		"""
-		self.glarea.setprimitive(self.widgets['cmbPreviewPrimitive'].get_active_text())
+		if self.glarea:
+			self.glarea.setprimitive(self.widgets['cmbPreviewPrimitive'].get_active_text())
+
+	def toolsExportGPUTimes(self,widget):
+		"""
+		Export preview GPU timing samples to a CSV file
+		"""
+		if not self.previewReady():
+			return
+		if not self.glarea.renderer.gputimer or not self.glarea.renderer.gputimer.enabled:
+			self.msgDialog('error','Las consultas de tiempo de GPU no están disponibles')
+			return
+		self.winFileChooser.set_action(gtk.FILE_CHOOSER_ACTION_SAVE)
+		self.setFileChooserFilters([self.ffcsv,])
+		resp=self.openDialog(self.winFileChooser,close=True)
+		file=self.winFileChooser.get_filename()
+		if file and resp==gtk.RESPONSE_OK:
+			self.glarea.renderer.gputimer.export_csv(file)
+			self.statusMessage('info','Tiempos de GPU exportados a %s' % file)
+
+	def toolsProfileFrames(self,widget):
+		"""
+		Toggle recording of preview and compilation profiling spans
+		"""
+		profiler.PROFILER.enable(widget.get_active())
+		if widget.get_active():
+			self.statusMessage('info','Perfilado de fotogramas activado')
+		else:
+			self.statusMessage('info','Perfilado de fotogramas desactivado (%d eventos)' % len(profiler.PROFILER.events))
+
+	def toolsExportTrace(self,widget):
+		"""
+		Export recorded profiling spans to a Chrome trace JSON file
+		"""
+		if not profiler.PROFILER.events:
+			self.msgDialog('error','No hay eventos de perfilado registrados','Active el perfilado de fotogramas en el menú de herramientas')
+			return
+		self.winFileChooser.set_action(gtk.FILE_CHOOSER_ACTION_SAVE)
+		self.setFileChooserFilters([self.fftrace,])
+		resp=self.openDialog(self.winFileChooser,close=True)
+		file=self.winFileChooser.get_filename()
+		if file and resp==gtk.RESPONSE_OK:
+			profiler.PROFILER.export(file)
+			self.statusMessage('info','Traza de perfilado exportada a %s' % file)
+
+	def toolsDynamicResolution(self,widget):
+		"""
+		Toggle reduced resolution of animated preview frames to hold the
+		frame rate
+		"""
+		if self.glarea:
+			self.glarea.setdynamic(widget.get_active())
+
+	def toolsScreenshot(self,widget):
+		"""
+		Save next preview frame to a PNG file
+		"""
+		import capture
+		if not self.previewReady():
+			return
+		self.winFileChooser.set_action(gtk.FILE_CHOOSER_ACTION_SAVE)
+		self.setFileChooserFilters([self.ffpng,])
+		resp=self.openDialog(self.winFileChooser,close=True)
+		file=self.winFileChooser.get_filename()
+		if file and resp==gtk.RESPONSE_OK:
+			if not file.lower().endswith('.png'):
+				file+='.png'
+			self.recorder=self.glarea.startcapture(capture.PNGSink(file,sequence=False))
+
+	def getRecordOptions(self):
+		"""
+		Returns frame count and command widgets shown in the file chooser
+		when recording frames
+		"""
+		if not self.recordoptions:
+			frames=gtk.SpinButton(gtk.Adjustment(DEFAULT_RECORD_FRAMES,1,100000,1,10))
+			command=gtk.Entry()
+			command.set_tooltip_text('Los fotogramas se envían sin comprimir (RGBA) a la orden en lugar '
+				'de guardarse como PNG. {width} y {height} se sustituyen por el tamaño')
+			box=gtk.HBox(False,6)
+			box.pack_start(gtk.Label('Fotogramas:'),False,False)
+			box.pack_start(frames,False,False)
+			box.pack_start(gtk.Label('Enviar a la orden:'),False,False)
+			box.pack_start(command,True,True)
+			box.show_all()
+			self.recordoptions=(box,frames,command)
+		return self.recordoptions
+
+	def toolsRecordFrames(self,widget):
+		"""
+		Record animated preview frames to a PNG sequence or a command
+		"""
+		import capture
+		if not self.previewReady():
+			return
+		if self.recorder and not self.recorder.done():
+			# Second activation stops the recording in progress
+			self.glarea.stopcapture()
+			self.statusMessage('info','Grabación detenida')
+			return
+		box,frames,command=self.getRecordOptions()
+		self.winFileChooser.set_action(gtk.FILE_CHOOSER_ACTION_SELECT_FOLDER)
+		self.setFileChooserFilters([])
+		self.winFileChooser.set_extra_widget(box)
+		resp=self.openDialog(self.winFileChooser,close=True)
+		self.winFileChooser.set_extra_widget(None)
+		directory=self.winFileChooser.get_filename()
+		if directory and resp==gtk.RESPONSE_OK:
+			if command.get_text().strip():
+				sink=capture.PipeSink(command.get_text().strip(),directory)
+			else:
+				sink=capture.PNGSink(directory)
+			self.recorder=self.glarea.startcapture(sink,frames.get_value_as_int())
+			self.glarea.redraw=True
+			self.glarea.queue_draw()
+
+	def checkCapture(self):
+		"""
+		Show progress and result of preview frame capture
+		"""
+		recorder=self.recorder
+		output=recorder.writer.sink.describe()
+		stats=recorder.writer.stats()
+		if not recorder.done():
+			if recorder.count>1:
+				self.statusMessage('info','Grabando fotogramas: %d de %d (%d omitidos)' % (stats['frames'],
+					recorder.count,recorder.skipped))
+			return
+		self.recorder=None
+		if recorder.writer.error:
+			self.msgDialog('error','No se han podido guardar los fotogramas',str(recorder.writer.error))
+		elif recorder.count==1:
+			self.statusMessage('info','Imagen guardada en %s' % output)
+		else:
+			self.statusMessage('info','%d fotogramas exportados a %s (%.1f fotogramas/s, %d omitidos)' % (
+				stats['frames'],output,stats['fps'] or 0.0,recorder.skipped))
+			if recorder.skipped:
+				self.msgDialog('warning','Se han omitido %d de %d fotogramas' % (recorder.skipped,recorder.count),
+					'La escritura no ha seguido el ritmo de la vista previa. Los fotogramas omitidos '
+					'faltan en la numeración de la secuencia PNG')
+
+	def toolsGallery(self,widget):
+		"""
+		Show rendered thumbnails of the projects in a directory
+		"""
+		if not self.gallery:
+			import galleryview
+			directory=os.path.join(self.config.get('cache_directory'),'gallery')
+			self.gallery=galleryview.GalleryView(self.winMain,self.galleryOpen,directory)
+			self.gallery.show(SHADERS_DIRECTORY)
+		else:
+			self.gallery.show(self.gallery.chooser.get_current_folder() or SHADERS_DIRECTORY)
+
+	def galleryOpen(self,file):
+		"""
+		Opens a project activated in the gallery
+		"""
+		self.clearProject()
+		data=GLSLEFile(file)
+		self.loadProject(data)
+		self.statusMessage('info','Proyecto %s cargado' % data.name)
+
+	def toolsEmbedTextures(self,widget):
+		"""
+		Toggle storing texture data inside saved projects
+		"""
+		if widget.get_active():
+			self.statusMessage('info','Las texturas se guardarán dentro del proyecto')
+		else:
+			self.statusMessage('info','El proyecto guardará sólo las rutas de las texturas')
 
 	def changeBGColor(self,widget):
 		"""
@@ -682,7 +1084,9 @@ class GUI:
 		b=color.blue/65535.0
 		a=widget.get_alpha()/65535.0
 		print (r,g,b,a)
-		self.glarea.setbackground(r,g,b,a)
+		self.background=(r,g,b,a)
+		if self.glarea:
+			self.glarea.setbackground(r,g,b,a)
 
 	########################################################################
 	# Texture info dialog signals
@@ -758,6 +1162,39 @@ class GUI:
 	# Other tool methods
 	########################################################################
 
+	def updatePreviewStats(self):
+		"""
+		Refresh preview frame statistics shown in status bar
+		"""
+		if self.recorder:
+			self.checkCapture()
+		for name,value,message in self.glarea.renderer.uniforms.takerejected():
+			self.statusMessage('error','Valor %r no válido para el uniform %s' % (value,name))
+		stats=self.glarea.framestats()
+		if stats['samples']:
+			text='%.1f FPS  media %.1f ms  p95 %.1f ms  p99 %.1f ms' % (stats['fps'],
+				stats['mean'],stats['p95'],stats['p99'])
+			gpu=stats['gpu']
+			if gpu:
+				text+='  |  CPU %.2f ms  GPU %.2f ms (%.2f-%.2f)' % (gpu['cpu'],gpu['gpu'],gpu['gpumin'],gpu['gpumax'])
+			if stats['scale']<1.0:
+				text+='  |  Resolución %d%%' % (stats['scale']*100)
+			state=stats['state']
+			total=state['calls']+state['skipped']
+			if total:
+				text+='  |  Estado GL: %d%% omitido' % (100*state['skipped']/total)
+			self.lblPreviewStats.set_text(text)
+		return True
+
+	def previewReady(self):
+		"""
+		Checks that the OpenGL preview exists, telling the user otherwise
+		"""
+		if self.glarea:
+			return True
+		self.statusMessage('info','La vista previa aún se está inicializando')
+		return False
+
 	def msgDialog(self,mode,msg,desc=None,parent=None,cancel=False):
 		"""
 		Shows a message dialog
@@ -815,14 +1252,17 @@ class GUI:
 		"""
 		Executes dialog pre-opening operations
 		"""
-		self.animstatus=self.glarea.redraw
-		self.glarea.redraw=False
+		if self.glarea:
+			self.animstatus=self.glarea.redraw
+			self.glarea.redraw=False
 		
 	def postOpenDialog(self):
 		"""
 		Executes dialog post-opening operations
 		"""
-		self.glarea.redraw=self.animstatus
+		if self.glarea:
+			self.glarea.redraw=self.animstatus
+		self.animstatus=False
 		
 	def openDialog(self,dialog,delete=False,close=False):
 		"""
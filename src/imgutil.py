@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# imgutil.py
+# Image helpers without GTK dependencies
+###############################################################################
+
+# Python imports
+import zlib,struct
+
+# PNG file signature
+PNG_SIGNATURE='\x89PNG\r\n\x1a\n'
+
+def pngchunk(kind,data):
+    """
+    Returns a PNG chunk
+    """
+    crc=zlib.crc32(kind+data) & 0xffffffff
+    return struct.pack('>I',len(data))+kind+data+struct.pack('>I',crc)
+
+def encodepng(width,height,rgba,flip=False,level=6):
+    """
+    Encodes width x height RGBA pixels (top row first, or bottom row first
+    if flip, as read from GL) as PNG file data
+    """
+    stride=width*4
+    if len(rgba)!=stride*height:
+        raise ValueError, 'Pixel data size does not match %dx%d RGBA' % (width,height)
+    rows=range(height)
+    if flip:
+        rows.reverse()
+    # Every scanline is stored with filter type 0 (none)
+    raw=''.join(['\0'+rgba[row*stride:(row+1)*stride] for row in rows])
+    header=struct.pack('>IIBBBBB',width,height,8,6,0,0,0)
+    return (PNG_SIGNATURE+pngchunk('IHDR',header)+pngchunk('IDAT',zlib.compress(raw,level))+
+        pngchunk('IEND',''))
+
+def writepng(filename,width,height,rgba,flip=False,level=6):
+    """
+    Writes RGBA pixels to a PNG file
+    """
+    data=encodepng(width,height,rgba,flip,level)
+    fd=open(filename,'wb')
+    try:
+        fd.write(data)
+    finally:
+        fd.close()
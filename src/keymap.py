@@ -45,4 +45,7 @@ keycodes={
     'shifttab': 65056,
     'kpadd': 65451,
     'kpminus': 65453,
+    'space': 32,
+    'return': 65293,
+    'kpenter': 65421,
 }
\ No newline at end of file
@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# mesh.py
+# Preview primitive meshes stored in vertex buffer objects
+###############################################################################
+
+# Python imports
+import ctypes
+
+# NumPy imports
+import numpy
+
+# OpenGL imports
+from OpenGL.GL import *
+
+# Interleaved vertex layout: position (3), normal (3), texture coords (2)
+VERTEX_COMPONENTS=8
+VERTEX_STRIDE=VERTEX_COMPONENTS*4
+NORMAL_OFFSET=ctypes.c_void_p(3*4)
+TEXCOORD_OFFSET=ctypes.c_void_p(6*4)
+
+# Default tessellation level (slices/stacks of curved primitives)
+DEFAULT_TESSELLATION=32
+
+###############################################################################
+# Geometry generation
+###############################################################################
+
+def grid(surface,nu,nv):
+    """
+    Evaluates a parametric surface on a (nu+1)x(nv+1) grid. surface receives
+    u,v arrays in [0,1] and returns position and normal arrays. Returns
+    interleaved vertex array and triangle index array
+    """
+    v,u=numpy.mgrid[0:nv+1,0:nu+1]
+    u=u/float(nu)
+    v=v/float(nv)
+    position,normal=surface(u,v)
+    vertices=numpy.empty((nv+1,nu+1,VERTEX_COMPONENTS),dtype=numpy.float32)
+    vertices[...,0:3]=position
+    vertices[...,3:6]=normal
+    vertices[...,6]=u
+    vertices[...,7]=v
+    # Two counter-clockwise triangles per grid cell
+    index=numpy.arange((nu+1)*(nv+1),dtype=numpy.uint32).reshape(nv+1,nu+1)
+    a=index[:-1,:-1]
+    b=index[:-1,1:]
+    c=index[1:,1:]
+    d=index[1:,:-1]
+    indices=numpy.dstack((a,b,c,a,c,d)).reshape(-1)
+    return vertices.reshape(-1,VERTEX_COMPONENTS),indices
+
+def merge(parts):
+    """
+    Joins several (vertices,indices) parts into a single one
+    """
+    vertices=[]
+    indices=[]
+    base=0
+    for partvertices,partindices in parts:
+        vertices.append(partvertices)
+        indices.append(partindices+base)
+        base+=len(partvertices)
+    return numpy.concatenate(vertices),numpy.concatenate(indices).astype(numpy.uint32)
+
+def plane(tessellation=DEFAULT_TESSELLATION,size=3.0):
+    """
+    Plane on XY facing +Z
+    """
+    half=size/2.0
+    def surface(u,v):
+        position=numpy.dstack(((u*2-1)*half,(v*2-1)*half,numpy.zeros_like(u)))
+        normal=numpy.zeros_like(position)
+        normal[...,2]=1
+        return position,normal
+    return grid(surface,tessellation,tessellation)
+
+def cube(tessellation=DEFAULT_TESSELLATION,size=2.0):
+    """
+    Cube centered at origin, each face mapped to full texture
+    """
+    half=size/2.0
+    divisions=max(1,tessellation/8)
+    # (normal, tangent, bitangent) with tangent x bitangent = normal
+    faces=[
+        ((1,0,0),(0,1,0),(0,0,1)),
+        ((-1,0,0),(0,0,1),(0,1,0)),
+        ((0,1,0),(0,0,1),(1,0,0)),
+        ((0,-1,0),(1,0,0),(0,0,1)),
+        ((0,0,1),(1,0,0),(0,1,0)),
+        ((0,0,-1),(0,1,0),(1,0,0)),
+    ]
+    parts=[]
+    for n,t,b in faces:
+        n=numpy.array(n,dtype=numpy.float32)
+        t=numpy.array(t,dtype=numpy.float32)
+        b=numpy.array(b,dtype=numpy.float32)
+        def surface(u,v,n=n,t=t,b=b):
+            position=(n+(u*2-1)[...,None]*t+(v*2-1)[...,None]*b)*half
+            normal=numpy.empty_like(position)
+            normal[...]=n
+            return position,normal
+        parts.append(grid(surface,divisions,divisions))
+    return merge(parts)
+
+def sphere(tessellation=DEFAULT_TESSELLATION,radius=2.0):
+    """
+    Sphere around Z axis, longitude/latitude texture mapping
+    """
+    def surface(u,v):
+        theta=u*2*numpy.pi
+        phi=(v-0.5)*numpy.pi
+        normal=numpy.dstack((numpy.cos(phi)*numpy.cos(theta),numpy.cos(phi)*numpy.sin(theta),numpy.sin(phi)))
+        return normal*radius,normal
+    return grid(surface,tessellation,tessellation)
+
+def torus(tessellation=DEFAULT_TESSELLATION,inner=0.35,outer=1.0):
+    """
+    Torus around Z axis, texture wrapped along ring and tube
+    """
+    def surface(u,v):
+        theta=u*2*numpy.pi
+        phi=v*2*numpy.pi
+        normal=numpy.dstack((numpy.cos(phi)*numpy.cos(theta),numpy.cos(phi)*numpy.sin(theta),numpy.sin(phi)))
+        ring=numpy.dstack((numpy.cos(theta),numpy.sin(theta),numpy.zeros_like(theta)))
+        return ring*outer+normal*inner,normal
+    return grid(surface,tessellation,tessellation)
+
+###############################################################################
+# GPU meshes
+###############################################################################
+
+class Mesh:
+    """
+    Indexed triangle mesh stored in vertex buffer objects
+    """
+
+    def __init__(self,vertices,indices):
+        """
+        Uploads vertex and index arrays to GPU
+        """
+        self.count=len(indices)
+        self.vbo,self.ibo=glGenBuffers(2)
+        glBindBuffer(GL_ARRAY_BUFFER,self.vbo)
+        glBufferData(GL_ARRAY_BUFFER,vertices.nbytes,vertices,GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER,0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER,self.ibo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER,indices.nbytes,indices,GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER,0)
+
+    def draw(self):
+        """
+        Draws the mesh with a single indexed draw call
+        """
+        glBindBuffer(GL_ARRAY_BUFFER,self.vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER,self.ibo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3,GL_FLOAT,VERTEX_STRIDE,None)
+        glNormalPointer(GL_FLOAT,VERTEX_STRIDE,NORMAL_OFFSET)
+        glTexCoordPointer(2,GL_FLOAT,VERTEX_STRIDE,TEXCOORD_OFFSET)
+        glDrawElements(GL_TRIANGLES,self.count,GL_UNSIGNED_INT,None)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER,0)
+        glBindBuffer(GL_ARRAY_BUFFER,0)
+
+    def delete(self):
+        """
+        Releases GPU buffers
+        """
+        glDeleteBuffers(2,[self.vbo,self.ibo])
+
+class MeshBatch(Mesh):
+    """
+    Several primitives in shared vertex and index buffers. Buffers and
+    vertex pointers are set once and each primitive is drawn from its
+    range of the index buffer
+    """
+
+    def __init__(self,parts):
+        """
+        Uploads parts, a list of (name, vertices, indices)
+        """
+        self.ranges={}
+        offset=0
+        for name,vertices,indices in parts:
+            self.ranges[name]=(ctypes.c_void_p(offset*4),len(indices))
+            offset+=len(indices)
+        Mesh.__init__(self,*merge([(vertices,indices) for name,vertices,indices in parts]))
+
+    def bind(self):
+        """
+        Binds buffers and sets vertex pointers
+        """
+        glBindBuffer(GL_ARRAY_BUFFER,self.vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER,self.ibo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3,GL_FLOAT,VERTEX_STRIDE,None)
+        glNormalPointer(GL_FLOAT,VERTEX_STRIDE,NORMAL_OFFSET)
+        glTexCoordPointer(2,GL_FLOAT,VERTEX_STRIDE,TEXCOORD_OFFSET)
+
+    def drawrange(self,name):
+        """
+        Draws primitive name, buffers must be bound
+        """
+        offset,count=self.ranges[name]
+        glDrawElements(GL_TRIANGLES,count,GL_UNSIGNED_INT,offset)
+
+    def unbind(self):
+        """
+        Restores vertex array state
+        """
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER,0)
+        glBindBuffer(GL_ARRAY_BUFFER,0)
+
+    def draw(self):
+        """
+        Draws every primitive
+        """
+        self.bind()
+        glDrawElements(GL_TRIANGLES,self.count,GL_UNSIGNED_INT,None)
+        self.unbind()
+
+# GLUT initialization status (it can only be initialized once)
+_glutinit=False
+
+def initglut():
+    """
+    Initializes GLUT on first use
+    """
+    global _glutinit
+    if not _glutinit:
+        from OpenGL.GLUT import glutInit
+        glutInit()
+        _glutinit=True
+
+class DisplayListMesh:
+    """
+    Primitive recorded once into a display list (GLUT teapot has no
+    parametric generator)
+    """
+
+    def __init__(self,function,*args):
+        """
+        Records function call into a display list
+        """
+        self.list=glGenLists(1)
+        glNewList(self.list,GL_COMPILE)
+        function(*args)
+        glEndList()
+
+    def draw(self):
+        """
+        Draws the recorded primitive
+        """
+        glCallList(self.list)
+
+    def delete(self):
+        """
+        Releases display list
+        """
+        glDeleteLists(self.list,1)
+
+# Preview primitive generators by name
+PRIMITIVES={
+    'Plano': plane,
+    'Cubo': cube,
+    'Esfera': sphere,
+    'Toroide': torus,
+}
+
+class MeshCache:
+    """
+    Generates and uploads each preview primitive once per tessellation level
+    """
+
+    def __init__(self,tessellation=DEFAULT_TESSELLATION):
+        """
+        Class initialization
+        """
+        self.tessellation=tessellation
+        self.meshes={}
+        self.stale=[]
+
+    def get(self,name):
+        """
+        Returns GPU mesh for primitive name
+        """
+        if self.stale:
+            for mesh in self.stale:
+                mesh.delete()
+            self.stale=[]
+        key=(name,self.tessellation)
+        mesh=self.meshes.get(key)
+        if mesh is None:
+            if name=='Tetera':
+                # GLUT is only loaded when the teapot is needed (it is not
+                # available on windowless platforms)
+                initglut()
+                from OpenGL.GLUT import glutSolidTeapot
+                mesh=DisplayListMesh(glutSolidTeapot,1.0)
+            else:
+                mesh=Mesh(*PRIMITIVES[name](self.tessellation))
+            self.meshes[key]=mesh
+        return mesh
+
+    def draw(self,name):
+        """
+        Draws primitive name
+        """
+        self.get(name).draw()
+
+    def batch(self,names):
+        """
+        Returns shared buffers holding the parametric primitives in names
+        """
+        names=tuple([name for name in names if name in PRIMITIVES])
+        key=(names,self.tessellation)
+        batch=self.meshes.get(key)
+        if batch is None:
+            batch=MeshBatch([(name,)+PRIMITIVES[name](self.tessellation) for name in names])
+            self.meshes[key]=batch
+        return batch
+
+    def settessellation(self,tessellation):
+        """
+        Changes tessellation level. Meshes of the previous level are
+        released on next use (no GL context is needed here)
+        """
+        if tessellation!=self.tessellation:
+            self.tessellation=tessellation
+            self.stale.extend(self.meshes.values())
+            self.meshes.clear()
+
+    def clear(self):
+        """
+        Releases every GPU mesh
+        """
+        self.stale.extend(self.meshes.values())
+        self.meshes.clear()
+        for mesh in self.stale:
+            mesh.delete()
+        self.stale=[]
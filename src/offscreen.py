@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# offscreen.py
+# Windowless OpenGL contexts (EGL or OSMesa) for command line tools
+#
+# PyOpenGL picks its platform on first import of OpenGL.GL, so select()
+# must be called before any other application module using OpenGL is
+# imported.
+###############################################################################
+
+# Python imports
+import os
+from ctypes import pointer
+
+# Supported backends
+BACKENDS=('egl','osmesa')
+
+def select(backend=None):
+    """
+    Selects PyOpenGL platform for backend (defaults to PYOPENGL_PLATFORM
+    environment variable or EGL)
+    """
+    if backend is None:
+        backend=os.environ.get('PYOPENGL_PLATFORM','egl')
+    if backend not in BACKENDS:
+        raise ValueError, 'Unknown offscreen backend %s' % backend
+    os.environ['PYOPENGL_PLATFORM']=backend
+    if backend=='egl' and not os.environ.get('DISPLAY'):
+        # Let Mesa create a display without any window system
+        os.environ.setdefault('EGL_PLATFORM','surfaceless')
+    return backend
+
+class OffscreenContext:
+    """
+    OpenGL compatibility context without window, made current on creation
+    """
+
+    def __init__(self,width=256,height=256,backend=None):
+        """
+        Creates context using backend
+        """
+        self.backend=select(backend)
+        self.width=width
+        self.height=height
+        if self.backend=='egl':
+            self.__createegl()
+        else:
+            self.__createosmesa()
+
+    def __createegl(self):
+        """
+        EGL pbuffer context with desktop OpenGL API
+        """
+        from OpenGL import EGL
+        self.egl=EGL
+        self.display=EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major,minor=EGL.EGLint(),EGL.EGLint()
+        if not EGL.eglInitialize(self.display,pointer(major),pointer(minor)):
+            raise ValueError, 'Unable to initialize EGL display'
+        attributes=(EGL.EGLint * 13)(
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24, EGL.EGL_NONE)
+        config=EGL.EGLConfig()
+        count=EGL.EGLint()
+        if not EGL.eglChooseConfig(self.display,attributes,pointer(config),1,pointer(count)) or not count.value:
+            raise ValueError, 'No suitable EGL configuration'
+        surfaceattributes=(EGL.EGLint * 5)(EGL.EGL_WIDTH,self.width,EGL.EGL_HEIGHT,self.height,EGL.EGL_NONE)
+        self.surface=EGL.eglCreatePbufferSurface(self.display,config,surfaceattributes)
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        self.context=EGL.eglCreateContext(self.display,config,EGL.EGL_NO_CONTEXT,None)
+        if not self.context:
+            raise ValueError, 'Unable to create EGL context'
+        self.makecurrent()
+
+    def __createosmesa(self):
+        """
+        OSMesa context rendering to a client memory buffer
+        """
+        from OpenGL import osmesa,arrays
+        from OpenGL.GL import GL_UNSIGNED_BYTE
+        self.osmesa=osmesa
+        self.context=osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA,24,0,0,None)
+        if not self.context:
+            raise ValueError, 'Unable to create OSMesa context'
+        self.buffer=arrays.GLubyteArray.zeros((self.height,self.width,4))
+        self.buffertype=GL_UNSIGNED_BYTE
+        self.makecurrent()
+
+    def makecurrent(self):
+        """
+        Makes this context current in calling thread
+        """
+        if self.backend=='egl':
+            if not self.egl.eglMakeCurrent(self.display,self.surface,self.surface,self.context):
+                raise ValueError, 'Unable to make EGL context current'
+        else:
+            if not self.osmesa.OSMesaMakeCurrent(self.context,self.buffer,self.buffertype,self.width,self.height):
+                raise ValueError, 'Unable to make OSMesa context current'
+
+    def destroy(self):
+        """
+        Releases context
+        """
+        if self.backend=='egl':
+            EGL=self.egl
+            EGL.eglMakeCurrent(self.display,EGL.EGL_NO_SURFACE,EGL.EGL_NO_SURFACE,EGL.EGL_NO_CONTEXT)
+            EGL.eglDestroySurface(self.display,self.surface)
+            EGL.eglDestroyContext(self.display,self.context)
+            EGL.eglTerminate(self.display)
+        else:
+            self.osmesa.OSMesaDestroyContext(self.context)
+        self.context=None
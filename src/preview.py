@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# preview.py
+# Shader preview scene rendering (shared by GTK widget and offscreen tools)
+###############################################################################
+
+# Python imports
+import time,math
+
+# OpenGL imports
+from OpenGL.GL import *
+from OpenGL.GLU import *
+
+# Application imports
+import mesh
+import gputimer
+import texmanager
+import uniforms
+import glstate
+import profiler
+
+# Preview primitives in display order
+PRIMITIVES=['Plano','Cubo','Esfera','Toroide','Tetera']
+# Grid mode: every primitive side by side in one frame
+GRID='Todas'
+
+# Preview lights: (light, ambient, diffuse, specular, position)
+LIGHTS=[
+    (GL_LIGHT0,(0,0,0,1),(0.5,0.5,0.5,0),(1,0,0,1),(2,1,0,1)),
+    (GL_LIGHT1,(0,0,0,1),(0,0,0,1),(0,1,0,1),(-2,1,0,1)),
+    (GL_LIGHT2,(0,0,0,1),(0,0,0,1),(0,0,1,1),(0,1,1,1)),
+]
+
+# Preview material parameters
+MATERIAL=[
+    (GL_AMBIENT,(0,0,0,1)),
+    (GL_DIFFUSE,(0.5,0.5,0.5,0)),
+    (GL_SPECULAR,(1,1,1,1)),
+    (GL_SHININESS,(20,)),
+]
+
+class PreviewRenderer:
+    """
+    Draws a shader program applied to a lit, rotated preview primitive in
+    the current GL context
+    """
+
+    def __init__(self,primitive='Plano'):
+        """
+        Class initialization
+        """
+        self.primitive=primitive
+        # Primitives drawn in grid mode
+        self.gridprimitives=list(PRIMITIVES)
+        self.angle=0
+        self.program=0
+        self.uniformset=None
+        # Uniform values fed to every program
+        self.uniforms=uniforms.UniformValues()
+        self.start=time.time()
+        # Animation time (ms) fed to shaders, time since start if None
+        self.time=None
+        self.width=1
+        self.height=1
+        # Primitive tessellation level (kept until the mesh cache exists)
+        self.tessellation=mesh.DEFAULT_TESSELLATION
+        # GL resources (created by initgl)
+        self.meshes=None
+        self.gputimer=None
+        # Project textures (uploaded on first use)
+        self.textures=texmanager.TextureManager()
+        # Known GL state, redundant changes are skipped
+        self.state=glstate.GLState()
+
+    def initgl(self):
+        """
+        OpenGL state initialization, context must be current
+        """
+        self.state.invalidate()
+        self.state.enable(GL_DEPTH_TEST)
+        self.state.enable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glLightModeli(GL_LIGHT_MODEL_TWO_SIDE,GL_TRUE)
+        self.state.enable(GL_COLOR_MATERIAL)
+        self.meshes=mesh.MeshCache(self.tessellation)
+        self.gputimer=gputimer.GPUTimer()
+
+    def setprogram(self,program,uniformset=None):
+        """
+        Sets shader program and its active uniforms (queried if not given),
+        context must be current
+        """
+        if program and uniformset is None:
+            uniformset=uniforms.UniformSet(program)
+        self.program=program or 0
+        self.uniformset=uniformset
+
+    def settessellation(self,tessellation):
+        """
+        Sets primitive tessellation level (no GL context is needed)
+        """
+        self.tessellation=tessellation
+        if self.meshes is not None:
+            self.meshes.settessellation(tessellation)
+
+    def resize(self,width,height):
+        """
+        Sets viewport and projection for a width x height target
+        """
+        self.width=width
+        self.height=height
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        gluPerspective(90.0, width/float(max(height,1)), 1.0, 100.0)
+        glMatrixMode(GL_MODELVIEW)
+        glViewport(0, 0, width, height)
+        gluLookAt(0.0,0.0,0.5, 0.0,0.0,0.0, 0.0, 1.0, 0.0)
+
+    def viewport(self,width,height):
+        """
+        Changes render size keeping the projection (for targets scaled
+        from the resize size)
+        """
+        self.width=width
+        self.height=height
+        glViewport(0, 0, width, height)
+
+    def render(self):
+        """
+        Draws a preview frame
+        """
+        self.gputimer.beginframe()
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glLoadIdentity()
+        with profiler.span('setlights'):
+            self.setlights()
+        glTranslate(0.0, 0.0, -3.0)
+        glRotate(self.angle, 1.0, 1.0, 1.0)
+        # Select shader (it is kept current between frames)
+        with profiler.span('uniforms'):
+            self.state.useprogram(self.program)
+            self.textures.bind(self.uniforms,self.uniformset)
+            self.uniforms.set(uniforms.TIME_FROM_INIT,self.animationtime())
+            if self.uniformset:
+                self.uniformset.flush(self.uniforms)
+        # Draw current primitive
+        with profiler.span('drawprimitive'):
+            self.gputimer.begindraw(self.primitive)
+            self.drawprimitive()
+            self.gputimer.enddraw()
+        self.gputimer.endframe()
+
+    def animationtime(self):
+        """
+        Returns animation time in milliseconds
+        """
+        if self.time is not None:
+            return int(self.time)
+        return int((time.time()-self.start)*1000)
+
+    def setlights(self):
+        """
+        Set lighting parameters (the modelview matrix must be the identity,
+        light positions are given in eye coordinates)
+        """
+        for light,ambient,diffuse,specular,position in LIGHTS:
+            self.state.light(light,GL_AMBIENT,ambient)
+            self.state.light(light,GL_DIFFUSE,diffuse)
+            self.state.light(light,GL_SPECULAR,specular)
+            self.state.light(light,GL_POSITION,position)
+        for pname,values in MATERIAL:
+            self.state.material(GL_FRONT_AND_BACK,pname,values)
+        self.state.enable(GL_LIGHT0)
+        self.state.enable(GL_LIGHT1)
+        self.state.enable(GL_LIGHTING)
+
+    def drawprimitive(self):
+        """
+        Draws current primitive from its GPU mesh
+        """
+        if self.primitive==GRID:
+            self.drawgrid()
+        else:
+            self.meshes.draw(self.primitive)
+
+    def drawgrid(self):
+        """
+        Draws every grid primitive in its own viewport tile. Parametric
+        primitives share buffers bound once for all tiles
+        """
+        names=self.gridprimitives
+        columns=int(math.ceil(math.sqrt(len(names))))
+        rows=int(math.ceil(len(names)/float(columns)))
+        width=self.width/columns
+        height=self.height/rows
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        gluPerspective(90.0, width/float(max(height,1)), 1.0, 100.0)
+        glMatrixMode(GL_MODELVIEW)
+        tiles=[((index%columns)*width,self.height-(index/columns+1)*height,name)
+            for index,name in enumerate(names)]
+        batch=self.meshes.batch(names)
+        batch.bind()
+        for x,y,name in tiles:
+            if name in batch.ranges:
+                glViewport(x,y,width,height)
+                batch.drawrange(name)
+        batch.unbind()
+        for x,y,name in tiles:
+            if name not in batch.ranges:
+                glViewport(x,y,width,height)
+                self.meshes.draw(name)
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        glViewport(0, 0, self.width, self.height)
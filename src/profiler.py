@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# profiler.py
+# Frame and compilation profiler with Chrome trace event export
+###############################################################################
+
+# Python imports
+import os,time,json,threading
+from collections import deque
+
+# Maximum number of recorded events (older ones are dropped)
+DEFAULT_MAX_EVENTS=200000
+
+# Trace viewer thread id used for GPU spans
+GPU_THREAD=0
+
+class NullSpan:
+    """
+    Span returned while profiling is disabled
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        return False
+
+NULL_SPAN=NullSpan()
+
+class Span:
+    """
+    Python side span, recorded when leaving the with block
+    """
+
+    def __init__(self,profiler,name,category):
+        """
+        Class initialization
+        """
+        self.profiler=profiler
+        self.name=name
+        self.category=category
+        self.start=0.0
+
+    def __enter__(self):
+        self.start=time.time()
+        return self
+
+    def __exit__(self,*args):
+        end=time.time()
+        self.profiler.record(self.name,self.category,self.start,end)
+        return False
+
+class Profiler:
+    """
+    Records Python spans (with blocks around instrumented code) and GPU
+    spans (timer query results) while enabled. Disabled profiling only
+    costs a flag check per span
+    """
+
+    def __init__(self,maxevents=DEFAULT_MAX_EVENTS):
+        """
+        Class initialization
+        """
+        self.enabled=False
+        self.events=deque(maxlen=maxevents)
+        self.threads={}
+        # GPU clock to wall clock offset (seconds), set by calibrate
+        self.gpuoffset=None
+
+    def enable(self,status=True):
+        """
+        Starts or stops recording
+        """
+        self.enabled=status
+        if status:
+            # GPU clock is calibrated again on next GPU results
+            self.gpuoffset=None
+
+    def span(self,name,category='render'):
+        """
+        Returns a context manager recording a span named name
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self,name,category)
+
+    def record(self,name,category,start,end,thread=None):
+        """
+        Records a complete span from start to end (seconds)
+        """
+        if thread is None:
+            thread=threading.currentThread()
+            if thread.ident not in self.threads:
+                self.threads[thread.ident]=thread.getName()
+            thread=thread.ident
+        self.events.append((name,category,start,end-start,thread))
+
+    def calibrate(self,gputime):
+        """
+        Sets GPU clock offset from a GPU timestamp (nanoseconds) taken now
+        """
+        self.gpuoffset=time.time()-gputime/1e9
+
+    def gpuspan(self,name,begin,end):
+        """
+        Records a GPU span from GPU timestamps (nanoseconds)
+        """
+        if self.gpuoffset is None:
+            return
+        start=begin/1e9+self.gpuoffset
+        self.record(name,'gpu',start,start+(end-begin)/1e9,GPU_THREAD)
+
+    def clear(self):
+        """
+        Discards recorded events
+        """
+        self.events.clear()
+
+    def summary(self):
+        """
+        Returns total time and count of each span name (milliseconds)
+        """
+        totals={}
+        for name,category,start,duration,thread in self.events:
+            total,count=totals.get(name,(0.0,0))
+            totals[name]=(total+duration*1000.0,count+1)
+        return totals
+
+    def trace(self):
+        """
+        Returns recorded events in Chrome trace event format
+        """
+        pid=os.getpid()
+        events=[]
+        names=[(GPU_THREAD,'GPU')]+sorted(self.threads.items())
+        for thread,name in names:
+            events.append({'name': 'thread_name','ph': 'M','pid': pid,'tid': thread,
+                'args': {'name': name}})
+        for name,category,start,duration,thread in self.events:
+            events.append({'name': name,'cat': category,'ph': 'X','pid': pid,'tid': thread,
+                'ts': start*1e6,'dur': duration*1e6})
+        return {'traceEvents': events,'displayTimeUnit': 'ms'}
+
+    def export(self,filename):
+        """
+        Writes recorded events to a Chrome trace JSON file
+        """
+        fd=open(filename,'w')
+        try:
+            json.dump(self.trace(),fd)
+        finally:
+            fd.close()
+
+# Process wide profiler used by instrumented modules
+PROFILER=Profiler()
+span=PROFILER.span
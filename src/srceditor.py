@@ -31,6 +31,7 @@ import gtksourceview2 as gtksourceview
 
 # Application imports
 import keymap
+import symindex
 
 class SRCEditor:
     
@@ -55,6 +56,20 @@ class SRCEditor:
         self.srcview.connect('key_press_event',self.enhanceinput)
         self.srcview.connect('scroll_event',self.zoomeditor)
         self.srcview.connect('event', self.updatestatus)
+        # Diagnostic marks (messages by line shown as tooltips)
+        self.sbuffer.create_tag('error',underline=pango.UNDERLINE_ERROR,background='#FFE0E0')
+        self.sbuffer.create_tag('warning',underline=pango.UNDERLINE_SINGLE,background='#FFF5D0')
+        self.diagnostics={}
+        self.srcview.set_property('has-tooltip',True)
+        self.srcview.connect('query-tooltip',self.diagnostictooltip)
+        # Symbol index, updated with the lines touched by each edit
+        self.symbols=symindex.SymbolIndex()
+        self.peers=[]
+        self.deleting=None
+        self.sbuffer.connect_after('insert-text',self.indexinsert)
+        self.sbuffer.connect('delete-range',self.indexdeletebegin)
+        self.sbuffer.connect_after('delete-range',self.indexdelete)
+        self.completion=None
         # Editor label
         self.label=gtk.Label(labeltext)
         self.label.set_padding(5,0)
@@ -120,6 +135,13 @@ class SRCEditor:
         """
         Enhanced input callback
         """
+        # Completion popup navigation
+        if self.completion and self.completion.get_property('visible'):
+            if self.completioninput(event):
+                return True
+        if event.keyval==keymap.keycodes['space'] and event.state & gtk.gdk.CONTROL_MASK:
+            self.complete()
+            return True
         # Selection tabbing
         if event.keyval==keymap.keycodes['tab']:
             self.indent()
@@ -130,6 +152,162 @@ class SRCEditor:
         # Event propagation
         return False
 
+    def linetexts(self,start,end):
+        """
+        Returns text of lines from start to end (0 based, inclusive)
+        """
+        texts=[]
+        for line in range(start,end+1):
+            first=self.sbuffer.get_iter_at_line(line)
+            last=first.copy()
+            if not last.ends_line():
+                last.forward_to_line_end()
+            texts.append(first.get_text(last))
+        return texts
+
+    def indexinsert(self,buffer,iter,text,length):
+        """
+        Updates symbol index after text insertion (iter is at its end)
+        """
+        end=iter.get_line()
+        start=end-text.count('\n')
+        self.symbols.update(start,1,self.linetexts(start,end))
+
+    def indexdeletebegin(self,buffer,start,end):
+        """
+        Keeps lines of a range about to be deleted
+        """
+        self.deleting=(start.get_line(),end.get_line())
+
+    def indexdelete(self,buffer,start,end):
+        """
+        Updates symbol index after a range deletion
+        """
+        first,last=self.deleting
+        self.symbols.update(first,last-first+1,self.linetexts(first,first))
+
+    def wordbounds(self,iter=None):
+        """
+        Returns start and end iters of the identifier at iter (cursor)
+        """
+        if iter is None:
+            iter=self.getcursorpos()
+        start=iter.copy()
+        end=iter.copy()
+        while not start.starts_line():
+            previous=start.copy()
+            previous.backward_char()
+            if not (previous.get_char().isalnum() or previous.get_char()=='_'):
+                break
+            start=previous
+        while not end.ends_line() and (end.get_char().isalnum() or end.get_char()=='_'):
+            end.forward_char()
+        return start,end
+
+    def definition(self):
+        """
+        Returns (editor, symbol) declaring the identifier at cursor, looking
+        in peer editors for global declarations
+        """
+        start,end=self.wordbounds()
+        name=start.get_text(end)
+        if not name:
+            return None,None
+        symbol=self.symbols.definition(name,start.get_line()+1)
+        if symbol:
+            return self,symbol
+        for peer in self.peers:
+            symbol=peer.symbols.definition(name)
+            if symbol and symbol.kind in symindex.SHARED_KINDS:
+                return peer,symbol
+        return None,None
+
+    def gotosymbol(self,symbol):
+        """
+        Places cursor at a symbol declaration
+        """
+        iter=self.sbuffer.get_iter_at_line(symbol.number()-1)
+        if symbol.column-1<iter.get_chars_in_line():
+            iter.set_line_offset(symbol.column-1)
+        self.sbuffer.place_cursor(iter)
+        self.srcview.scroll_to_iter(iter,0.4)
+        self.srcview.grab_focus()
+
+    def complete(self):
+        """
+        Completes the identifier before the cursor with declared names of
+        this and peer editors
+        """
+        cursor=self.getcursorpos()
+        start,end=self.wordbounds(cursor)
+        prefix=start.get_text(cursor)
+        names=set(self.symbols.complete(prefix))
+        for peer in self.peers:
+            names.update(peer.symbols.complete(prefix,symindex.SHARED_KINDS))
+        names.discard(prefix)
+        names=sorted(names)
+        if not names:
+            return
+        if len(names)==1:
+            self.sbuffer.insert_at_cursor(names[0][len(prefix):])
+            return
+        self.showcompletion(names,prefix,cursor)
+
+    def showcompletion(self,names,prefix,cursor):
+        """
+        Shows completion popup below cursor
+        """
+        if not self.completion:
+            self.completionlist=gtk.ListStore(str)
+            self.completionview=gtk.TreeView(self.completionlist)
+            self.completionview.set_headers_visible(False)
+            self.completionview.append_column(gtk.TreeViewColumn('',gtk.CellRendererText(),text=0))
+            self.completionview.connect('row-activated',lambda view,path,column: self.insertcompletion())
+            scroll=gtk.ScrolledWindow()
+            scroll.set_policy(gtk.POLICY_NEVER,gtk.POLICY_AUTOMATIC)
+            scroll.set_size_request(220,150)
+            scroll.add(self.completionview)
+            self.completion=gtk.Window(gtk.WINDOW_POPUP)
+            self.completion.add(scroll)
+        self.completionprefix=prefix
+        self.completionlist.clear()
+        for name in names:
+            self.completionlist.append([name])
+        self.completionview.set_cursor((0,))
+        rect=self.srcview.get_iter_location(cursor)
+        x,y=self.srcview.buffer_to_window_coords(gtk.TEXT_WINDOW_TEXT,rect.x,rect.y+rect.height)
+        originx,originy=self.srcview.get_window(gtk.TEXT_WINDOW_TEXT).get_origin()
+        self.completion.move(originx+x,originy+y)
+        self.completion.show_all()
+
+    def completioninput(self,event):
+        """
+        Completion popup keyboard handling, returns if key was used
+        """
+        if event.keyval in (keymap.keycodes['up'],keymap.keycodes['down']):
+            path,column=self.completionview.get_cursor()
+            row=path and path[0] or 0
+            row+=event.keyval==keymap.keycodes['down'] and 1 or -1
+            if 0<=row<len(self.completionlist):
+                self.completionview.set_cursor((row,))
+            return True
+        if event.keyval in (keymap.keycodes['return'],keymap.keycodes['kpenter'],keymap.keycodes['tab']):
+            self.insertcompletion()
+            return True
+        self.completion.hide()
+        return event.keyval==keymap.keycodes['esc']
+
+    def insertcompletion(self):
+        """
+        Inserts selected completion
+        """
+        path,column=self.completionview.get_cursor()
+        self.completion.hide()
+        if path:
+            name=self.completionlist[path][0]
+            self.sbuffer.insert_at_cursor(name[len(self.completionprefix):])
+        self.srcview.grab_focus()
+
     def getcursorpos(self):
         """
         Returns current cursor position
@@ -251,6 +429,48 @@ class SRCEditor:
         # Event propagation
         return False
 
+    def markdiagnostics(self,diagnostics):
+        """
+        Marks diagnostics (line, column, severity, message) in the source,
+        replacing previous marks
+        """
+        self.clearmarks()
+        lines=self.sbuffer.get_line_count()
+        for diagnostic in diagnostics:
+            if diagnostic.line<1 or diagnostic.line>lines:
+                continue
+            start=self.sbuffer.get_iter_at_line(diagnostic.line-1)
+            end=start.copy()
+            if not end.ends_line():
+                end.forward_to_line_end()
+            if diagnostic.column>1 and diagnostic.column-1<start.get_chars_in_line():
+                start.set_line_offset(diagnostic.column-1)
+            tag=diagnostic.severity=='warning' and 'warning' or 'error'
+            self.sbuffer.apply_tag_by_name(tag,start,end)
+            self.diagnostics.setdefault(diagnostic.line,[]).append(diagnostic.message)
+
+    def clearmarks(self):
+        """
+        Removes diagnostic marks
+        """
+        start,end=self.sbuffer.get_bounds()
+        self.sbuffer.remove_tag_by_name('error',start,end)
+        self.sbuffer.remove_tag_by_name('warning',start,end)
+        self.diagnostics={}
+
+    def diagnostictooltip(self,widget,x,y,keyboard,tooltip):
+        """
+        Shows diagnostic messages of the line under the pointer
+        """
+        if not self.diagnostics:
+            return False
+        x,y=self.srcview.window_to_buffer_coords(gtk.TEXT_WINDOW_TEXT,x,y)
+        line=self.srcview.get_iter_at_location(x,y).get_line()+1
+        if line not in self.diagnostics:
+            return False
+        tooltip.set_text('\n'.join(self.diagnostics[line]))
+        return True
+
     def linenums(self,status):
         """
         Shows/Hides line numbers
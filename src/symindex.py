@@ -0,0 +1,616 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# symindex.py
+# Incremental GLSL symbol index
+###############################################################################
+
+# Python imports
+import bisect
+
+# Application imports
+import glslcheck
+
+# Words that never start a declaration
+KEYWORDS=set(['if','else','for','while','do','return','break','continue','discard','switch','case',
+    'default','struct','precision','true','false','layout'])
+
+# Symbol kinds by declaration qualifier
+QUALIFIER_KINDS={
+    'uniform': 'uniform',
+    'varying': 'varying',
+    'attribute': 'attribute',
+    'in': 'in',
+    'out': 'out',
+    'const': 'const',
+}
+
+# Kinds visible from other stages
+SHARED_KINDS=set(['uniform','varying','function','struct','macro'])
+
+# Lines per chunk of the line list (edits renumber chunks, not lines)
+CHUNK_SIZE=64
+
+class Symbol:
+    """
+    Declared name at a column of a source line
+    """
+
+    def __init__(self,name,kind,type,line,column):
+        """
+        Class initialization
+        """
+        self.name=name
+        self.kind=kind
+        self.type=type
+        self.line=line
+        self.column=column
+
+    def number(self):
+        """
+        Returns 1 based line number of the declaration
+        """
+        return self.line.number+1
+
+    def __repr__(self):
+        """
+        Symbol representation
+        """
+        return 'Symbol(%r,%r,%r,%d,%d)' % (self.name,self.kind,self.type,self.number(),self.column)
+
+class Line:
+    """
+    Indexed source line: text, lexer states, declarations, uses and braces
+    """
+
+    def __init__(self,text,state):
+        """
+        Class initialization, lexes and scans text
+        """
+        self.text=text
+        self.state=state
+        tokens,problems,self.endstate=glslcheck.lexline(text,state)
+        # Chunk of the line list holding the line and position in it
+        self.chunk=None
+        self.offset=0
+        # Scope (None until computed)
+        self.depth=None
+        self.block=None
+        self.enddepth=0
+        self.endblock=None
+        self.symbols=[]
+        self.uses=[]
+        self.braces=[token[1] for token in tokens if token[1] in ('{','}')]
+        self.scan(tokens)
+        self.header=any(symbol.kind=='parameter' for symbol in self.symbols)
+
+    def __getnumber(self):
+        """
+        Returns 0 based line number (chunk starts must be current)
+        """
+        return self.chunk.start+self.offset
+
+    number=property(__getnumber)
+
+    def sameshape(self,other):
+        """
+        Checks if line has the same scope structure as other
+        """
+        return self.braces==other.braces and self.header==other.header and self.endstate==other.endstate
+
+    def scan(self,tokens):
+        """
+        Finds declarations and identifier uses in line tokens
+        """
+        if tokens and tokens[0][1]=='#':
+            if len(tokens)>2 and tokens[1][1]=='define' and tokens[2][0]==glslcheck.IDENTIFIER:
+                self.symbols.append(Symbol(tokens[2][1],'macro',None,self,tokens[2][2]))
+            return
+        declared=set()
+        position=0
+        count=len(tokens)
+        while position<count:
+            start=position
+            kind=None
+            # Qualifiers (layout parameters skipped)
+            while position<count and (tokens[position][1] in glslcheck.QUALIFIERS or tokens[position][1]=='layout'):
+                if tokens[position][1] in QUALIFIER_KINDS:
+                    kind=QUALIFIER_KINDS[tokens[position][1]]
+                if tokens[position][1]=='layout':
+                    position=skipgroup(tokens,position+1)
+                else:
+                    position+=1
+            if position+1<count and tokens[position][1]=='struct' and tokens[position+1][0]==glslcheck.IDENTIFIER:
+                self.symbols.append(Symbol(tokens[position+1][1],'struct',None,self,tokens[position+1][2]))
+                declared.add(position+1)
+                position+=2
+                continue
+            if isdeclaration(tokens,position):
+                type=tokens[position][1]
+                position+=1
+                position=skiparray(tokens,position)
+                name=tokens[position]
+                declared.add(position)
+                position+=1
+                if position<count and tokens[position][1]=='(':
+                    self.symbols.append(Symbol(name[1],'function',type,self,name[2]))
+                    position=self.parameters(tokens,position+1,declared)
+                    continue
+                self.symbols.append(Symbol(name[1],kind or 'variable',type,self,name[2]))
+                # Further declarators of the same statement
+                while position<count and tokens[position][1]!=';':
+                    if tokens[position][1]==',' and position+1<count and tokens[position+1][0]==glslcheck.IDENTIFIER:
+                        name=tokens[position+1]
+                        declared.add(position+1)
+                        self.symbols.append(Symbol(name[1],kind or 'variable',type,self,name[2]))
+                        position+=2
+                    elif tokens[position][1] in ('(','['):
+                        position=skipgroup(tokens,position)
+                    else:
+                        position+=1
+                continue
+            if position==start:
+                position+=1
+        # Uses: identifiers not declared here, keywords, types or fields
+        for index,token in enumerate(tokens):
+            if token[0]!=glslcheck.IDENTIFIER or index in declared:
+                continue
+            if token[1] in KEYWORDS or token[1] in glslcheck.QUALIFIERS or glslcheck.TYPE_RE.match(token[1]):
+                continue
+            if index and tokens[index-1][1]=='.':
+                continue
+            self.uses.append((token[1],token[2]))
+
+    def parameters(self,tokens,position,declared):
+        """
+        Adds function parameters, returns position after the parameter list
+        """
+        count=len(tokens)
+        while position<count and tokens[position][1]!=')':
+            while position<count and tokens[position][1] in glslcheck.QUALIFIERS:
+                position+=1
+            if isdeclaration(tokens,position):
+                type=tokens[position][1]
+                position=skiparray(tokens,position+1)
+                declared.add(position)
+                self.symbols.append(Symbol(tokens[position][1],'parameter',type,self,tokens[position][2]))
+            while position<count and tokens[position][1] not in (',',')'):
+                position+=1
+            if position<count and tokens[position][1]==',':
+                position+=1
+        return position+1
+
+def skipgroup(tokens,position):
+    """
+    Returns position after a parenthesized or bracketed group
+    """
+    depth=0
+    while position<len(tokens):
+        value=tokens[position][1]
+        position+=1
+        if value in ('(','['):
+            depth+=1
+        elif value in (')',']'):
+            depth-=1
+            if depth<=0:
+                break
+        elif not depth:
+            break
+    return position
+
+def skiparray(tokens,position):
+    """
+    Returns position after optional array sizes
+    """
+    while position<len(tokens) and tokens[position][1]=='[':
+        position=skipgroup(tokens,position)
+    return position
+
+def isdeclaration(tokens,position):
+    """
+    Checks for a 'type name' pair at position
+    """
+    if position>=len(tokens) or tokens[position][0]!=glslcheck.IDENTIFIER:
+        return False
+    type=tokens[position][1]
+    if type in KEYWORDS or type in glslcheck.QUALIFIERS:
+        return False
+    following=skiparray(tokens,position+1)
+    if following>=len(tokens) or tokens[following][0]!=glslcheck.IDENTIFIER:
+        return False
+    name=tokens[following][1]
+    if name in KEYWORDS or name in glslcheck.QUALIFIERS or glslcheck.TYPE_RE.match(name):
+        return False
+    after=following+1
+    return after>=len(tokens) or tokens[after][1] in (';',',','=','[','(',')')
+
+class LineChunk:
+    """
+    Consecutive lines of a LineList
+    """
+
+    def __init__(self,lines):
+        """
+        Class initialization
+        """
+        self.lines=lines
+        self.start=0
+        for offset,line in enumerate(lines):
+            line.chunk=self
+            line.offset=offset
+
+class LineList:
+    """
+    Sequence of lines kept in chunks. Inserting or removing lines only
+    rebuilds the chunks around the edit and the chunk start numbers
+    """
+
+    def __init__(self):
+        """
+        Class initialization
+        """
+        self.chunks=[]
+        self.starts=[]
+        self.count=0
+        self.outdated=False
+
+    def __len__(self):
+        """
+        Returns number of lines
+        """
+        return self.count
+
+    def renumber(self):
+        """
+        Recomputes chunk start numbers after edits
+        """
+        if not self.outdated:
+            return
+        start=0
+        self.starts=[]
+        for chunk in self.chunks:
+            chunk.start=start
+            self.starts.append(start)
+            start+=len(chunk.lines)
+        self.outdated=False
+
+    def locate(self,index):
+        """
+        Returns chunk position holding line index and index in the chunk
+        """
+        self.renumber()
+        position=max(bisect.bisect_right(self.starts,index)-1,0)
+        return position,index-self.starts[position]
+
+    def __getitem__(self,index):
+        """
+        Returns line at index
+        """
+        if index<0:
+            index+=self.count
+        if not 0<=index<self.count:
+            raise IndexError, 'line index out of range'
+        position,offset=self.locate(index)
+        return self.chunks[position].lines[offset]
+
+    def lines(self,start=0,stop=None):
+        """
+        Iterates over lines from start to stop
+        """
+        if stop is None or stop>self.count:
+            stop=self.count
+        if start>=stop:
+            return
+        position,offset=self.locate(start)
+        index=start
+        while index<stop:
+            for line in self.chunks[position].lines[offset:offset+stop-index]:
+                yield line
+                index+=1
+            position+=1
+            offset=0
+
+    def replace(self,start,count,lines):
+        """
+        Replaces count lines from start with lines
+        """
+        if not self.chunks:
+            first=last=0
+            merged=list(lines)
+        else:
+            first,offset=self.locate(min(start,self.count-1))
+            if start==self.count:
+                offset=len(self.chunks[first].lines)
+            last,end=self.locate(min(start+count,self.count)-1) if count else (first,offset)
+            merged=self.chunks[first].lines[:offset]+lines
+            if count:
+                merged.extend(self.chunks[last].lines[end+1:])
+            else:
+                merged.extend(self.chunks[first].lines[offset:])
+            last+=1
+            # Small chunks are merged with the next one
+            if len(merged)<CHUNK_SIZE/2 and last<len(self.chunks):
+                merged.extend(self.chunks[last].lines)
+                last+=1
+        pieces=(len(merged)+CHUNK_SIZE-1)/CHUNK_SIZE
+        self.chunks[first:last]=[LineChunk(merged[len(merged)*piece/pieces:len(merged)*(piece+1)/pieces])
+            for piece in range(pieces)]
+        self.count+=len(lines)-count
+        self.outdated=True
+
+class SymbolIndex:
+    """
+    Symbol index of a shader source, updated by line ranges as the source
+    is edited. Line numbers come from the chunked line list; scopes are
+    recomputed lazily on lookup from the first edited line until they
+    match the scopes computed before
+    """
+
+    def __init__(self,source=''):
+        """
+        Class initialization
+        """
+        self.lines=LineList()
+        self.declarations={}
+        self.uses={}
+        self.names=[]
+        # First line whose scope is outdated and lines without a scope
+        self.dirty=0
+        self.unscoped=0
+        self.update(0,0,source.split('\n'))
+
+    def update(self,start,count,texts):
+        """
+        Replaces count lines from start (0 based) with texts
+        """
+        state=start and self.lines[start-1].endstate or glslcheck.NORMAL
+        removed=list(self.lines.lines(start,start+count))
+        added=[]
+        for text in texts:
+            line=Line(text,state)
+            added.append(line)
+            state=line.endstate
+        self.lines.replace(start,count,added)
+        # Comment state changes propagate to the following lines
+        position=start+len(added)
+        while position<len(self.lines) and self.lines[position].state!=state:
+            removed.append(self.lines[position])
+            line=Line(self.lines[position].text,state)
+            added.append(line)
+            self.lines.replace(position,1,[line])
+            state=line.endstate
+            position+=1
+        if len(removed)==len(added) and all(new.sameshape(old) for new,old in zip(added,removed)):
+            # Edits inside lines keep numbers and scopes
+            for new,old in zip(added,removed):
+                new.depth,new.block,new.enddepth,new.endblock=old.depth,old.block,old.enddepth,old.endblock
+                if old.block is old:
+                    new.block=new
+                if old.endblock is old:
+                    new.endblock=new
+            # Following lines refer to replaced block start lines
+            if any(old.endblock is old for old in removed):
+                self.__outdate(start,position)
+        else:
+            self.__outdate(start,position)
+        for line in removed:
+            self.__unregister(line)
+        for line in added:
+            self.__register(line)
+
+    def __outdate(self,start,end):
+        """
+        Marks scopes from start outdated. The line following the edited
+        lines (end) loses its scope, so it is computed again even if scopes
+        of an earlier edit match before reaching it
+        """
+        self.dirty=min(self.dirty,start)
+        if end<len(self.lines):
+            line=self.lines[end]
+            if line.depth is not None:
+                line.depth=None
+                self.unscoped+=1
+
+    def __register(self,line):
+        """
+        Adds line symbols and uses to lookup tables
+        """
+        if line.depth is None:
+            self.unscoped+=1
+        for symbol in line.symbols:
+            symbols=self.declarations.get(symbol.name)
+            if symbols is None:
+                symbols=self.declarations[symbol.name]=[]
+                bisect.insort(self.names,symbol.name)
+            symbols.append(symbol)
+        for name,column in line.uses:
+            self.uses.setdefault(name,set()).add(line)
+
+    def __unregister(self,line):
+        """
+        Removes line symbols and uses from lookup tables
+        """
+        if line.depth is None:
+            self.unscoped-=1
+        for symbol in line.symbols:
+            symbols=self.declarations[symbol.name]
+            symbols.remove(symbol)
+            if not symbols:
+                del self.declarations[symbol.name]
+                del self.names[bisect.bisect_left(self.names,symbol.name)]
+        for name,column in line.uses:
+            lines=self.uses.get(name)
+            if lines is not None:
+                lines.discard(line)
+                if not lines:
+                    del self.uses[name]
+
+    def __number(self):
+        """
+        Updates chunk start numbers, then brace depths and top level blocks
+        from the first outdated line. Stops at the first line computed
+        before whose scope is unchanged, once every new line has a scope
+        """
+        self.lines.renumber()
+        if self.dirty>=len(self.lines):
+            return
+        start=self.dirty
+        # Function headers since the last top level block opened before
+        # start wait for their body
+        pending=[]
+        if start:
+            previous=self.lines[start-1]
+            depth,block=previous.enddepth,previous.endblock
+            position=start-1
+            while not depth and position>=0:
+                line=self.lines[position]
+                if line.depth or '{' in line.braces:
+                    break
+                if line.header:
+                    pending.append(line)
+                position-=1
+        else:
+            depth,block=0,None
+        for line in self.lines.lines(start):
+            if line.depth is None:
+                self.unscoped-=1
+            elif (not self.unscoped and not pending and line.depth==depth and
+                    (not depth or line.block is block)):
+                # Following scopes are the ones computed before
+                break
+            line.depth=depth
+            line.block=depth and block or None
+            if line.header and not depth:
+                pending.append(line)
+            if line.braces:
+                for brace in line.braces:
+                    if brace=='{':
+                        if not depth:
+                            block=line
+                            # Parameters belong to the function body that follows
+                            for header in pending:
+                                header.block=line
+                            pending=[]
+                        depth+=1
+                    else:
+                        depth=max(depth-1,0)
+                if depth and line.block is None:
+                    line.block=block
+            line.enddepth=depth
+            line.endblock=block
+        self.dirty=len(self.lines)
+
+    def symbols(self,name):
+        """
+        Returns declarations of name
+        """
+        self.__number()
+        return list(self.declarations.get(name,()))
+
+    def scope(self,symbol):
+        """
+        Returns scope of a symbol: global, or the top level block line
+        """
+        if symbol.kind=='parameter':
+            return symbol.line.block
+        if symbol.line.depth:
+            return symbol.line.block
+        return None
+
+    def definition(self,name,line=None):
+        """
+        Returns the declaration of name visible at line (1 based) or the
+        global one when no line is given
+        """
+        self.__number()
+        symbols=self.declarations.get(name)
+        if not symbols:
+            return None
+        found=None
+        if line is not None and 0<line<=len(self.lines):
+            current=self.lines[line-1]
+            block=current.block
+            # Innermost: nearest preceding declaration in the same block
+            for symbol in symbols:
+                if block is not None and self.scope(symbol) is block and symbol.line.number<=current.number:
+                    if found is None or symbol.line.number>found.line.number:
+                        found=symbol
+            if found:
+                return found
+        for symbol in symbols:
+            if self.scope(symbol) is None:
+                # Function definitions take precedence over prototypes
+                if found is None or (symbol.kind=='function' and symbol.line.number>found.line.number):
+                    found=symbol
+        return found
+
+    def references(self,name):
+        """
+        Returns sorted line numbers (1 based) where name is used
+        """
+        self.__number()
+        return sorted(line.number+1 for line in self.uses.get(name,()))
+
+    def complete(self,prefix,kinds=None,limit=100):
+        """
+        Returns declared names starting with prefix
+        """
+        names=[]
+        position=bisect.bisect_left(self.names,prefix)
+        while position<len(self.names) and len(names)<limit:
+            name=self.names[position]
+            if not name.startswith(prefix):
+                break
+            if kinds is None or any(symbol.kind in kinds for symbol in self.declarations[name]):
+                names.append(name)
+            position+=1
+        return names
+
+    def globals(self,kinds):
+        """
+        Returns global declarations of given kinds
+        """
+        self.__number()
+        result=[]
+        for symbols in self.declarations.values():
+            for symbol in symbols:
+                if symbol.kind in kinds and self.scope(symbol) is None:
+                    result.append(symbol)
+        return result
+
+def crosscheck(vertex,fragment):
+    """
+    Checks varyings between vertex and fragment stage indexes. Returns
+    diagnostics by stage
+    """
+    outputs=dict((symbol.name,symbol) for symbol in vertex.globals(('varying','out')))
+    inputs=dict((symbol.name,symbol) for symbol in fragment.globals(('varying','in')))
+    result={'vertex': [],'fragment': []}
+    for name,symbol in sorted(inputs.items()):
+        output=outputs.get(name)
+        if output is None:
+            result['fragment'].append(glslcheck.Diagnostic(symbol.number(),symbol.column,glslcheck.ERROR,
+                'varying %s is not written by the vertex shader' % name))
+        elif output.type!=symbol.type:
+            message='varying %s declared as %s in vertex shader and %s in fragment shader' % (name,output.type,symbol.type)
+            result['vertex'].append(glslcheck.Diagnostic(output.number(),output.column,glslcheck.ERROR,message))
+            result['fragment'].append(glslcheck.Diagnostic(symbol.number(),symbol.column,glslcheck.ERROR,message))
+    for name,symbol in sorted(outputs.items()):
+        if name not in inputs:
+            result['vertex'].append(glslcheck.Diagnostic(symbol.number(),symbol.column,glslcheck.WARNING,
+                'varying %s is not used by the fragment shader' % name))
+    return result
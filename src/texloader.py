@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# texloader.py
+# Background texture thumbnail decoding
+###############################################################################
+
+# Python imports
+import sys,threading,Queue,traceback
+
+# GTK imports
+import gobject
+
+# Default pool parameters
+DEFAULT_WORKERS=2
+# Results are handed to the main loop in batches at most every BATCH_INTERVAL ms
+BATCH_INTERVAL=60
+
+class TextureLoader:
+    """
+    Pool of worker threads decoding texture thumbnails. Results are
+    delivered to the GTK main loop in batches through a callback. Starting
+    a new load (or cancelling) discards pending work of the previous one
+    """
+
+    def __init__(self,thumbnails,workers=DEFAULT_WORKERS):
+        """
+        Class initialization
+        """
+        self.thumbnails=thumbnails
+        self.jobs=Queue.Queue()
+        self.lock=threading.Lock()
+        self.results=[]
+        self.generation=0
+        self.pending=0
+        self.timer=None
+        self.callback=None
+        self.done=None
+        self.threads=[]
+        self.retiring=0
+        self.resize(workers)
+
+    def resize(self,workers):
+        """
+        Sets the number of worker threads. Extra workers exit after
+        finishing their current job
+        """
+        workers=max(workers,1)
+        with self.lock:
+            self.retiring=max(len(self.threads)-workers,0)
+            count=len(self.threads)
+        while count<workers:
+            thread=threading.Thread(target=self.__work,name='texloader-%d' % count)
+            thread.setDaemon(True)
+            thread.start()
+            with self.lock:
+                self.threads.append(thread)
+            count+=1
+
+    def __work(self):
+        """
+        Worker thread main loop
+        """
+        while True:
+            generation,reference,filename,size,payload=self.jobs.get()
+            if generation!=self.generation:
+                # Cancelled while queued
+                continue
+            try:
+                pixbuf=self.thumbnails.get(filename,size,payload)
+                error=None
+            except (IOError,OSError,gobject.GError),e:
+                pixbuf=None
+                error=e
+            except Exception,e:
+                # Unexpected decoder errors must not kill the worker, the
+                # batch would never complete
+                print >> sys.stderr, 'Texture decode failed: %s' % filename
+                traceback.print_exc()
+                pixbuf=None
+                error=e
+            with self.lock:
+                if generation==self.generation:
+                    self.results.append((reference,filename,pixbuf,error))
+                if self.retiring:
+                    self.retiring-=1
+                    self.threads.remove(threading.currentThread())
+                    return
+
+    def load(self,jobs,callback,done=None):
+        """
+        Decodes jobs, a list of (reference, filename, size, payload). For each
+        batch callback(results) is called from the main loop with a list of
+        (reference, filename, pixbuf, error); done() is called at the end
+        """
+        self.cancel()
+        with self.lock:
+            generation=self.generation
+            self.pending=len(jobs)
+        self.callback=callback
+        self.done=done
+        for reference,filename,size,payload in jobs:
+            self.jobs.put((generation,reference,filename,size,payload))
+        if jobs:
+            self.timer=gobject.timeout_add(BATCH_INTERVAL,self.__deliver)
+        elif done:
+            done()
+
+    def __deliver(self):
+        """
+        Main loop callback handing finished results to the callback
+        """
+        with self.lock:
+            results=self.results
+            self.results=[]
+            self.pending-=len(results)
+            finished=self.pending<=0
+        if results:
+            self.callback(results)
+        if finished:
+            self.timer=None
+            if self.done:
+                self.done()
+            return False
+        return True
+
+    def cancel(self):
+        """
+        Discards queued and undelivered work
+        """
+        with self.lock:
+            self.generation+=1
+            self.results=[]
+            self.pending=0
+        try:
+            while True:
+                self.jobs.get_nowait()
+        except Queue.Empty:
+            pass
+        if self.timer is not None:
+            gobject.source_remove(self.timer)
+            self.timer=None
+
+    def loading(self):
+        """
+        Checks if a load is in progress
+        """
+        return self.timer is not None
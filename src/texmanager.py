@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# texmanager.py
+# GPU texture manager for project textures
+###############################################################################
+
+# Python imports
+import os
+from collections import OrderedDict
+
+# NumPy imports
+import numpy
+
+# OpenGL imports
+from OpenGL.GL import *
+from OpenGL.GLU import gluBuild2DMipmaps
+
+# Default video memory budget for project textures (bytes)
+DEFAULT_BUDGET=256*1024*1024
+
+# Texture targets by sampler uniform type
+SAMPLER_TARGETS={
+    GL_SAMPLER_1D: GL_TEXTURE_1D,
+    GL_SAMPLER_1D_SHADOW: GL_TEXTURE_1D,
+    GL_SAMPLER_2D: GL_TEXTURE_2D,
+    GL_SAMPLER_2D_SHADOW: GL_TEXTURE_2D,
+    GL_SAMPLER_3D: GL_TEXTURE_3D,
+    GL_SAMPLER_CUBE: GL_TEXTURE_CUBE_MAP,
+    GL_SAMPLER_CUBE_SHADOW: GL_TEXTURE_CUBE_MAP,
+}
+
+# Default noise textures bound to samplers without a project texture:
+# size by target and lattice frequency of the octave in each RGBA channel
+NOISE_SIZES={GL_TEXTURE_2D: 128,GL_TEXTURE_3D: 32}
+NOISE_FREQUENCIES=(4,8,16,32)
+NOISE_SEED=1
+
+def layout(image,target):
+    """
+    Arranges RGBA image pixels (height x width x 4, top row first) for a
+    texture target. 1D textures take the first row, 3D textures a vertical
+    strip of square slices (first slice on top) and cube maps a vertical
+    strip of the 6 faces (+X, -X, +Y, -Y, +Z, -Z). Rows of 2D and 3D
+    textures are flipped to GL order (bottom row first); cube map faces
+    are stored top row first. Returns (width, height, depth, pixels)
+    """
+    height,width=image.shape[:2]
+    if target==GL_TEXTURE_1D:
+        return width,1,1,image[0]
+    if target==GL_TEXTURE_2D:
+        return width,height,1,image[::-1]
+    if height%width:
+        raise IOError, 'Image of %dx%d is not a strip of square slices' % (width,height)
+    depth=height/width
+    slices=image.reshape(depth,width,width,4)
+    if target==GL_TEXTURE_CUBE_MAP:
+        if depth!=6:
+            raise IOError, 'Cube map image of %dx%d has not 6 faces' % (width,height)
+        return width,width,6,slices
+    return width,width,depth,slices[:,::-1]
+
+def interpolate(lattice,size,axis):
+    """
+    Resamples a periodic lattice to size values along axis with smooth
+    interpolation
+    """
+    frequency=lattice.shape[axis]
+    position=numpy.arange(size)*float(frequency)/size
+    index=numpy.floor(position).astype(int)
+    weight=position-index
+    weight=weight*weight*(3-2*weight)
+    shape=[1]*lattice.ndim
+    shape[axis]=size
+    weight=weight.reshape(shape)
+    return (numpy.take(lattice,index,axis=axis)*(1-weight)+
+        numpy.take(lattice,(index+1)%frequency,axis=axis)*weight)
+
+def noise(size,dimensions,seed=NOISE_SEED):
+    """
+    Returns tileable value noise of size pixels per side (bottom row first),
+    one octave of NOISE_FREQUENCIES per RGBA channel
+    """
+    random=numpy.random.RandomState(seed)
+    channels=[]
+    for frequency in NOISE_FREQUENCIES:
+        values=random.random_sample((frequency,)*dimensions)
+        for axis in range(dimensions):
+            values=interpolate(values,size,axis)
+        channels.append(values)
+    return (numpy.clip(numpy.array(channels),0,1)*255).round().astype(numpy.uint8).transpose(
+        range(1,dimensions+1)+[0])
+
+class Texture:
+    """
+    Uploaded GL texture
+    """
+
+    def __init__(self,name,target,width,height,depth=1):
+        """
+        Class initialization
+        """
+        self.name=name
+        self.target=target
+        self.width=width
+        self.height=height
+        self.depth=depth
+        # RGBA8 plus a full mipmap chain
+        self.size=width*height*depth*4*4/3
+
+class TextureManager:
+    """
+    Uploads project textures once (with mipmaps) and shares the same image
+    file or embedded payload between texture ids. The sampler uniforms of the
+    program are bound by name and type: a sampler named after a texture id
+    gets that texture, other samplers get the remaining project textures in
+    uniform location order
+    and, when none is left, a default noise texture. Textures are kept
+    within a video memory budget evicting the least recently used ones;
+    textures bound by the current program are never evicted, so they may
+    exceed the budget
+    """
+
+    def __init__(self,budget=DEFAULT_BUDGET):
+        """
+        Class initialization
+        """
+        self.budget=budget
+        self.textures=OrderedDict()
+        self.defaults={}
+        self.entries=[]
+        self.failed=set()
+        self.used=0
+        self.maxunits=None
+        self.uploads=0
+        self.evictions=0
+        self.warned=False
+        # Sampler bindings of the last program
+        self.plan=None
+        self.planset=None
+
+    def sourcekey(self,filename,payload=None):
+        """
+        Returns the key of a texture source: the content hash carried by an
+        embedded payload or the path, modification time and size of a file
+        (files are only read when uploaded)
+        """
+        if payload is not None:
+            return payload.sha1
+        info=os.stat(filename)
+        return (os.path.abspath(filename),info.st_mtime,info.st_size)
+
+    def settextures(self,entries):
+        """
+        Sets project textures from a list of (id, filename, payload)
+        """
+        self.entries=[]
+        self.failed.clear()
+        self.plan=None
+        self.planset=None
+        for id,filename,payload in entries:
+            try:
+                key=self.sourcekey(filename,payload)
+            except (IOError,OSError),e:
+                print 'Textura %s no disponible: %s' % (filename,e)
+                continue
+            self.entries.append((id,filename,payload,key))
+
+    def get(self,key,filename,payload=None):
+        """
+        Returns texture for key, a (source key, target) pair, uploading it
+        if needed
+        """
+        texture=self.textures.pop(key,None)
+        if texture is None:
+            texture=self.upload(key,filename,payload)
+        self.textures[key]=texture
+        return texture
+
+    def upload(self,key,filename,payload=None):
+        """
+        Decodes and uploads a texture with its mipmaps
+        """
+        # Imported here so headless renderers do not need GTK
+        import gobject,thumbcache
+        try:
+            pixbuf=thumbcache.decode(filename,payload)
+        except gobject.GError,e:
+            raise IOError(str(e))
+        if not pixbuf.get_has_alpha():
+            pixbuf=pixbuf.add_alpha(False,0,0,0)
+        width,height,stride=pixbuf.get_width(),pixbuf.get_height(),pixbuf.get_rowstride()
+        pixels=pixbuf.get_pixels()
+        # Last row is not padded to the row stride
+        pixels+='\0'*(stride*height-len(pixels))
+        image=numpy.frombuffer(pixels,numpy.uint8).reshape(height,stride)[:,:width*4].reshape(height,width,4)
+        width,height,depth,pixels=layout(image,key[1])
+        self.shrink(self.budget-Texture(None,key[1],width,height,depth).size)
+        texture=self.create(key[1],width,height,depth,pixels)
+        self.used+=texture.size
+        self.uploads+=1
+        return texture
+
+    def create(self,target,width,height,depth,pixels):
+        """
+        Creates a texture of target with mipmaps from pixels laid out as
+        returned by layout()
+        """
+        texture=Texture(glGenTextures(1),target,width,height,depth)
+        pixels=numpy.ascontiguousarray(pixels)
+        mipmaps=bool(glGenerateMipmap)
+        glBindTexture(target,texture.name)
+        glPixelStorei(GL_UNPACK_ALIGNMENT,1)
+        if mipmaps or target==GL_TEXTURE_2D:
+            glTexParameteri(target,GL_TEXTURE_MIN_FILTER,GL_LINEAR_MIPMAP_LINEAR)
+        else:
+            glTexParameteri(target,GL_TEXTURE_MIN_FILTER,GL_LINEAR)
+        glTexParameteri(target,GL_TEXTURE_MAG_FILTER,GL_LINEAR)
+        wrap=target==GL_TEXTURE_CUBE_MAP and GL_CLAMP_TO_EDGE or GL_REPEAT
+        for parameter in (GL_TEXTURE_WRAP_S,GL_TEXTURE_WRAP_T,GL_TEXTURE_WRAP_R):
+            glTexParameteri(target,parameter,wrap)
+        if target==GL_TEXTURE_1D:
+            glTexImage1D(target,0,GL_RGBA8,width,0,GL_RGBA,GL_UNSIGNED_BYTE,pixels)
+        elif target==GL_TEXTURE_3D:
+            glTexImage3D(target,0,GL_RGBA8,width,height,depth,0,GL_RGBA,GL_UNSIGNED_BYTE,pixels)
+        elif target==GL_TEXTURE_CUBE_MAP:
+            for face in range(6):
+                glTexImage2D(GL_TEXTURE_CUBE_MAP_POSITIVE_X+face,0,GL_RGBA8,width,height,0,GL_RGBA,
+                    GL_UNSIGNED_BYTE,pixels[face])
+        elif mipmaps:
+            glTexImage2D(target,0,GL_RGBA8,width,height,0,GL_RGBA,GL_UNSIGNED_BYTE,pixels)
+        else:
+            gluBuild2DMipmaps(target,GL_RGBA8,width,height,GL_RGBA,GL_UNSIGNED_BYTE,pixels)
+        if mipmaps:
+            glGenerateMipmap(target)
+        glPixelStorei(GL_UNPACK_ALIGNMENT,4)
+        glBindTexture(target,0)
+        return texture
+
+    def default(self,target):
+        """
+        Returns default noise texture for target (None if there is not one)
+        """
+        if target not in self.defaults:
+            texture=None
+            if target in NOISE_SIZES:
+                dimensions=target==GL_TEXTURE_3D and 3 or 2
+                pixels=noise(NOISE_SIZES[target],dimensions)
+                size=NOISE_SIZES[target]
+                texture=self.create(target,size,size,dimensions==3 and size or 1,pixels)
+            self.defaults[target]=texture
+        return self.defaults[target]
+
+    def setbudget(self,budget):
+        """
+        Changes video memory budget, evicting textures over it
+        """
+        self.budget=budget
+        self.shrink(budget)
+
+    def shrink(self,size):
+        """
+        Deletes least recently used textures not bound by the current
+        program until used memory fits in size
+        """
+        inuse=set((entry[3],target) for name,target,entry in self.plan or [] if entry)
+        for key in list(self.textures):
+            if self.used<=size:
+                break
+            if key in inuse:
+                continue
+            self.__delete(key)
+            self.evictions+=1
+        if self.used>size and not self.warned:
+            # Textures in use are kept, evicting them would upload them every frame
+            print 'Las texturas en uso (%d MB) superan el presupuesto de memoria de vídeo (%d MB)' % (
+                self.used/(1024*1024),self.budget/(1024*1024))
+            self.warned=True
+
+    def __delete(self,key):
+        """
+        Deletes a texture
+        """
+        texture=self.textures.pop(key)
+        glDeleteTextures([texture.name])
+        self.used-=texture.size
+
+    def samplers(self,uniformset):
+        """
+        Returns (sampler name, target, entry) of the sampler uniforms of a
+        program, entry being None for samplers without a project texture
+        """
+        samplers=sorted([uniform for name,uniform in uniformset.items
+            if uniform.type in SAMPLER_TARGETS and uniform.size==1],key=lambda uniform: uniform.location)
+        names=set(uniform.name for uniform in samplers)
+        entries=dict((entry[0],entry) for entry in self.entries)
+        remaining=[entry for entry in self.entries if entry[0] not in names]
+        plan=[]
+        for uniform in samplers:
+            entry=entries.get(uniform.name)
+            if entry is None and remaining:
+                entry=remaining.pop(0)
+            plan.append((uniform.name,SAMPLER_TARGETS[uniform.type],entry))
+        return plan
+
+    def bind(self,values,uniformset):
+        """
+        Binds textures of the sampler uniforms of uniformset to consecutive
+        texture units and sets the unit of each sampler in values
+        """
+        if uniformset is None:
+            return
+        if self.planset is not uniformset:
+            self.plan=self.samplers(uniformset)
+            self.planset=uniformset
+        if not self.plan:
+            return
+        if self.maxunits is None:
+            self.maxunits=glGetIntegerv(GL_MAX_TEXTURE_IMAGE_UNITS)
+        unit=0
+        for name,target,entry in self.plan:
+            if unit>=self.maxunits:
+                break
+            texture=None
+            if entry:
+                id,filename,payload,key=entry
+                if (key,target) not in self.failed:
+                    try:
+                        texture=self.get((key,target),filename,payload)
+                    except (IOError,OSError),e:
+                        print 'No se ha podido cargar la textura %s: %s' % (filename,e)
+                        self.failed.add((key,target))
+            if texture is None:
+                texture=self.default(target)
+                if texture is None:
+                    continue
+            glActiveTexture(GL_TEXTURE0+unit)
+            glBindTexture(target,texture.name)
+            values.set(name,unit)
+            unit+=1
+        glActiveTexture(GL_TEXTURE0)
+
+    def clear(self):
+        """
+        Deletes all textures, context must be current
+        """
+        for key in list(self.textures):
+            self.__delete(key)
+        for texture in self.defaults.values():
+            if texture:
+                glDeleteTextures([texture.name])
+        self.defaults={}
+        self.plan=None
+        self.planset=None
+
+    def stats(self):
+        """
+        Returns texture manager statistics
+        """
+        return {'textures': len(self.textures),'used': self.used,'budget': self.budget,
+            'uploads': self.uploads,'evictions': self.evictions}
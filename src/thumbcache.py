@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# thumbcache.py
+# Texture thumbnail cache (memory and disk)
+###############################################################################
+
+# Python imports
+import os,sys,json,hashlib,threading,tempfile
+from collections import OrderedDict
+
+# GTK imports
+import gobject,gtk
+
+# Default cache location and size
+MB=1024*1024
+DEFAULT_DIRECTORY=os.path.join(os.path.expanduser('~'),'.glsleditor','cache','thumbnails')
+DEFAULT_MEMORY_ITEMS=256
+DEFAULT_MAXSIZE=32*MB
+# Content hashes kept in the index (least recently used are dropped)
+DEFAULT_INDEX_ITEMS=4096
+
+# File read block size for hashing
+BLOCKSIZE=1024*1024
+
+# Content hash index filename (inside cache directory)
+INDEX_FILE='hashes.json'
+
+def decode(filename,payload=None,size=None):
+    """
+    Decodes an image from an embedded payload or its file. If size is given
+    the image is decoded directly at (width, height)
+    """
+    if payload is None:
+        if size:
+            return gtk.gdk.pixbuf_new_from_file_at_scale(filename,size[0],size[1],False)
+        return gtk.gdk.pixbuf_new_from_file(filename)
+    loader=gtk.gdk.PixbufLoader()
+    if size:
+        loader.connect('size-prepared',lambda loader,w,h: loader.set_size(size[0],size[1]))
+    loader.write(payload.read())
+    loader.close()
+    return loader.get_pixbuf()
+
+class ThumbnailCache:
+    """
+    Thumbnails keyed by image content hash, modification time and size.
+    Lookups go through an in-memory LRU, then PNG files on disk, and only
+    decode the source image (at reduced size) on a miss. The disk tier is
+    size bounded, least recently used files are removed first
+    """
+
+    def __init__(self,directory=DEFAULT_DIRECTORY,memoryitems=DEFAULT_MEMORY_ITEMS,
+            maxsize=DEFAULT_MAXSIZE,indexitems=DEFAULT_INDEX_ITEMS):
+        """
+        Class initialization
+        """
+        self.directory=directory
+        self.memoryitems=memoryitems
+        self.maxsize=maxsize
+        self.indexitems=indexitems
+        self.memory=OrderedDict()
+        self.hashes=None
+        self.hashesmodified=False
+        # Disk tier size, known after the first shrink
+        self.disksize=None
+        self.lock=threading.RLock()
+        self.hits=0
+        self.diskhits=0
+        self.misses=0
+
+    def __loadindex(self):
+        """
+        Loads persistent content hash index
+        """
+        if self.hashes is None:
+            try:
+                fd=open(os.path.join(self.directory,INDEX_FILE))
+                try:
+                    self.hashes=json.load(fd,object_pairs_hook=OrderedDict)
+                finally:
+                    fd.close()
+            except (IOError,OSError,ValueError):
+                self.hashes=OrderedDict()
+
+    def contenthash(self,filename,mtime,filesize):
+        """
+        Returns content hash of filename, hashing it only when it changed
+        """
+        with self.lock:
+            self.__loadindex()
+            entry=self.hashes.pop(filename,None)
+            if entry and entry[0]==mtime and entry[1]==filesize:
+                # Most recently used entries are kept last
+                self.hashes[filename]=entry
+                self.hashesmodified=True
+                return entry[2]
+        digest=hashlib.sha1()
+        fd=open(filename,'rb')
+        try:
+            block=fd.read(BLOCKSIZE)
+            while block:
+                digest.update(block)
+                block=fd.read(BLOCKSIZE)
+        finally:
+            fd.close()
+        with self.lock:
+            self.hashes.pop(filename,None)
+            self.hashes[filename]=(mtime,filesize,digest.hexdigest())
+            while len(self.hashes)>self.indexitems:
+                self.hashes.popitem(last=False)
+            self.hashesmodified=True
+        return digest.hexdigest()
+
+    def key(self,filename,size,payload=None):
+        """
+        Returns thumbnail key for an image at size
+        """
+        if payload is not None:
+            # Embedded payloads carry their content hash
+            content,mtime=payload.sha1,0
+        else:
+            info=os.stat(filename)
+            content,mtime=self.contenthash(filename,info.st_mtime,info.st_size),info.st_mtime
+        return hashlib.sha1('%s:%r:%dx%d' % (content,mtime,size[0],size[1])).hexdigest()
+
+    def get(self,filename,size,payload=None):
+        """
+        Returns thumbnail pixbuf of filename (or embedded payload) at size
+        """
+        key=self.key(filename,size,payload)
+        with self.lock:
+            pixbuf=self.memory.pop(key,None)
+            if pixbuf is not None:
+                self.memory[key]=pixbuf
+                self.hits+=1
+                return pixbuf
+        path=os.path.join(self.directory,key + '.png')
+        pixbuf=None
+        if os.path.exists(path):
+            try:
+                pixbuf=gtk.gdk.pixbuf_new_from_file(path)
+                self.diskhits+=1
+                # Refresh modification time for least recently used eviction
+                os.utime(path,None)
+            except gobject.GError:
+                pixbuf=None
+            except OSError:
+                pass
+        if pixbuf is None:
+            self.misses+=1
+            pixbuf=decode(filename,payload,size)
+            self.__store(path,pixbuf)
+        with self.lock:
+            self.memory[key]=pixbuf
+            while len(self.memory)>self.memoryitems:
+                self.memory.popitem(last=False)
+        return pixbuf
+
+    def __store(self,path,pixbuf):
+        """
+        Writes thumbnail to disk tier
+        """
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd,tmpname=tempfile.mkstemp(suffix='.tmp',dir=self.directory)
+            os.close(fd)
+            try:
+                pixbuf.save(tmpname,'png')
+                os.rename(tmpname,path)
+            except:
+                self.remove(tmpname)
+                raise
+            size=os.path.getsize(path)
+        except (IOError,OSError,gobject.GError),e:
+            print >> sys.stderr, 'Thumbnail cache write failed: %s' % e
+            return
+        with self.lock:
+            if self.disksize is not None and self.disksize+size<=self.maxsize:
+                self.disksize+=size
+                return
+        self.shrink()
+
+    def remove(self,filename):
+        """
+        Removes a cache file ignoring errors
+        """
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def entries(self):
+        """
+        Returns (mtime, size, filename) list of cached thumbnails
+        """
+        entries=[]
+        try:
+            names=os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if name.endswith('.png'):
+                filename=os.path.join(self.directory,name)
+                try:
+                    info=os.stat(filename)
+                except OSError:
+                    continue
+                entries.append((info.st_mtime,info.st_size,filename))
+        return entries
+
+    def shrink(self):
+        """
+        Removes least recently used thumbnails over the size limit
+        """
+        entries=self.entries()
+        total=sum([entry[1] for entry in entries])
+        entries.sort()
+        while entries and total>self.maxsize:
+            mtime,size,filename=entries.pop(0)
+            self.remove(filename)
+            total-=size
+        with self.lock:
+            self.disksize=total
+
+    def flush(self):
+        """
+        Saves content hash index
+        """
+        with self.lock:
+            if not self.hashesmodified:
+                return
+            try:
+                if not os.path.isdir(self.directory):
+                    os.makedirs(self.directory)
+                fd=open(os.path.join(self.directory,INDEX_FILE),'w')
+                try:
+                    json.dump(self.hashes,fd)
+                finally:
+                    fd.close()
+                self.hashesmodified=False
+            except (IOError,OSError),e:
+                print >> sys.stderr, 'Thumbnail index write failed: %s' % e
+
+    def setdirectory(self,directory):
+        """
+        Moves disk tier to directory, saving the current index first
+        """
+        if directory==self.directory:
+            return
+        self.flush()
+        with self.lock:
+            self.directory=directory
+            self.hashes=None
+            self.disksize=None
+
+    def stats(self):
+        """
+        Returns cache usage counters
+        """
+        return {
+            'memory': len(self.memory),
+            'disksize': self.disksize,
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'diskhits': self.diskhits,
+            'misses': self.misses,
+        }
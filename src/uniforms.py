@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# uniforms.py
+# Shader uniform values and per-program uniform tables
+###############################################################################
+
+# Python imports
+import ctypes
+
+# OpenGL imports
+from OpenGL.GL import *
+from OpenGL.error import GLError
+
+# Uniform name fed with milliseconds since preview start
+TIME_FROM_INIT='TIME_FROM_INIT'
+
+# Upload functions by uniform type (scalar, array)
+SETTERS={
+    GL_FLOAT: (glUniform1f,glUniform1fv),
+    GL_FLOAT_VEC2: (glUniform2f,glUniform2fv),
+    GL_FLOAT_VEC3: (glUniform3f,glUniform3fv),
+    GL_FLOAT_VEC4: (glUniform4f,glUniform4fv),
+    GL_INT: (glUniform1i,glUniform1iv),
+    GL_INT_VEC2: (glUniform2i,glUniform2iv),
+    GL_INT_VEC3: (glUniform3i,glUniform3iv),
+    GL_INT_VEC4: (glUniform4i,glUniform4iv),
+    GL_BOOL: (glUniform1i,glUniform1iv),
+    GL_BOOL_VEC2: (glUniform2i,glUniform2iv),
+    GL_BOOL_VEC3: (glUniform3i,glUniform3iv),
+    GL_BOOL_VEC4: (glUniform4i,glUniform4iv),
+}
+
+# Matrix uniforms (always uploaded as arrays)
+MATRIX_SETTERS={
+    GL_FLOAT_MAT2: glUniformMatrix2fv,
+    GL_FLOAT_MAT3: glUniformMatrix3fv,
+    GL_FLOAT_MAT4: glUniformMatrix4fv,
+}
+
+def normalize(value):
+    """
+    Returns a comparable, hashable uniform value
+    """
+    if isinstance(value,(list,tuple)) or hasattr(value,'tolist'):
+        value=tuple(normalize(item) for item in (value.tolist() if hasattr(value,'tolist') else value))
+    return value
+
+def flatten(value):
+    """
+    Returns a flat list of components of a (nested) value
+    """
+    if isinstance(value,tuple):
+        result=[]
+        for item in value:
+            result.extend(flatten(item))
+        return result
+    return [value]
+
+class UniformValues:
+    """
+    Uniform values by name shared by every program. Each value change
+    gets a serial number so programs can push only what changed
+    """
+
+    def __init__(self):
+        """
+        Class initialization
+        """
+        self.values={}
+        self.serials={}
+        self.serial=0
+        # Values a program could not take, as (name, value, message)
+        self.rejected=[]
+
+    def set(self,name,value):
+        """
+        Sets uniform value, returns if it changed
+        """
+        value=normalize(value)
+        if name in self.values and self.values[name]==value:
+            return False
+        self.serial+=1
+        self.values[name]=value
+        self.serials[name]=self.serial
+        return True
+
+    def get(self,name,default=None):
+        """
+        Returns uniform value
+        """
+        return self.values.get(name,default)
+
+    def remove(self,name):
+        """
+        Forgets a uniform value (programs keep the last one pushed)
+        """
+        self.values.pop(name,None)
+        self.serials.pop(name,None)
+
+    def reject(self,name,message):
+        """
+        Drops a value a program could not take and records the problem
+        """
+        self.rejected.append((name,self.values.get(name),message))
+        self.remove(name)
+
+    def takerejected(self):
+        """
+        Returns and forgets rejected values
+        """
+        rejected=self.rejected
+        self.rejected=[]
+        return rejected
+
+    def names(self):
+        """
+        Returns names of uniforms with a value
+        """
+        return sorted(self.values)
+
+class Uniform:
+    """
+    Active uniform of a program
+    """
+
+    def __init__(self,name,location,type,size):
+        """
+        Class initialization
+        """
+        self.name=name
+        self.location=location
+        self.type=type
+        self.size=size
+
+    def push(self,value):
+        """
+        Uploads value, program must be in use
+        """
+        if self.type in MATRIX_SETTERS:
+            components=flatten(value)
+            MATRIX_SETTERS[self.type](self.location,max(self.size,1),GL_FALSE,components)
+            return
+        scalar,array=SETTERS.get(self.type,(glUniform1i,glUniform1iv))
+        if self.size>1:
+            components=flatten(value)
+            array(self.location,self.size,components)
+        elif isinstance(value,tuple):
+            scalar(self.location,*flatten(value))
+        else:
+            scalar(self.location,value)
+
+class UniformSet:
+    """
+    Active uniforms of a linked program, queried once. Flushing pushes only
+    values changed since the last flush
+    """
+
+    def __init__(self,program):
+        """
+        Class initialization, queries active uniforms of program
+        """
+        self.program=program
+        self.uniforms={}
+        self.serial=-1
+        self.pushes=0
+        count=glGetProgramiv(program,GL_ACTIVE_UNIFORMS)
+        for index in range(count):
+            name,size,type=glGetActiveUniform(program,index)
+            if not isinstance(name,str):
+                name=name.tostring().rstrip('\0') if hasattr(name,'tostring') else str(name)
+            # Built-in (gl_*) uniforms have no location
+            location=glGetUniformLocation(program,name)
+            if location<0:
+                continue
+            if name.endswith('[0]'):
+                name=name[:-3]
+            self.uniforms[name]=Uniform(name,location,type,size)
+        self.items=self.uniforms.items()
+
+    def __contains__(self,name):
+        """
+        Checks if program has an active uniform named name
+        """
+        return name in self.uniforms
+
+    def flush(self,values):
+        """
+        Pushes changed values to program (in use). A value of the wrong
+        type or shape is rejected (reported once and dropped)
+        """
+        if values.serial==self.serial:
+            return
+        serials=values.serials
+        for name,uniform in self.items:
+            serial=serials.get(name)
+            if serial is not None and serial>self.serial:
+                try:
+                    uniform.push(values.values[name])
+                except (GLError,TypeError,ValueError,ctypes.ArgumentError),e:
+                    print 'Valor no válido para el uniform %s: %s' % (name,e)
+                    values.reject(name,str(e))
+                    continue
+                self.pushes+=1
+        self.serial=values.serial
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# Copyright (C) 2008 EVO Sistemas Libres <central@evosistemas.com>
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+###############################################################################
+# variants.py
+# Shader variants from #define permutation axes
+###############################################################################
+
+# Python imports
+import os,sys,json,itertools,multiprocessing,tempfile
+
+# Application imports (OpenGL dependent modules are imported by workers
+# after selecting the offscreen platform)
+import offscreen
+
+# Built variant compile times, by driver and program key
+DEFAULT_CACHE=os.path.join(os.path.expanduser('~'),'.glsleditor','cache','variants.json')
+
+# Worker process state
+_worker={}
+
+def parse_axis(text):
+    """
+    Parses a NAME=value1,value2 axis specification
+    """
+    name,separator,values=text.partition('=')
+    values=[value.strip() for value in values.split(',') if value.strip()]
+    if not separator or not name.strip() or not values:
+        raise ValueError, 'Invalid variant axis %s' % text
+    return (name.strip(),values)
+
+def combinations(axes):
+    """
+    Returns defines dictionaries for every combination of axes values
+    """
+    if not axes:
+        return [{}]
+    names=[name for name,values in axes]
+    return [dict(zip(names,values)) for values in itertools.product(*[values for name,values in axes])]
+
+def variant_name(defines):
+    """
+    Short variant description
+    """
+    if not defines:
+        return '-'
+    return ','.join(['%s=%s' % (name,defines[name]) for name in sorted(defines)])
+
+class VariantCache:
+    """
+    Compile times of variants already built (their programs are kept in
+    the program binary cache), by driver and program key
+    """
+
+    def __init__(self,filename=DEFAULT_CACHE):
+        """
+        Class initialization
+        """
+        self.filename=filename
+        try:
+            fd=open(filename)
+            try:
+                self.entries=json.load(fd)
+            finally:
+                fd.close()
+        except (IOError,OSError,ValueError):
+            self.entries={}
+
+    def get(self,driver,key):
+        """
+        Returns compile times of a built variant
+        """
+        return self.entries.get(driver,{}).get(key)
+
+    def store(self,driver,key,times):
+        """
+        Records compile times of a built variant
+        """
+        self.entries.setdefault(driver,{})[key]=times
+
+    def save(self):
+        """
+        Writes cache file
+        """
+        directory=os.path.dirname(self.filename)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            fd,tmpname=tempfile.mkstemp(dir=directory)
+            try:
+                out=os.fdopen(fd,'w')
+                try:
+                    json.dump(self.entries,out)
+                finally:
+                    out.close()
+                os.rename(tmpname,self.filename)
+            except:
+                try:
+                    os.remove(tmpname)
+                except OSError:
+                    pass
+                raise
+        except (IOError,OSError),e:
+            print >> sys.stderr, 'Variant cache write failed: %s' % e
+
+def initworker(backend,entries):
+    """
+    Worker process initialization: own offscreen context and program
+    binary cache. Failures are kept and returned by each job, a pool whose
+    initializer raises respawns its workers forever
+    """
+    try:
+        _worker['context']=offscreen.OffscreenContext(16,16,backend)
+        import glslview,binarycache
+        _worker['driver']=glslview.driver_id()
+    except Exception,e:
+        _worker['error']='%s: %s' % (e.__class__.__name__,e)
+        return
+    _worker['binarycache']=binarycache.ProgramBinaryCache()
+    _worker['entries']=entries
+
+def build(job):
+    """
+    Compiles a variant in a worker, storing its program binary. Returns
+    (driver, key, times, cached, error), driver and key being None if the
+    worker has no context
+    """
+    if 'error' in _worker:
+        return (None,None,None,False,_worker['error'])
+    vertex,fragment,defines=job
+    import glslview,benchmark
+    driver=_worker['driver']
+    key=glslview.program_key(vertex,fragment,defines)
+    times=_worker['entries'].get(driver,{}).get(key)
+    if times is not None:
+        return (driver,key,times,True,None)
+    try:
+        program,times=benchmark.compile_timed(vertex,fragment,defines,retrievable=True)
+    except glslview.ShaderError,e:
+        return (driver,key,None,False,e.log or str(e))
+    if glslview.program_binary_supported():
+        entry=glslview.get_program_binary(program)
+        if entry:
+            cache=_worker['binarycache']
+            cache.store(cache.key(key,driver),*entry)
+    glslview.glDeleteProgram(program)
+    return (driver,key,times,False,None)
+
+def build_all(jobs,workers=None,backend=None,cache=None):
+    """
+    Compiles (vertex, fragment, defines) jobs in a pool of worker processes,
+    skipping variants already built. Must run before this process creates
+    a GL context. Returns (key, times, cached, error) for each job
+    """
+    backend=offscreen.select(backend)
+    if cache is None:
+        cache=VariantCache()
+    pool=multiprocessing.Pool(workers or multiprocessing.cpu_count(),initworker,(backend,cache.entries))
+    try:
+        results=pool.map(build,jobs,chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+    for driver,key,times,cached,error in results:
+        if times is not None and not cached:
+            cache.store(driver,key,times)
+    cache.save()
+    return [(key,times,cached,error) for driver,key,times,cached,error in results]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+# test_glslcheck.py
+# GLSL source validation tests
+###############################################################################
+
+# Python imports
+import os,sys,unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','src'))
+
+# Application imports
+import glslcheck
+
+MAIN="""
+void main(void)
+{
+    gl_FragColor = vec4(SCALE, 0.0, 0.0, 1.0);
+}
+"""
+
+class CheckTest(unittest.TestCase):
+    """
+    Checker diagnostics of valid and invalid sources
+    """
+
+    def assertValid(self,source):
+        """
+        Fails if source has errors
+        """
+        self.assertEqual(glslcheck.errors(glslcheck.check(source)),[])
+
+    def test_valid(self):
+        self.assertValid('#define SCALE 1.0\n' + MAIN)
+
+    def test_define_continuation(self):
+        self.assertValid('#define SCALE \\\n    (0.5 + \\\n     0.5)\n' + MAIN)
+
+    def test_continuation_keeps_line_numbers(self):
+        source='#define SCALE \\\n    1.0\n' + MAIN.replace('1.0);','1.0) $;')
+        diagnostics=glslcheck.errors(glslcheck.check(source))
+        self.assertEqual([(diagnostic.line,diagnostic.column) for diagnostic in diagnostics
+            if 'unexpected character' in diagnostic.message],[(6,47)])
+
+    def test_split_identifier(self):
+        self.assertValid('#define SCALE 1.0\nvoid ma\\\nin(void)\n{\n    gl_FragColor = vec4(SCALE);\n}\n')
+
+    def test_inactive_region(self):
+        self.assertValid('#define SCALE 1.0\n#if 0\nfloat a = b @ c $ d;\n#endif\n' + MAIN)
+
+    def test_inactive_else_region(self):
+        self.assertValid('#ifdef SCALE\n@\n#else\n#define SCALE 1.0\n#endif\n' + MAIN)
+
+    def test_active_region_characters(self):
+        diagnostics=glslcheck.errors(glslcheck.check('#define SCALE 1.0\n#if 1\n@\n#endif\n' + MAIN))
+        self.assertTrue([diagnostic for diagnostic in diagnostics
+            if diagnostic.line==3 and 'unexpected character' in diagnostic.message])
+
+    def test_incremental_continuation(self):
+        checker=glslcheck.Checker('fragment')
+        source='#define SCALE \\\n    1.0\n' + MAIN
+        self.assertEqual(glslcheck.errors(checker.check(source)),[])
+        self.assertEqual(glslcheck.errors(checker.check(source.replace('1.0\n','2.0\n',1))),[])
+
+    def test_token_pasting(self):
+        self.assertValid('#define CAT(a,b) a##b\n#define SCALE CAT(1,.0)\nuniform float CAT(value,1);\n' + MAIN)
+
+    def test_token_pasting_errors(self):
+        diagnostics=glslcheck.errors(glslcheck.check('#define A(x) ## x\n#define B(x,y) x##y\n'
+            '#define SCALE 1.0\nfloat f = B(+,/) 1.0;\n' + MAIN))
+        self.assertEqual([diagnostic.line for diagnostic in diagnostics if 'macro expansion' in diagnostic.message],[1])
+        self.assertEqual([diagnostic.line for diagnostic in diagnostics if 'pasting' in diagnostic.message],[4])
+
+    def test_subroutines(self):
+        self.assertValid('#version 400\n'
+            'subroutine vec4 Shade(vec4 color);\n'
+            'subroutine vec4 Tint(vec4 color);\n'
+            'subroutine(Shade) vec4 red(vec4 color) { return color * vec4(1.0, 0.0, 0.0, 1.0); }\n'
+            'subroutine(Shade, Tint) vec4 swap(vec4 color) { return color.bgra; }\n'
+            'subroutine uniform Shade shade;\n'
+            'subroutine uniform Tint tints[2];\n'
+            'out vec4 result;\n'
+            'void main() { result = tints[0](shade(vec4(1.0))); }\n')
+
+if __name__=='__main__':
+    unittest.main()